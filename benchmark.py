@@ -0,0 +1,693 @@
+# -*- coding: utf-8 -*-
+"""main.py 성능 측정용 벤치마크 모음
+
+사용법:
+    python benchmark.py html       # 메타 문구 후처리 마이크로 벤치마크
+    python benchmark.py pipeline   # 가짜 Gemini/WordPress/이미지 서버로 전체 파이프라인 측정
+    python benchmark.py startup    # main.py import / CLI 시작 시간 측정
+    python benchmark.py research   # 관련 주제 묶음의 리서치 저장소 재사용/보강 효과 측정
+    python benchmark.py write      # 본문 전체 한 번에 작성 vs 섹션별 동시 작성/검사
+    python benchmark.py publish    # 태그/대표 이미지 메타 포함 발행: 배치 API vs 개별 요청
+    python main.py benchmark ...   # 위와 동일
+"""
+import io
+import itertools
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 캐시/체크포인트/트레이스가 실제 상태 폴더에 섞이지 않도록 임시 폴더 사용
+os.environ.setdefault("AUTOWP_STATE_DIR", tempfile.mkdtemp(prefix="autowp-bench-"))
+
+import main
+
+# 현재 폴더에 sites.json 이 있어도 벤치마크가 실제 블로그 주소/계정을 쓰지 않도록 사이트 레지스트리를 비움
+main.SITES_FILE = os.path.join(tempfile.mkdtemp(prefix="autowp-bench-sites-"), "sites.json")
+main._sites_cache.clear()
+
+
+def legacy_line_filter(content, phrases):
+    """기존 write_full_content 방식: 문구마다 전체 문서를 줄 단위로 split/join"""
+    for phrase in phrases:
+        if phrase in content:
+            lines = content.split('\n')
+            content = '\n'.join([line for line in lines if phrase not in line])
+    return content
+
+
+def legacy_paragraph_filter(content, phrases):
+    """기존 quality_check_and_improve 방식: 문구마다 '</p>' 기준 split/join"""
+    for phrase in phrases:
+        if phrase in content:
+            paras = content.split('</p>')
+            content = '</p>'.join([p for p in paras if phrase not in p])
+    return content
+
+
+def synthetic_article(sections, seed=0):
+    """섹션 수만큼 h2/p/ul 블록을 만들고 일부 문단에 메타 문구를 섞은 가짜 글"""
+    rng = random.Random(seed)
+    words = ["금리", "환율", "ETF", "배당", "반도체", "연금저축", "ISA", "물가", "부동산", "투자"]
+    phrases = main.META_KILL_LIST
+
+    def sentence():
+        text = " ".join(rng.choice(words) for _ in range(12)) + "입니다."
+        if rng.random() < 0.05:
+            text += f" {rng.choice(phrases)} 문장."
+        return text
+
+    blocks = []
+    for index in range(sections):
+        blocks.append(f"<h2>{index + 1}. {rng.choice(words)} 전망</h2>")
+        for _ in range(4):
+            blocks.append(f"<p>{sentence()} <strong>{sentence()}</strong></p>")
+        items = "".join(f"<li>{sentence()}</li>" for _ in range(3))
+        blocks.append(f"<ul>{items}</ul>")
+    return "\n".join(blocks)
+
+
+def time_call(fn, *args, repeat=5):
+    """repeat 번 실행 중 가장 빠른 시간(초)"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+# strip_meta_blocks 정답 사례: (입력, 기대 출력) - 문구는 "검토하고", "요청하신 원고"
+HTML_STRIP_CASES = [
+    # 중첩 목록: 안쪽 항목만 빠지고, 비면 안쪽 목록째 빠짐
+    ("<ul><li>a<ul><li>검토하고 b</li><li>c</li></ul></li><li>d</li></ul>",
+     "<ul><li>a<ul><li>c</li></ul></li><li>d</li></ul>"),
+    ("<ul><li>a<ul><li>검토하고 b</li></ul></li></ul>", "<ul><li>a</li></ul>"),
+    ("<ol><li>검토하고 a<ul><li>b</li></ul></li><li>c</li></ol>", "<ol><li>c</li></ol>"),
+    # 한 줄 목록에서 멀쩡한 항목은 유지
+    ("<ul><li>a</li><li>검토하고 b</li></ul>", "<ul><li>a</li></ul>"),
+    # 인라인 태그로 끊긴 문구도 문단째 제거, 블록 경계를 넘는 문구는 유지
+    ("<p>좋은 글</p><p>요청하신 <strong>원고</strong>입니다</p>", "<p>좋은 글</p>"),
+    ("<p>검<em>토하</em>고 <a href='x'>고친</a> 글</p><p>남음</p>", "<p>남음</p>"),
+    ("<p>요청하신</p><p>원고</p>", "<p>요청하신</p><p>원고</p>"),
+    # 여러 줄 문단은 닫는 태그까지 통째로
+    ("<p>좋은 문단\n요청하신 원고</p>\n<p>끝</p>", "\n<p>끝</p>"),
+    # 블록 밖 텍스트는 그 줄만
+    ("요청하신 원고를 정리했습니다\n<p>본문</p>", "\n<p>본문</p>"),
+    ("<h2>제목</h2>\n검토하고 고친 부분\n<p>본문</p>", "<h2>제목</h2>\n\n<p>본문</p>"),
+    # 표: 문구가 있는 행만 빠지고, 행이 모두 빠지면 표째 빠짐
+    ("<table><tr><td>금리</td><td>3%</td></tr><tr><td>검토하고</td><td>x</td></tr></table>",
+     "<table><tr><td>금리</td><td>3%</td></tr></table>"),
+    ("<table><tbody><tr><td>검토하고</td></tr></tbody></table>\n<p>끝</p>", "\n<p>끝</p>"),
+]
+
+
+def check_strip_meta_blocks():
+    """HTML_STRIP_CASES 기대 출력 확인 (틀리면 AssertionError)"""
+    matcher = main.compile_phrase_matcher(["검토하고", "요청하신 원고"])
+    for source, expected in HTML_STRIP_CASES:
+        actual = main.strip_meta_blocks(source, matcher)
+        assert actual == expected, f"strip_meta_blocks({source!r}) = {actual!r}, 기대값 {expected!r}"
+    print(f"✅ strip_meta_blocks 정답 사례 {len(HTML_STRIP_CASES)}개 통과")
+
+
+def bench_html():
+    """기존 split/join 필터 vs 단일 패스 strip_meta_blocks (문구 수 10개 / 100개)"""
+    check_strip_meta_blocks()
+    phrase_sets = {
+        10: main.META_KILL_LIST,
+        100: main.META_KILL_LIST + [f"금지 문구 {i}번" for i in range(90)],
+    }
+    print("🧽 메타 문구 후처리 벤치마크 (최소 시간, ms)")
+    print(f"   {'문구':>4}{'섹션':>6}{'크기(KB)':>10}{'줄 split':>12}{'</p> split':>12}{'단일 패스':>12}")
+    for count, phrases in phrase_sets.items():
+        matcher = main.compile_phrase_matcher(phrases)
+        for sections in (10, 100, 1000, 5000):
+            article = synthetic_article(sections)
+            line_ms = time_call(legacy_line_filter, article, phrases) * 1000
+            para_ms = time_call(legacy_paragraph_filter, article, phrases) * 1000
+            single_ms = time_call(main.strip_meta_blocks, article, matcher) * 1000
+            size_kb = len(article.encode("utf-8")) / 1024
+            print(f"   {count:>4}{sections:>6}{size_kb:>10.0f}{line_ms:>12.2f}{para_ms:>12.2f}{single_ms:>12.2f}")
+
+
+class FakeGeminiError(Exception):
+    """google-genai 에러처럼 code 속성을 가진 주입용 에러"""
+    
+    def __init__(self, code, message):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+class FakeResponse:
+    def __init__(self, text, prompt):
+        self.text = text
+        self.usage_metadata = FakeUsage(main.estimate_tokens(prompt), main.estimate_tokens(text))
+
+
+class FakeUsage:
+    def __init__(self, prompt_token_count, candidates_token_count):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+
+
+class FakeGeminiModels:
+    """client.models 대역: 프롬프트 종류별 고정 응답 + 지연/에러 주입"""
+    
+    def __init__(self, stats, latency=0.05, error_rate=0.0, seed=0, search_latency=None, char_latency=0.0):
+        self.stats = stats
+        self.latency = latency
+        # 출력 1000자당 추가 지연(초) - 긴 생성일수록 오래 걸리는 실제 모델 흉내
+        self.char_latency = char_latency
+        # 검색 그라운딩 호출은 보통 훨씬 느리므로 따로 지정 가능 (None 이면 latency 와 동일)
+        self.search_latency = latency if search_latency is None else search_latency
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._topics = 0
+    
+    def _call(self, prompt, config=None):
+        with self._lock:
+            self.stats["gemini_calls"] += 1
+            self.stats["gemini_bytes"] += len(prompt.encode("utf-8"))
+            fail = self._rng.random() < self.error_rate
+            code = self._rng.choice([429, 503])
+            search = bool(config is not None and getattr(config, "tools", None))
+            if search:
+                self.stats["search_calls"] = self.stats.get("search_calls", 0) + 1
+        time.sleep(self.search_latency if search else self.latency)
+        if fail:
+            with self._lock:
+                self.stats["gemini_errors"] += 1
+            raise FakeGeminiError(code, "RESOURCE_EXHAUSTED" if code == 429 else "UNAVAILABLE")
+        text = self._canned(prompt, config)
+        time.sleep(len(text) / 1000 * self.char_latency)
+        with self._lock:
+            self.stats["gemini_bytes"] += len(text.encode("utf-8"))
+        return text
+    
+    def _canned(self, prompt, config):
+        if config is not None and getattr(config, "response_schema", None):
+            return json.dumps({
+                "title": "벤치마크용 통합 설계 제목",
+                "intro": "도입부",
+                "sections": [{"heading": f"섹션 {i}", "key_message": "핵심", "data_points": "수치"} for i in range(3)],
+                "tips": "팁",
+                "closing": "마무리",
+                "thumbnail_prompt": "finance infographic, blue theme",
+                "overlay_text": "벤치마크",
+            }, ensure_ascii=False)
+        if "주제 1개" in prompt:
+            with self._lock:
+                self._topics += 1
+                # 리서치 클러스터 키워드(금리/ETF)를 넣어 post_tags 가 태그를 만들도록
+                return f"벤치마크 주제 {self._topics}번 금리와 ETF 전망 {random.random():.6f}"
+        if "사전 조사" in prompt or "팩트 시트" in prompt:
+            return "\n".join(f"- 핵심 수치 {i}: 전년 대비 {i}% 상승 (출처: 통계청)" for i in range(20))
+        if "아웃라인을 작성하세요" in prompt:
+            return "제목: 벤치마크용 블로그 글 제목입니다\n\n1. 도입부\n2. 섹션 A\n3. 섹션 B\n4. 마무리"
+        if "영문 프롬프트" in prompt:
+            return "Korean text '벤치마크', finance infographic, blue theme, high quality"
+        if "이번에 작성할 항목" in prompt or "글의 한 섹션" in prompt:
+            return synthetic_article(1, seed=len(prompt))
+        return synthetic_article(8)
+    
+    def generate_content(self, model, contents, config=None):
+        return FakeResponse(self._call(contents, config), contents)
+    
+    def generate_content_stream(self, model, contents, config=None):
+        text = self._call(contents, config)
+        for start in range(0, len(text), 512):
+            yield FakeResponse(text[start:start + 512], contents)
+    
+    def count_tokens(self, model, contents, config=None):
+        class Result:
+            total_tokens = main.estimate_tokens(contents)
+        return Result()
+
+
+class FakeGeminiClient:
+    def __init__(self, stats, **options):
+        self.models = FakeGeminiModels(stats, **options)
+
+
+class FakeServiceHandler(BaseHTTPRequestHandler):
+    """가짜 WordPress REST(/wp-json/wp/v2/posts, /media, /tags, /batch/v1) + 가짜 이미지 호스트(/prompt/...)"""
+    
+    protocol_version = "HTTP/1.1"
+    
+    def log_message(self, *args):
+        pass
+    
+    def _count(self, key, received=0, sent=0):
+        stats = self.server.stats
+        with self.server.lock:
+            stats[f"{key}_calls"] += 1
+            stats["bytes_in"] += received
+            stats["bytes_out"] += sent
+    
+    def _read_body(self):
+        if self.headers.get("Transfer-Encoding") == "chunked":
+            data = b""
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return data
+                data += self.rfile.read(size)
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+    
+    def _send(self, code, body=b"", content_type="application/json", headers=None):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except OSError:
+            pass  # 클라이언트가 타임아웃으로 먼저 끊은 경우
+        return len(body)
+    
+    def do_GET(self):
+        if self.path.startswith("/prompt/"):
+            return self._image()
+        if "/wp/v2/posts" in self.path:
+            sent = self._send(200, [], headers={"X-WP-TotalPages": "1", "ETag": '"bench"'})
+            return self._count("wp", sent=sent)
+        if "/wp/v2/media/" in self.path:
+            media_id = int(self.path.split("/wp/v2/media/")[1].split("?")[0])
+            size = self.server.media.get(media_id)
+            if size is None:
+                sent = self._send(404, {"code": "rest_post_invalid_id"})
+            else:
+                sent = self._send(200, {"id": media_id, "media_details": {"filesize": size}})
+            return self._count("wp", sent=sent)
+        if "/wp/v2/media" in self.path:
+            return self._count("wp", sent=self._send(200, []))
+        self._send(404, {})
+    
+    def do_POST(self):
+        body = self._read_body()
+        time.sleep(self.server.wp_latency)
+        if self.path.endswith("/batch/v1"):
+            if not self.server.batch:
+                sent = self._send(404, {"code": "rest_no_route"})
+                return self._count("wp", received=len(body), sent=sent)
+            # 실제 WordPress 처럼 첨부파일 경로는 배치에 넣을 수 없음 (allow_batch = false)
+            results = [(400, {"code": "rest_batch_not_allowed", "data": {"status": 400}})
+                       if "/wp/v2/media" in item["path"]
+                       else self._write(item["path"], json.dumps(item.get("body", {})).encode("utf-8"))
+                       for item in json.loads(body)["requests"]]
+            sent = self._send(207, {"responses": [{"status": status, "body": data, "headers": {}}
+                                                  for status, data in results]})
+            return self._count("wp", received=len(body), sent=sent)
+        status, data = self._write(self.path, body)
+        self._count("wp", received=len(body), sent=self._send(status, data))
+    
+    def _write(self, path, body):
+        """POST 한 건 처리 → (상태 코드, 응답 JSON) - 배치 요청의 각 항목에도 사용"""
+        with self.server.lock:
+            if "/wp/v2/media/" in path or "/wp/v2/posts/" in path:
+                record_id = int(path.rstrip("/").rsplit("/", 1)[1])
+                if "/wp/v2/media/" in path:
+                    self.server.media_meta[record_id] = json.loads(body)
+                return 200, {"id": record_id}
+            if "/wp/v2/tags" in path:
+                name = json.loads(body)["name"]
+                if name in self.server.terms:
+                    return 400, {"code": "term_exists", "data": {"status": 400, "term_id": self.server.terms[name]}}
+                self.server.terms[name] = next(self.server.ids)
+                return 201, {"id": self.server.terms[name], "name": name}
+            new_id = next(self.server.ids)
+            if "/wp/v2/media" in path:
+                self.server.media[new_id] = len(body)
+                if b"<svg" in body[:200]:
+                    self.server.svg_media.add(new_id)
+            elif "/wp/v2/posts" in path:
+                self.server.posts[new_id] = json.loads(body)
+        return 201, {"id": new_id, "link": f"http://bench/{new_id}", "source_url": f"http://bench/{new_id}"}
+    
+    def _image(self):
+        with self.server.lock:
+            outcomes = self.server.image_outcomes
+            outcome = outcomes[self.server.stats["image_calls"] % len(outcomes)]
+        if outcome == "timeout":
+            time.sleep(self.server.stall_seconds)
+            sent = self._send(200, b"\x89PNG\r\n\x1a\n", content_type="image/png")
+        elif outcome == "530":
+            sent = self._send(530, b"overloaded", content_type="text/plain")
+        elif outcome == "tiny":
+            sent = self._send(200, b"\x89PNG\r\n\x1a\n" + b"\0" * 100, content_type="image/png")
+        else:
+            sent = self._send(200, self.server.image_body, content_type="image/png")
+        self._count("image", sent=sent)
+
+
+def fake_png(size):
+    """이미지 호스트 응답 본문: Pillow 가 있으면 실제 1792×1024 PNG(노이즈 섞인 그라데이션), 없으면 시그니처 + size 바이트"""
+    if main.load_pillow() is None:
+        return b"\x89PNG\r\n\x1a\n" + os.urandom(size)
+    Image, _ = main.load_pillow()
+    gradient = Image.linear_gradient("L").resize((1792, 1024))
+    noise = Image.effect_noise((1792, 1024), 24)
+    image = Image.merge("RGB", (gradient, Image.blend(gradient, noise, 0.5), noise))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class FakeServices:
+    """가짜 WordPress + 이미지 호스트 서버 (with 블록 동안 main 의 접속 주소를 교체)
+
+    image_outcomes: 이미지 요청마다 순서대로 돌아가며 적용할 결과 ("ok" / "530" / "timeout" / "tiny")
+    """
+    
+    def __init__(self, stats, image_outcomes=("ok",), image_bytes=60 * 1024, stall_seconds=3.0,
+                 batch=True, wp_latency=0.0):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeServiceHandler)
+        self.server.daemon_threads = True
+        self.server.stats = stats
+        self.server.lock = threading.Lock()
+        self.server.image_outcomes = list(image_outcomes)
+        self.server.image_body = fake_png(image_bytes)
+        self.server.media = {}
+        self.server.svg_media = set()
+        self.server.media_meta = {}
+        self.server.posts = {}
+        self.server.terms = {}
+        self.server.ids = itertools.count(1)
+        self.server.batch = batch
+        self.server.wp_latency = wp_latency
+        self.server.stall_seconds = stall_seconds
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+    
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self._saved = (main.WP_URL, main.IMAGE_SERVICE_URL)
+        main.WP_URL = f"{self.base_url}/wp-json/wp/v2/posts"
+        main.IMAGE_SERVICE_URL = self.base_url
+        # 모든 WP 호출이 가짜 서버로 가도록 가짜 사이트를 현재 사이트로 지정
+        site = {**main.default_site(), "name": "bench", "wp_user": "bench", "wp_app_pass": "bench"}
+        self._site = main.use_site(site)
+        self._site.__enter__()
+        return self
+    
+    def __exit__(self, *exc):
+        self._site.__exit__(*exc)
+        main.WP_URL, main.IMAGE_SERVICE_URL = self._saved
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# 시나리오: (Gemini 지연 초, Gemini 에러율, 이미지 결과 순서)
+PIPELINE_SCENARIOS = {
+    "정상": (0.05, 0.0, ["ok"]),
+    "Gemini 불안정": (0.05, 0.3, ["ok"]),
+    "이미지 불안정": (0.05, 0.0, ["530", "tiny", "timeout", "ok"]),
+    "이미지 장애": (0.05, 0.0, ["530", "timeout", "tiny"]),
+}
+
+
+def new_pipeline_stats():
+    keys = ["gemini_calls", "gemini_errors", "gemini_bytes", "wp_calls", "image_calls", "bytes_in", "bytes_out"]
+    return dict.fromkeys(keys, 0)
+
+
+def reset_main_state():
+    """시나리오 간에 모델 상태/캐시/토큰 집계가 이어지지 않도록 초기화"""
+    main._model_health = {}
+    main._rate_buckets.clear()
+    main.LLM_CACHE_ENABLED = False
+    main.LLM_CACHE_STATS.update(hit=0, miss=0)
+    main.TOKEN_USAGE.clear()
+    main._compacted_research.clear()
+    main.RESEARCH_STORE_ENABLED = False
+    main.RESEARCH_STORE_STATS.update(reuse=0, extend=0, search=0)
+    main._wp_batch_support = {}
+    main._wp_term_ids.clear()
+
+
+def run_scenario(target, latency, error_rate, image_outcomes):
+    """가짜 서비스 위에서 target 실행 → (소요 초, 성공 여부, 집계, 가짜 서버 - 만들어진 글/미디어 확인용)"""
+    stats = new_pipeline_stats()
+    reset_main_state()
+    saved_client = main.client
+    main.client = FakeGeminiClient(stats, latency=latency, error_rate=error_rate)
+    try:
+        with FakeServices(stats, image_outcomes, stall_seconds=main.IMAGE_TIMEOUT + 1) as services:
+            started = time.perf_counter()
+            ok = bool(target())
+            elapsed = time.perf_counter() - started
+    finally:
+        main.client = saved_client
+    return elapsed, ok, stats, services.server
+
+
+def check_pipeline_result(scenario, target_name, ok, server):
+    """가짜 서버에 남은 결과 확인 (틀리면 AssertionError)
+
+    - auto_posting: 글 1개가 즉시 발행(초안 강등 없음)되고, 태그/대표 이미지/alt·캡션이 붙음
+    - upload_image: 글 없이 미디어만 업로드
+    - 이미지 서비스가 모두 실패한 시나리오만 SVG 대체 이미지 사용
+    """
+    label = f"{scenario}/{target_name}"
+    assert ok, f"{label}: 실패"
+    outage = all(outcome != "ok" for outcome in PIPELINE_SCENARIOS[scenario][2])
+    if target_name == "upload_image":
+        assert not server.posts, f"{label}: 글이 만들어짐 {list(server.posts)}"
+        assert len(server.media) == 1, f"{label}: 미디어 {len(server.media)}개 업로드"
+        assert bool(server.svg_media) == outage, f"{label}: SVG 대체 이미지 {sorted(server.svg_media)}"
+        return
+    
+    assert len(server.posts) == 1, f"{label}: 글 {len(server.posts)}개 생성"
+    post = next(iter(server.posts.values()))
+    assert post["status"] == "publish", f"{label}: 발행 상태 {post['status']} (시간 부족으로 강등됨)"
+    assert post.get("tags") and set(post["tags"]) <= set(server.terms.values()), \
+        f"{label}: 태그 {post.get('tags')} / 만들어진 태그 {server.terms}"
+    media_id = post.get("featured_media")
+    assert media_id in server.media, f"{label}: 대표 이미지 {media_id} 없음"
+    assert (media_id in server.svg_media) == outage, f"{label}: 대표 이미지 {media_id} SVG 여부"
+    meta = server.media_meta.get(media_id) or {}
+    assert meta.get("alt_text") and meta.get("caption") == post["title"], f"{label}: 대표 이미지 alt/캡션 {meta}"
+
+
+def bench_pipeline():
+    """auto_posting / upload_image_to_wp 전체를 가짜 서비스로 실행해 시간·호출 수·바이트 측정"""
+    # 타임아웃 시나리오가 45초씩 걸리지 않도록 이미지 타임아웃만 줄임 (다른 대기는 실제 설정 그대로)
+    main.IMAGE_TIMEOUT = float(os.environ.get("BENCH_IMAGE_TIMEOUT", "2"))
+    targets = {
+        "auto_posting": lambda: main.auto_posting(),
+        "upload_image": lambda: main.upload_image_to_wp("Korean text '벤치마크', chart", "벤치마크 제목"),
+    }
+    
+    rows = []
+    for scenario, (latency, error_rate, image_outcomes) in PIPELINE_SCENARIOS.items():
+        for target_name, target in targets.items():
+            elapsed, ok, stats, server = run_scenario(target, latency, error_rate, image_outcomes)
+            check_pipeline_result(scenario, target_name, ok, server)
+            rows.append((scenario, target_name, elapsed, ok, stats))
+    
+    print()
+    print("🏎️ 오프라인 파이프라인 벤치마크 (가짜 Gemini / WordPress / 이미지 호스트)")
+    print(f"   {'시나리오':<14}{'대상':<14}{'성공':>4}{'시간(초)':>10}{'Gemini':>8}{'에러':>6}{'Gemini(KB)':>12}"
+          f"{'WP':>5}{'이미지':>7}{'업로드(KB)':>12}{'다운로드(KB)':>13}")
+    for scenario, target_name, elapsed, ok, stats in rows:
+        print(f"   {scenario:<14}{target_name:<14}{'✅' if ok else '❌':>4}{elapsed:>10.2f}"
+              f"{stats['gemini_calls']:>8}{stats['gemini_errors']:>6}"
+              f"{stats['gemini_bytes'] / 1024:>12.1f}{stats['wp_calls']:>5}{stats['image_calls']:>7}"
+              f"{stats['bytes_in'] / 1024:>12.1f}{stats['bytes_out'] / 1024:>13.1f}")
+    print(f"✅ 시나리오 {len(rows)}개 결과 확인 (글/태그/대표 이미지/alt·캡션/발행 상태)")
+
+
+def time_process(args, repeat=7):
+    """새 파이썬 프로세스 실행 시간 (ms) 목록 - CI 처럼 매번 차가운 상태에서 시작"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run([sys.executable] + args, cwd=here, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def slowest_imports(statement, count=5):
+    """python -X importtime 결과에서 누적 시간이 큰 모듈 (ms, 모듈명)"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], cwd=here,
+                            capture_output=True, text=True, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            rows.append((int(parts[1]) / 1000, parts[2].rstrip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def bench_startup():
+    """main.py import 와 CLI 시작 비용 (Gemini SDK 를 쓰지 않는 명령이 얼마나 가벼운지)"""
+    cases = {
+        "python (빈 실행)": ["-c", "pass"],
+        "import main": ["-c", "import main"],
+        "main.py --help": ["main.py", "--help"],
+        "import google.genai": ["-c", "import google.genai"],
+    }
+    print("⏱️ 시작 시간 벤치마크 (새 프로세스, ms)")
+    print(f"   {'대상':<22}{'최소':>10}{'중앙값':>10}")
+    for label, args in cases.items():
+        try:
+            timings = time_process(args)
+        except subprocess.CalledProcessError:
+            print(f"   {label:<22}{'실패':>10}")
+            continue
+        print(f"   {label:<22}{min(timings):>10.0f}{statistics.median(timings):>10.0f}")
+    
+    print("   import main 에서 오래 걸린 모듈 (누적 ms):")
+    for ms, module in slowest_imports("import main"):
+        print(f"     {ms:>8.1f}  {module.strip()}")
+
+
+# 같은 주에 몰리는 금리/환율 관련 주제 묶음 (마지막은 클러스터가 다른 주제)
+RESEARCH_TOPICS = [
+    "10월 기준금리 인하 전망과 대출 전략",
+    "기준금리 인하 전망 속 예금 금리 비교",
+    "10월 기준금리 인하 전망과 대출 전략",
+    "원달러 환율 1400원 돌파와 달러 투자",
+    "원달러 환율 1400원 시대 해외주식 환전 팁",
+    "연말정산 세액공제 항목 총정리",
+    "2026년 10월 코스피 전망",
+    "2026년 10월 비트코인 전망",
+]
+
+
+def bench_research():
+    """관련 주제 묶음을 차례로 리서치 - 저장소 없음(매번 검색) vs 저장소 사용(재사용/보강)"""
+    search_latency = float(os.environ.get("BENCH_SEARCH_LATENCY", "1.5"))
+    rows = []
+    for label, enabled in (("저장소 없음", False), ("저장소 사용", True)):
+        stats = new_pipeline_stats()
+        reset_main_state()
+        main.RESEARCH_STORE_ENABLED = enabled
+        saved_client, saved_state_dir = main.client, main.STATE_DIR
+        main.STATE_DIR = tempfile.mkdtemp(prefix="autowp-bench-research-")
+        main.client = FakeGeminiClient(stats, latency=0.2, search_latency=search_latency)
+        started = time.perf_counter()
+        try:
+            for topic in RESEARCH_TOPICS:
+                main.research_topic(topic)
+        finally:
+            main.client, main.STATE_DIR = saved_client, saved_state_dir
+        rows.append((label, time.perf_counter() - started, stats, dict(main.RESEARCH_STORE_STATS)))
+    
+    print()
+    print(f"📚 리서치 저장소 벤치마크 (주제 {len(RESEARCH_TOPICS)}개, 검색 호출 지연 {search_latency}초)")
+    print(f"   {'구성':<10}{'시간(초)':>10}{'Gemini':>8}{'검색':>6}{'재사용':>7}{'보강':>6}")
+    for label, elapsed, stats, store in rows:
+        print(f"   {label:<10}{elapsed:>10.2f}{stats['gemini_calls']:>8}{stats.get('search_calls', 0):>6}"
+              f"{store['reuse']:>7}{store['extend']:>6}")
+
+
+WRITE_OUTLINE = "\n".join(
+    ["제목: 벤치마크용 블로그 글 제목입니다", "", "1. 도입부", "   - 핵심 메시지: 왜 지금 중요한지"]
+    + [f"{number}. 섹션 {number - 1}\n   - 핵심 메시지: 수치와 사례" for number in range(2, 7)]
+    + ["7. 실전 활용 팁", "8. 마무리"]
+)
+
+
+WRITE_RESEARCH = "\n".join(f"- 핵심 수치 {i}: 기준금리 3.{i % 10}% 유지 시 대출 이자 변화 (한국은행, 2026년 10월)"
+                           for i in range(120))
+
+
+def bench_write():
+    """본문 작성 + 품질 검사: 전체 한 번에(single) vs 섹션별 동시(sections)"""
+    char_latency = float(os.environ.get("BENCH_CHAR_LATENCY", "0.5"))
+    saved_mode, saved_client = main.WRITE_MODE, main.client
+    rows = []
+    try:
+        for mode in main.WRITE_MODES:
+            stats = new_pipeline_stats()
+            reset_main_state()
+            main.WRITE_MODE = mode
+            main.client = FakeGeminiClient(stats, latency=0.2, char_latency=char_latency)
+            started = time.perf_counter()
+            content = main.write_full_content("벤치마크 주제", WRITE_OUTLINE, WRITE_RESEARCH)
+            written = time.perf_counter() - started
+            final = main.quality_check_and_improve("벤치마크 주제", content)
+            rows.append((mode, written, time.perf_counter() - started - written, stats, len(final)))
+    finally:
+        main.WRITE_MODE, main.client = saved_mode, saved_client
+    
+    print()
+    print(f"✍️ 본문 작성 벤치마크 (출력 1000자당 {char_latency}초, 아웃라인 8개 항목)")
+    print(f"   {'방식':<10}{'작성(초)':>10}{'검사(초)':>10}{'Gemini':>8}{'Gemini(KB)':>12}{'본문(자)':>10}")
+    for mode, written, checked, stats, length in rows:
+        print(f"   {mode:<10}{written:>10.2f}{checked:>10.2f}{stats['gemini_calls']:>8}"
+              f"{stats['gemini_bytes'] / 1024:>12.1f}{length:>10}")
+
+
+PUBLISH_POSTS = [
+    ("10월 기준금리 인하 전망과 대출 전략", "Korean text '금리 인하', bank interest chart, blue theme, high quality"),
+    ("원달러 환율 1400원 시대 달러 투자", "Korean text '환율', currency exchange board, green theme, 4K"),
+    ("연말정산 세액공제 항목 총정리", "Korean text '연말정산', tax documents and calculator, high quality"),
+    ("배당 ETF 포트폴리오 만들기", "Korean text '배당 ETF', dividend growth chart, orange accent"),
+    ("ISA 계좌 비과세 한도 활용법", "Korean text 'ISA', savings account infographic, blue theme"),
+]
+
+
+def bench_publish():
+    """글 여러 개를 태그 + 대표 이미지 alt/캡션과 함께 발행 - 배치 API 지원 사이트 vs 미지원 사이트"""
+    wp_latency = float(os.environ.get("BENCH_WP_LATENCY", "0.15"))
+    rows = []
+    for label, batch in (("개별 요청", False), ("배치 API", True)):
+        stats = new_pipeline_stats()
+        reset_main_state()
+        with FakeServices(stats, batch=batch, wp_latency=wp_latency):
+            started = time.perf_counter()
+            for index, (title, image_prompt) in enumerate(PUBLISH_POSTS):
+                image = b"\x89PNG\r\n\x1a\n" + random.Random(index).randbytes(20 * 1024)
+                media_id = main.upload_media(image, f"bench-{index}.png", "image/png")
+                r = {"topic": title, "title": title, "image_prompt": image_prompt}
+                main.publish_post(title, "<p>본문</p>", media_id, **main.post_extras(r))
+            rows.append((label, time.perf_counter() - started, stats))
+    
+    print()
+    print(f"🧺 발행 벤치마크 (글 {len(PUBLISH_POSTS)}개, 태그 + 대표 이미지 메타, WP 요청당 {wp_latency}초)")
+    print(f"   {'구성':<10}{'시간(초)':>10}{'WP 요청':>9}{'업로드(KB)':>12}")
+    for label, elapsed, stats in rows:
+        print(f"   {label:<10}{elapsed:>10.2f}{stats['wp_calls']:>9}{stats['bytes_in'] / 1024:>12.1f}")
+
+
+BENCHMARKS = {
+    "html": bench_html,
+    "pipeline": bench_pipeline,
+    "startup": bench_startup,
+    "research": bench_research,
+    "write": bench_write,
+    "publish": bench_publish,
+}
+
+
+def run(names=None):
+    """이름을 지정한 벤치마크 실행 (생략 시 전체)"""
+    names = names or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"❌ 알 수 없는 벤치마크: {name} (가능: {', '.join(BENCHMARKS)})")
+            sys.exit(1)
+    for name in names:
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    run(sys.argv[1:])
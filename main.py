@@ -1,13 +1,23 @@
 # -*- coding: utf-8 -*-
 import os
 import requests
+from requests.adapters import HTTPAdapter
 import base64
+import io
 import urllib3
 import urllib.parse
-from google import genai
 import time
 import random
 import json
+import html
+import re
+import hashlib
+import email.utils
+import sqlite3
+import threading
+import contextvars
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 
 # SSL 경고 무시
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -18,62 +28,1436 @@ WP_USER = os.environ.get("WP_USER")
 WP_APP_PASS = os.environ.get("WP_APP_PASS")
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
 
-client = genai.Client(api_key=GEMINI_API_KEY)
+# Gemini 클라이언트는 처음 필요할 때 생성 (SDK import 가 무거워 제목 동기화 등 Gemini 를 안 쓰는 명령은 건너뜀)
+client = None
+_genai_client_lock = threading.Lock()
+
+def get_genai_client():
+    """Gemini 클라이언트 (최초 호출 시 google.genai import + 생성)"""
+    global client
+    if client is None:
+        with _genai_client_lock:
+            if client is None:
+                from google import genai
+                client = genai.Client(api_key=GEMINI_API_KEY)
+    return client
+
+def genai_types():
+    """google.genai.types 모듈 (요청 설정 객체용, 필요할 때만 import)"""
+    from google.genai import types
+    return types
+
+# 💾 로컬 상태 저장 위치 (캐시, 실행 기록 등)
+STATE_DIR = os.environ.get("AUTOWP_STATE_DIR", ".autowp")
+
+def open_state_db(filename):
+    """STATE_DIR 아래 SQLite DB 연결 (스레드마다 새 연결 사용)"""
+    os.makedirs(STATE_DIR, exist_ok=True)
+    return sqlite3.connect(os.path.join(STATE_DIR, filename), timeout=30)
+
+# 📈 트레이싱: 스테이지/외부 호출 구간을 JSON-lines 로 기록 (선택적으로 OTLP 수집기로 전송)
+TRACE_ENABLED = os.environ.get("AUTOWP_TRACE", "1") != "0"
+TRACE_FILE = "traces.jsonl"
+TRACE_SUMMARY_RUNS = int(os.environ.get("TRACE_SUMMARY_RUNS", "50"))
+# 트레이스 파일이 이 크기를 넘으면 최근 TRACE_SUMMARY_RUNS 개 실행만 남기고 정리
+TRACE_FILE_MAX_BYTES = int(os.environ.get("TRACE_FILE_MAX_BYTES", str(5 * 1024 * 1024)))
+# 예: http://localhost:4318 (OTLP/HTTP JSON, 비워두면 파일에만 기록)
+OTLP_ENDPOINT = os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT", "").rstrip("/")
+OTLP_SERVICE_NAME = os.environ.get("OTEL_SERVICE_NAME", "xeon-autowp")
+_current_span = contextvars.ContextVar("autowp_span", default=None)
+_trace_lock = threading.Lock()
+_otlp_pending = {}
+
+@contextmanager
+def trace_span(name, **attrs):
+    """구간 기록 - with 블록의 소요 시간과 속성을 traces.jsonl 에 한 줄로 남김
+
+    yield 되는 dict 에 모델/재시도 횟수/바이트/토큰 수 등을 채우면 함께 기록됩니다.
+    부모 구간은 contextvars 로 이어지므로 스레드 풀에 넘길 때는
+    contextvars.copy_context().run 으로 감싸서 제출합니다.
+    """
+    attrs = dict(attrs)
+    if not TRACE_ENABLED:
+        yield attrs
+        return
+    
+    parent = _current_span.get()
+    span = {
+        "trace_id": parent["trace_id"] if parent else os.urandom(16).hex(),
+        "span_id": os.urandom(8).hex(),
+        "parent_id": parent["span_id"] if parent else None,
+        "name": name,
+        "start": time.time(),
+        "attrs": attrs,
+        "status": "ok",
+    }
+    token = _current_span.set(span)
+    try:
+        yield attrs
+    except Exception as e:
+        span["status"] = "error"
+        span["error"] = f"{type(e).__name__}: {e}"[:300]
+        raise
+    finally:
+        _current_span.reset(token)
+        span["duration"] = round(time.time() - span["start"], 4)
+        _emit_span(span)
+
+def _emit_span(span):
+    """구간 파일 기록 + OTLP 전송 (루트 구간이 끝날 때 트레이스 단위로 묶어서 전송)"""
+    export = None
+    with _trace_lock:
+        path = os.path.join(STATE_DIR, TRACE_FILE)
+        try:
+            os.makedirs(STATE_DIR, exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(span, ensure_ascii=False, default=str) + "\n")
+            if span["parent_id"] is None and os.path.getsize(path) > TRACE_FILE_MAX_BYTES:
+                _trim_trace_file(path)
+        except OSError as e:
+            print(f"⚠️ 트레이스 기록 실패: {e}")
+        if OTLP_ENDPOINT:
+            _otlp_pending.setdefault(span["trace_id"], []).append(span)
+            if span["parent_id"] is None:
+                export = _otlp_pending.pop(span["trace_id"])
+    if export:
+        export_otlp(export)
+
+def _trim_trace_file(path, keep_runs=None):
+    """루트 구간 이름별 최근 keep_runs 개 트레이스와 아직 끝나지 않은 트레이스의 구간만 남김 (호출자가 락 보유)"""
+    keep_runs = keep_runs or TRACE_SUMMARY_RUNS
+    with open(path, encoding="utf-8") as f:
+        lines = f.readlines()
+    spans = []
+    roots = {}
+    for line in lines:
+        try:
+            span = json.loads(line)
+        except ValueError:
+            continue
+        spans.append((span["trace_id"], line))
+        if span["parent_id"] is None:
+            roots.setdefault(span["name"], []).append(span["trace_id"])
+    dropped = {trace_id for trace_ids in roots.values() for trace_id in trace_ids[:-keep_runs]}
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.writelines(line for trace_id, line in spans if trace_id not in dropped)
+    os.replace(tmp_path, path)
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def export_otlp(spans):
+    """OpenTelemetry 수집기로 전송 (OTLP/HTTP JSON, 실패해도 실행은 계속)"""
+    otlp_spans = []
+    for span in spans:
+        end = span["start"] + span["duration"]
+        otlp_spans.append({
+            "traceId": span["trace_id"],
+            "spanId": span["span_id"],
+            "parentSpanId": span["parent_id"] or "",
+            "name": span["name"],
+            "kind": 1,
+            "startTimeUnixNano": str(int(span["start"] * 1e9)),
+            "endTimeUnixNano": str(int(end * 1e9)),
+            "attributes": [{"key": key, "value": _otlp_value(value)}
+                           for key, value in span["attrs"].items() if value is not None],
+            "status": {"code": 2, "message": span["error"]} if span["status"] == "error" else {"code": 1},
+        })
+    payload = {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": OTLP_SERVICE_NAME}}]},
+        "scopeSpans": [{"scope": {"name": "autowp"}, "spans": otlp_spans}],
+    }]}
+    try:
+        response = get_http_session(OTLP_ENDPOINT).post(f"{OTLP_ENDPOINT}/v1/traces", json=payload, timeout=5)
+        if response.status_code >= 300:
+            print(f"⚠️ 트레이스 전송 실패 (HTTP {response.status_code})")
+    except requests.RequestException as e:
+        print(f"⚠️ 트레이스 전송 실패: {e}")
+
+def _pause(seconds, cancel_event=None):
+    """취소 가능한 대기 (취소되면 True) - 대기 시간도 sleep 구간으로 기록"""
+    with trace_span("sleep", seconds=round(seconds, 2)):
+        if cancel_event is None:
+            time.sleep(seconds)
+            return False
+        return cancel_event.wait(seconds)
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, int(len(ordered) * fraction + 0.999999) - 1))]
+
+def print_trace_summary(trace_id=None, root_name="auto_posting"):
+    """저장된 실행들의 구간별 소요 시간 p50/p95 표
+
+    실행(트레이스)마다 같은 이름의 구간 시간을 합산한 뒤 최근 TRACE_SUMMARY_RUNS 개 실행에 대해 집계합니다.
+    동시에 진행된 구간은 겹치므로 합이 전체 시간보다 클 수 있습니다.
+    """
+    path = os.path.join(STATE_DIR, TRACE_FILE)
+    if not TRACE_ENABLED or not os.path.exists(path):
+        return
+    
+    per_trace = {}
+    roots = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                span = json.loads(line)
+            except ValueError:
+                continue
+            totals = per_trace.setdefault(span["trace_id"], {})
+            totals[span["name"]] = totals.get(span["name"], 0.0) + span["duration"]
+            if span["parent_id"] is None and span["name"] == root_name:
+                roots.append(span["trace_id"])
+    
+    runs = roots[-TRACE_SUMMARY_RUNS:]
+    if not runs:
+        return
+    names = sorted({name for trace in runs for name in per_trace[trace]},
+                   key=lambda name: (name != root_name, name))
+    current = per_trace.get(trace_id, {})
+    print(f"📈 구간별 소요 시간 (최근 {len(runs)}회 실행 기준, 초)")
+    print(f"   {'구간':<26}{'실행':>6}{'이번':>10}{'p50':>10}{'p95':>10}")
+    for name in names:
+        values = [per_trace[trace][name] for trace in runs if name in per_trace[trace]]
+        this_run = f"{current[name]:.1f}" if name in current else "-"
+        print(f"   {name:<26}{len(values):>6}{this_run:>10}{_percentile(values, 0.5):>10.1f}{_percentile(values, 0.95):>10.1f}")
+
+def current_trace_id():
+    """현재 구간의 트레이스 ID (구간 밖이면 None)"""
+    span = _current_span.get()
+    return span["trace_id"] if span else None
+
+# 🔌 HTTP 커넥션 풀 설정 (호스트별 keep-alive 세션)
+HTTP_POOL_CONNECTIONS = int(os.environ.get("HTTP_POOL_CONNECTIONS", "4"))
+HTTP_POOL_MAXSIZE = int(os.environ.get("HTTP_POOL_MAXSIZE", "10"))
+BROWSER_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+# 이미지 생성 서비스 주소 (벤치마크/테스트에서는 로컬 가짜 서버로 교체)
+IMAGE_SERVICE_URL = os.environ.get("IMAGE_SERVICE_URL", "https://image.pollinations.ai").rstrip("/")
+
+_http_sessions = {}
+_http_sessions_lock = threading.Lock()
+
+def basic_auth_header(user, password):
+    """WordPress 앱 비밀번호용 Basic 인증 헤더"""
+    credentials = f"{user}:{password}"
+    token = base64.b64encode(credentials.encode()).decode()
+    return f"Basic {token}"
+
+def get_http_session(url, auth=None, verify=True):
+    """호스트별로 재사용되는 keep-alive 세션 반환
+
+    같은 (호스트, 인증정보) 조합은 하나의 세션/커넥션 풀을 공유하므로
+    배치·멀티사이트 실행에서도 TCP+TLS 핸드셰이크를 매번 하지 않습니다.
+    auth: (user, password) 튜플 - 세션 기본 헤더에 Authorization 으로 유지
+    """
+    parts = urllib.parse.urlsplit(url)
+    key = (parts.scheme, parts.netloc, auth, verify)
+    
+    with _http_sessions_lock:
+        session = _http_sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.verify = verify
+            if auth:
+                session.headers["Authorization"] = basic_auth_header(*auth)
+            _http_sessions[key] = session
+        return session
+
+def get_wp_session():
+    """현재 사이트의 WordPress REST API 세션 (인증 헤더 포함, 사이트별 커넥션 풀)"""
+    site = current_site()
+    return get_http_session(site["wp_url"], auth=(site["wp_user"], site["wp_app_pass"]), verify=site["verify_ssl"])
+
+def get_image_session():
+    """이미지 생성 서비스 세션 (브라우저 User-Agent 유지)"""
+    session = get_http_session(IMAGE_SERVICE_URL)
+    session.headers["User-Agent"] = BROWSER_USER_AGENT
+    return session
+
+# 🌐 사이트 레지스트리 (여러 워드프레스 블로그 - 사이트별 인증/카테고리/페르소나)
+SITES_FILE = os.environ.get("AUTOWP_SITES_FILE", "sites.json")
+DEFAULT_PERSONA = {
+    "name": "플럭시(Fluxy)",
+    "nickname": "플럭시",
+    "brand": "PLUXEON 경제 블로그",
+    "style": "",
+    "closing": "이 글이 도움이 되셨길 바랍니다. 다음에 또 유익한 정보로 찾아올게요!",
+}
+_current_site = contextvars.ContextVar("autowp_site", default=None)
+_sites_cache = {}
+
+def default_site():
+    """환경변수(WP_URL/WP_USER/WP_APP_PASS) 기반 기본 사이트"""
+    return {
+        "name": "default",
+        "wp_url": WP_URL,
+        "media_url": None,
+        "wp_user": WP_USER,
+        "wp_app_pass": WP_APP_PASS,
+        "categories": [1],
+        "persona": DEFAULT_PERSONA,
+        "verify_ssl": False,
+    }
+
+def load_sites(path=None):
+    """사이트 목록 로드 (sites.json 이 없으면 환경변수 기반 단일 사이트)
+
+    sites.json 예시:
+    [{"name": "pluxeon", "wp_url": "https://a.com/wp-json/wp/v2/posts", "wp_user": "admin",
+      "wp_app_pass_env": "PLUXEON_WP_APP_PASS", "categories": [3],
+      "persona": {"name": "플럭시(Fluxy)", "nickname": "플럭시", "brand": "PLUXEON 경제 블로그"}}]
+    앱 비밀번호는 파일에 직접 쓰지 않고 wp_app_pass_env 로 환경변수 이름만 지정합니다.
+    """
+    path = path or SITES_FILE
+    if not os.path.exists(path):
+        return [default_site()]
+    if path not in _sites_cache:
+        with open(path, encoding="utf-8") as f:
+            entries = json.load(f)
+        sites = []
+        for entry in entries:
+            if not entry.get("name") or not entry.get("wp_url"):
+                raise ValueError(f"사이트 설정에 name/wp_url 이 없습니다: {entry}")
+            if "wp_app_pass" in entry:
+                raise ValueError(f"[{entry['name']}] 앱 비밀번호를 sites.json 에 직접 쓰지 마세요 "
+                                 f"(wp_app_pass_env 에 환경변수 이름 지정)")
+            sites.append({
+                "name": entry["name"],
+                "wp_url": entry["wp_url"].rstrip("/"),
+                "media_url": entry.get("media_url"),
+                "wp_user": entry.get("wp_user"),
+                "wp_app_pass": os.environ.get(entry.get("wp_app_pass_env") or "", ""),
+                "categories": entry.get("categories", [1]),
+                "persona": {**DEFAULT_PERSONA, **entry.get("persona", {})},
+                "verify_ssl": entry.get("verify_ssl", False),
+            })
+        if len({site["name"] for site in sites}) != len(sites):
+            raise ValueError("사이트 이름이 중복되었습니다.")
+        _sites_cache[path] = sites
+    return _sites_cache[path]
+
+def get_site(name):
+    """이름으로 사이트 찾기"""
+    for site in load_sites():
+        if site["name"] == name:
+            return site
+    raise ValueError(f"알 수 없는 사이트: {name} (가능: {', '.join(site['name'] for site in load_sites())})")
+
+def current_site():
+    """지금 작업 중인 사이트 (use_site 로 지정하지 않았으면 첫 번째 사이트)"""
+    return _current_site.get() or load_sites()[0]
+
+@contextmanager
+def use_site(site):
+    """with 블록 안의 WP 호출/페르소나/상태 파일을 해당 사이트 기준으로 전환"""
+    token = _current_site.set(site)
+    try:
+        yield site
+    finally:
+        _current_site.reset(token)
+
+def wp_posts_url():
+    return current_site()["wp_url"]
+
+def wp_media_url():
+    """미디어 엔드포인트 (설정에 없으면 posts 엔드포인트와 같은 REST 경로의 /media)"""
+    site = current_site()
+    return site["media_url"] or re.sub(r"/posts/?$", "/media", site["wp_url"])
+
+def site_state_file(filename):
+    """사이트별 상태 파일 이름 (기본/첫 사이트는 기존 파일 그대로, 나머지는 이름-사이트.확장자)"""
+    site = current_site()
+    if site["name"] in ("default", load_sites()[0]["name"]):
+        return filename
+    stem, extension = os.path.splitext(filename)
+    return f"{stem}-{site['name']}{extension}"
 
 # 🚀 모델 설정
 MODELS_TO_TRY = ["gemini-2.0-flash-exp", "gemini-2.0-flash-lite", "gemini-flash-latest"]
 
-def generate_content_with_retry(prompt, use_search=False):
-    """AI 콘텐츠 생성 (웹 서치 옵션 포함)"""
+# 🧩 스테이지 그래프 설정 (독립 스테이지 동시 실행)
+STAGE_WORKERS = int(os.environ.get("STAGE_WORKERS", "4"))
+
+# 📦 배치 모드 동시성 제한 (자원별로 따로 관리)
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", "3"))
+GEMINI_SLOTS = threading.BoundedSemaphore(int(os.environ.get("GEMINI_CONCURRENCY", "4")))
+IMAGE_SLOTS = threading.BoundedSemaphore(int(os.environ.get("IMAGE_CONCURRENCY", "2")))
+WP_CONCURRENCY = int(os.environ.get("WP_CONCURRENCY", "2"))
+_wp_slots = {}
+_wp_slots_lock = threading.Lock()
+
+def wp_slots():
+    """현재 사이트의 WP 쓰기 동시성 제한 (사이트마다 따로 - 한 사이트가 느려도 다른 사이트는 진행)"""
+    name = current_site()["name"]
+    with _wp_slots_lock:
+        if name not in _wp_slots:
+            _wp_slots[name] = threading.BoundedSemaphore(WP_CONCURRENCY)
+        return _wp_slots[name]
+
+def wp_provider():
+    """현재 사이트의 요청 한도 버킷 이름 (사이트마다 따로 "wp:<이름>")"""
+    return f"wp:{current_site()['name']}"
+
+# ⏳ 실행 마감 시간: 남은 시간을 모든 네트워크 호출의 타임아웃으로 넘기고, 부족하면 단계별로 품질을 낮춤
+# 남은 시간(초)이 아래 값보다 적으면: 품질 검사 생략 → 이미지 서비스 대신 SVG 썸네일 → 초안으로 저장
+DEADLINE_QUALITY_RESERVE = float(os.environ.get("DEADLINE_QUALITY_RESERVE", "180"))
+DEADLINE_IMAGE_RESERVE = float(os.environ.get("DEADLINE_IMAGE_RESERVE", "120"))
+DEADLINE_DRAFT_RESERVE = float(os.environ.get("DEADLINE_DRAFT_RESERVE", "60"))
+# 마감이 지나도 발행(초안 저장) 요청에는 이만큼은 주어 만든 글을 잃지 않음
+DEADLINE_PUBLISH_GRACE = float(os.environ.get("DEADLINE_PUBLISH_GRACE", "20"))
+_run_deadline = contextvars.ContextVar("autowp_deadline", default=None)
+_run_degraded = contextvars.ContextVar("autowp_degraded", default=None)
+
+class DeadlineExceeded(Exception):
+    """실행 마감 시간 초과"""
+
+def parse_duration(value):
+    """"8m" / "90s" / "1h" / "480"(초) → 초"""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([smh]?)\s*", str(value).lower())
+    if not match:
+        raise ValueError(f"시간 형식 오류: {value} (예: 8m, 90s, 1h)")
+    return float(match.group(1)) * {"": 1, "s": 1, "m": 60, "h": 3600}[match.group(2)]
+
+@contextmanager
+def use_deadline(seconds):
+    """with 블록 전체의 마감 시간 설정 (바깥에 더 이른 마감이 있으면 그것을 유지, None 이면 제한 없음)
+
+    contextvars 로 전달되므로 스테이지/배치 워커 스레드에도 그대로 적용됩니다.
+    """
+    if seconds is None:
+        yield None
+        return
+    deadline = time.time() + seconds
+    outer = _run_deadline.get()
+    token = _run_deadline.set(min(deadline, outer) if outer else deadline)
+    try:
+        yield _run_deadline.get()
+    finally:
+        _run_deadline.reset(token)
+
+def remaining_time():
+    """마감까지 남은 초 (마감이 없으면 None)"""
+    deadline = _run_deadline.get()
+    return None if deadline is None else deadline - time.time()
+
+def check_deadline(needed=0.0):
+    """남은 시간이 needed 초 이하이면 DeadlineExceeded"""
+    remaining = remaining_time()
+    if remaining is not None and remaining <= needed:
+        raise DeadlineExceeded(f"⏳ 실행 마감 시간 초과 (남은 시간 {max(remaining, 0):.0f}초)")
+
+def call_timeout(default=None, grace=0.0):
+    """네트워크 호출 타임아웃: 기본값과 남은 시간 중 짧은 쪽 (마감이 없으면 기본값)
+
+    grace: 마감이 지났어도 보장할 최소 시간 (0 이면 마감이 지난 경우 DeadlineExceeded)
+    """
+    remaining = remaining_time()
+    if remaining is None:
+        return default
+    if remaining <= 0 and not grace:
+        check_deadline()
+    remaining = max(remaining, grace)
+    return min(default, remaining) if default else remaining
+
+def deadline_low(reserve):
+    """남은 시간이 reserve 초보다 적은지 (마감이 없으면 False)"""
+    remaining = remaining_time()
+    return remaining is not None and remaining < reserve
+
+def note_degraded(step):
+    """시간 부족으로 생략/대체한 단계 기록 (기록이 있으면 글은 초안으로 저장)"""
+    degraded = _run_degraded.get()
+    if degraded is not None:
+        degraded.append(step)
+    print(f"⏳ 남은 시간 {max(remaining_time() or 0, 0):.0f}초 - {step}")
+
+def publish_status(status="publish"):
+    """시간 부족으로 단계를 생략했거나 남은 시간이 적으면 즉시 발행 대신 초안"""
+    if status == "publish" and (_run_degraded.get() or deadline_low(DEADLINE_DRAFT_RESERVE)):
+        print("📝 마감 시간에 쫓겨 만든 글이라 초안으로 저장합니다 (검토 후 발행하세요).")
+        return "draft"
+    return status
+
+# 🚦 제공자별 요청 한도 (분당) - 고정 대기 대신 한도가 찼을 때만 기다림
+RATE_LIMITS = {
+    "gemini_rpm": float(os.environ.get("GEMINI_RPM", "15")),        # 모델별 분당 요청 수
+    "gemini_tpm": float(os.environ.get("GEMINI_TPM", "1000000")),   # 모델별 분당 입력 토큰
+    "image": float(os.environ.get("IMAGE_RPM", "20")),              # 이미지 생성 서비스
+    "wp": float(os.environ.get("WP_RPM", "60")),                    # WordPress REST API
+}
+_rate_buckets = {}
+_rate_buckets_lock = threading.Lock()
+
+class TokenBucket:
+    """토큰 버킷: 분당 per_minute 만큼 채워지고 최대 1분치까지 모아둘 수 있음
+
+    reserve() 는 토큰을 먼저 차감(음수 허용)하고 기다릴 시간을 돌려주므로
+    여러 스레드가 동시에 요청해도 도착 순서대로 간격이 벌어집니다.
+    """
+    
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+    
+    def reserve(self, amount=1):
+        """amount 만큼 예약하고 기다려야 할 시간(초) 반환 (0 이면 바로 사용 가능)"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= min(amount, self.capacity)
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.blocked_until - now)
+    
+    def defer(self, seconds):
+        """서버가 알려준 시간(Retry-After) 동안 새 요청 보류"""
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+def _rate_bucket(name, limit_key):
+    with _rate_buckets_lock:
+        bucket = _rate_buckets.get(name)
+        if bucket is None:
+            bucket = _rate_buckets[name] = TokenBucket(RATE_LIMITS[limit_key])
+        return bucket
+
+def _provider_buckets(provider):
+    """provider: "gemini:<모델>" / "image" / "wp:<사이트>" → [(버킷, 토큰 단위 여부)]"""
+    if provider.startswith("gemini:"):
+        return [(_rate_bucket(provider + ":rpm", "gemini_rpm"), False),
+                (_rate_bucket(provider + ":tpm", "gemini_tpm"), True)]
+    return [(_rate_bucket(provider, provider.split(":")[0]), False)]
+
+def throttle(provider, tokens=0, cancel_event=None, grace=0.0):
+    """요청 직전 호출 - 한도에 여유가 있으면 바로 반환, 소진됐으면 필요한 만큼만 대기
+
+    tokens: Gemini 입력 토큰 어림값 (TPM 버킷 차감용)
+    grace: call_timeout 과 같은 값 - 마감 이후에도 시간을 보장받는 요청(발행)은 대기 전 마감 검사를 하지 않음
+    반환: 대기 중 cancel_event 로 취소되면 True
+    """
+    delay = max(bucket.reserve(tokens if per_token else 1) for bucket, per_token in _provider_buckets(provider))
+    if delay <= 0:
+        return False
+    if not grace:
+        check_deadline(delay)
+    print(f"🚦 {provider} 요청 한도 도달 - {delay:.1f}초 대기")
+    return _pause(delay, cancel_event)
+
+def defer_provider(provider, seconds):
+    """Retry-After / 쿼터 초과 응답을 받으면 해당 제공자(모델) 요청을 seconds 동안 보류"""
+    if seconds and seconds > 0:
+        _provider_buckets(provider)[0][0].defer(seconds)
+        print(f"🚦 {provider} {seconds:.1f}초간 요청 보류 (서버 요청)")
+
+def retry_after_seconds(value, default=None):
+    """Retry-After 헤더 값(초 또는 HTTP 날짜) → 초"""
+    if not value:
+        return default
+    value = str(value).strip()
+    if re.fullmatch(r"\d+(\.\d+)?", value):
+        return float(value)
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+def note_wp_response(response):
+    """WordPress 가 429/503 으로 답하면 Retry-After(없으면 3초) 동안 WP 요청 보류"""
+    if response.status_code in (429, 503):
+        defer_provider(wp_provider(), retry_after_seconds(response.headers.get("Retry-After"), 3))
+
+def gemini_retry_delay(error):
+    """Gemini 429 에러의 RetryInfo(retryDelay: "17s") → 초 (없으면 None)"""
+    match = re.search(r"retry_?delay['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)s", str(error), re.I)
+    return float(match.group(1)) if match else None
+
+# 🗄️ LLM 응답 캐시 설정
+# 스테이지별 유효기간(초) - 목록에 없는 스테이지는 캐시하지 않음
+LLM_CACHE_TTL = {
+    "topic": 1 * 3600,
+    "research": 3 * 3600,
+    "outline": 7 * 24 * 3600,
+    "write": 7 * 24 * 3600,
+    "quality": 7 * 24 * 3600,
+    "image_prompt": 7 * 24 * 3600,
+    "compact": 3 * 3600,
+    "plan": 7 * 24 * 3600,
+    "research_extend": 3 * 3600,
+    "write_section": 7 * 24 * 3600,
+    "quality_section": 7 * 24 * 3600,
+}
+LLM_CACHE_MAX_BYTES = int(os.environ.get("LLM_CACHE_MAX_MB", "50")) * 1024 * 1024
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE_DISABLED", "") != "1"
+LLM_CACHE_STATS = {"hit": 0, "miss": 0}
+_llm_cache_lock = threading.Lock()
+
+def _llm_cache_db():
+    conn = open_state_db("llm_cache.sqlite3")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            key TEXT PRIMARY KEY,
+            stage TEXT,
+            model TEXT,
+            response TEXT,
+            created REAL,
+            accessed REAL,
+            size INTEGER
+        )
+    """)
+    return conn
+
+def llm_cache_key(model, prompt, tools):
+    """(모델, 프롬프트, 도구) 해시 키"""
+    raw = json.dumps([model, prompt, list(tools or [])], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def llm_cache_get(stage, model, prompt, tools):
+    """캐시 조회 (만료된 항목은 삭제 후 None)"""
+    ttl = LLM_CACHE_TTL.get(stage)
+    if not (LLM_CACHE_ENABLED and ttl):
+        return None
+    
+    key = llm_cache_key(model, prompt, tools)
+    now = time.time()
+    with _llm_cache_lock:
+        conn = _llm_cache_db()
+        try:
+            row = conn.execute("SELECT response, created FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > ttl:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                conn.commit()
+                return None
+            conn.execute("UPDATE llm_cache SET accessed = ? WHERE key = ?", (now, key))
+            conn.commit()
+            return row[0]
+        finally:
+            conn.close()
+
+def llm_cache_put(stage, model, prompt, tools, response_text):
+    """캐시 저장 후 전체 크기가 한도를 넘으면 오래 안 쓴 항목부터 제거 (LRU)"""
+    if not (LLM_CACHE_ENABLED and LLM_CACHE_TTL.get(stage)) or not response_text:
+        return
+    
+    key = llm_cache_key(model, prompt, tools)
+    now = time.time()
+    size = len(response_text.encode("utf-8"))
+    with _llm_cache_lock:
+        conn = _llm_cache_db()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, stage, model, response_text, now, now, size)
+            )
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+            if total > LLM_CACHE_MAX_BYTES:
+                rows = conn.execute("SELECT key, size FROM llm_cache ORDER BY accessed ASC").fetchall()
+                for old_key, old_size in rows:
+                    if total <= LLM_CACHE_MAX_BYTES:
+                        break
+                    conn.execute("DELETE FROM llm_cache WHERE key = ?", (old_key,))
+                    total -= old_size
+            conn.commit()
+        finally:
+            conn.close()
+
+# 🩺 모델 상태 추적 (롤링 지연/에러율 + 서킷 브레이커, 실행 간 유지)
+MODEL_HEALTH_WINDOW = 20
+MODEL_DEFAULT_LATENCY = 10.0
+MODEL_CIRCUIT_FAILURES = int(os.environ.get("MODEL_CIRCUIT_FAILURES", "3"))
+MODEL_CIRCUIT_COOLDOWN = float(os.environ.get("MODEL_CIRCUIT_COOLDOWN", "600"))
+BACKOFF_BASE_SECONDS = {"rate_limit": 4.0, "transient": 1.0, "hard": 0.0, "request": 0.0}
+# 모델 자체를 쓸 수 없다는 응답 (권한 없음/모델 없음) - 이때만 서킷을 바로 엶
+MODEL_HARD_ERROR_CODES = (401, 403, 404)
+BACKOFF_MAX_SECONDS = 30.0
+_model_health = None
+_model_health_lock = threading.Lock()
+
+def _model_health_path():
+    return os.path.join(STATE_DIR, "model_health.json")
+
+def _get_model_health():
+    """모델 상태 로드 (최초 1회 디스크에서 읽음, 호출자가 락 보유)"""
+    global _model_health
+    if _model_health is None:
+        try:
+            with open(_model_health_path(), encoding="utf-8") as f:
+                _model_health = json.load(f)
+        except (OSError, ValueError):
+            _model_health = {}
+    return _model_health
+
+def _save_model_health():
+    os.makedirs(STATE_DIR, exist_ok=True)
+    tmp_path = _model_health_path() + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(_model_health, f)
+    os.replace(tmp_path, _model_health_path())
+
+def classify_model_error(error):
+    """에러 종류 구분: rate_limit(쿼터 초과) / hard(모델을 쓸 수 없음) / request(이 요청만의 문제) / transient(일시 장애)
+
+    400 INVALID_ARGUMENT 같은 요청 에러는 모델 상태와 무관하므로 서킷에 반영하지 않습니다.
+    상태 코드/상태 이름을 먼저 보고, 둘 다 없을 때만 에러 메시지로 판단합니다.
+    """
+    code = getattr(error, "code", None)
+    if not isinstance(code, int):
+        # requests.HTTPError 등은 응답 객체에 상태 코드가 있음
+        code = getattr(getattr(error, "response", None), "status_code", None)
+    status = getattr(error, "status", None)  # google.genai APIError: "RESOURCE_EXHAUSTED" 등
+    if isinstance(code, int) or isinstance(status, str):
+        if code == 429 or status == "RESOURCE_EXHAUSTED":
+            return "rate_limit"
+        if code in MODEL_HARD_ERROR_CODES:
+            return "hard"
+        if isinstance(code, int) and 400 <= code < 500:
+            return "request"
+        return "transient"
+    
+    # 상태 코드가 없는 에러(다른 예외로 감싼 경우 등)만 메시지로 판단 - 토큰 수 "1429" 같은 숫자는 무시
+    message = str(error)
+    if re.search(r"\b429\b", message) or "RESOURCE_EXHAUSTED" in message:
+        return "rate_limit"
+    return "transient"
+
+def backoff_delay(failures, kind):
+    """실패한 모델을 보류할 시간: 지터가 들어간 지수 백오프 (full jitter), hard/request 에러는 0
+
+    failures: 그 모델의 연속 실패 횟수 (record_model_result 반환값)
+    """
+    base = BACKOFF_BASE_SECONDS.get(kind, 1.0)
+    if base <= 0:
+        return 0.0
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, base * (2 ** max(failures - 1, 0))))
+
+def record_model_result(model, ok, latency, kind=None):
+    """호출 결과 기록 - 연속 실패가 쌓이거나 hard 에러면 서킷을 열어 쿨다운 동안 제외
+
+    반환: 그 모델의 연속 실패 횟수 (request 에러는 세지 않음)
+    """
+    with _model_health_lock:
+        stats = _get_model_health().setdefault(model, {"samples": [], "failures": 0, "open_until": 0})
+        stats["samples"] = (stats["samples"] + [[1 if ok else 0, round(latency, 3)]])[-MODEL_HEALTH_WINDOW:]
+        if ok:
+            stats["failures"] = 0
+            stats["open_until"] = 0
+        elif kind != "request":
+            stats["failures"] += 1
+            if kind == "hard" or stats["failures"] >= MODEL_CIRCUIT_FAILURES:
+                stats["open_until"] = time.time() + MODEL_CIRCUIT_COOLDOWN
+                print(f"🔌 {model} 서킷 오픈 ({MODEL_CIRCUIT_COOLDOWN:.0f}초간 제외)")
+        _save_model_health()
+        return stats["failures"]
+
+def rank_models():
+    """관측된 상태 순으로 모델 정렬 (에러율 → 평균 지연 → 설정 순서)
+
+    서킷이 열린 모델은 제외하되, 전부 열려 있으면 그래도 전체를 시도합니다.
+    """
+    now = time.time()
+    with _model_health_lock:
+        health = _get_model_health()
+        scored = []
+        for index, model in enumerate(MODELS_TO_TRY):
+            stats = health.get(model, {})
+            samples = stats.get("samples", [])
+            oks = [ok for ok, _ in samples]
+            latencies = [latency for ok, latency in samples if ok]
+            error_rate = 1 - sum(oks) / len(oks) if oks else 0.0
+            avg_latency = sum(latencies) / len(latencies) if latencies else MODEL_DEFAULT_LATENCY
+            is_open = stats.get("open_until", 0) > now
+            scored.append((is_open, round(error_rate, 1), avg_latency, index, model))
+    
+    scored.sort()
+    available = [item[-1] for item in scored if not item[0]]
+    if not available:
+        print("⚠️ 모든 모델 서킷이 열려 있음 - 전체 모델로 시도합니다.")
+        return [item[-1] for item in scored]
+    return available
+
+def lookup_cached_response(stage, prompt, tools):
+    """캐시 조회: 이전 실행에서 어떤 모델이 답했든 재사용 (적중/미스 집계 포함)"""
+    if stage not in LLM_CACHE_TTL:
+        return None
     for model in MODELS_TO_TRY:
+        cached = llm_cache_get(stage, model, prompt, tools)
+        if cached is not None:
+            with _llm_cache_lock:
+                LLM_CACHE_STATS["hit"] += 1
+            print(f"💾 캐시 적중 ({stage}, Model: {model})")
+            return cached
+    with _llm_cache_lock:
+        LLM_CACHE_STATS["miss"] += 1
+    return None
+
+def gemini_deadline_options():
+    """마감 시간이 있으면 남은 시간을 Gemini 요청 타임아웃으로 (GenerateContentConfig 인자 dict)"""
+    timeout = call_timeout()
+    if timeout is None:
+        return {}
+    return {"http_options": genai_types().HttpOptions(timeout=max(1000, int(timeout * 1000)))}
+
+def generate_content_with_retry(prompt, use_search=False, stage=None, response_schema=None):
+    """AI 콘텐츠 생성 (웹 서치 옵션 포함)
+
+    stage: 스테이지 이름 - 토큰 사용량 집계에 쓰이고,
+           LLM_CACHE_TTL 에 등록된 스테이지면 디스크 캐시도 사용
+    response_schema: 지정하면 JSON 구조화 출력 모드로 요청 (응답 text 는 JSON 문자열)
+    """
+    # Google Search 도구 활성화
+    tools = []
+    if use_search:
+        tools = ['google_search_retrieval']
+    
+    with trace_span("gemini.generate", stage=stage or "기타", search=use_search) as span:
+        cached = lookup_cached_response(stage, prompt, tools)
+        span["cached"] = cached is not None
+        if cached is not None:
+            return cached
+        
+        candidates = rank_models()
+        for attempt, model in enumerate(candidates):
+            check_deadline()
+            started = time.time()
+            span["model"] = model
+            span["retries"] = attempt
+            try:
+                print(f"📡 연결 시도 중... (Model: {model})")
+                
+                if tools:
+                    print("🔍 Google Search 활성화")
+                
+                config_params = {
+                    "model": model,
+                    "contents": prompt
+                }
+                
+                config = gemini_deadline_options()
+                if tools:
+                    config["tools"] = tools
+                elif response_schema:
+                    config["response_mime_type"] = "application/json"
+                    config["response_schema"] = response_schema
+                if config:
+                    config_params["config"] = genai_types().GenerateContentConfig(**config)
+                
+                throttle(f"gemini:{model}", estimate_tokens(prompt))
+                with GEMINI_SLOTS, trace_span("gemini.request", model=model):
+                    started = time.time()
+                    response = get_genai_client().models.generate_content(**config_params)
+                    record_model_result(model, True, time.time() - started)
+                usage = getattr(response, "usage_metadata", None)
+                span["prompt_tokens"] = getattr(usage, "prompt_token_count", None) or 0
+                span["output_tokens"] = getattr(usage, "candidates_token_count", None) or 0
+                record_token_usage(
+                    stage or "기타",
+                    prompt_tokens=span["prompt_tokens"],
+                    output_tokens=span["output_tokens"],
+                    seconds=time.time() - started
+                )
+                if stage in LLM_CACHE_TTL:
+                    llm_cache_put(stage, model, prompt, tools, response.text)
+                return response.text
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                kind = classify_model_error(e)
+                failures = record_model_result(model, False, time.time() - started, kind=kind)
+                print(f"⚠️ {model} 에러 발생 ({kind}): {e}")
+                # 다음 모델은 한도가 따로라 바로 시도하고, 실패한 모델만 잠시 보류
+                defer_provider(f"gemini:{model}", gemini_retry_delay(e) or backoff_delay(failures, kind))
+                continue
+                
+        raise Exception("❌ 모든 AI 모델이 응답하지 않습니다.")
+
+# 🧽 단일 패스 HTML 후처리: 메타 문구 전체를 한 번에 찾는 컴파일된 정규식 + 블록 경계 해석
+HTML_BLOCK_NAMES = r"(?:p|li|ul|ol|h[1-6]|div|table|tr|blockquote|section|pre)"
+HTML_BLOCK_TAG = re.compile(r"<\s*(/?)\s*(" + HTML_BLOCK_NAMES + r")\b[^>]*>", re.I)
+HTML_INLINE_GAP = r"(?:<(?!\s*/?\s*" + HTML_BLOCK_NAMES + r"\b)[^>]*>)*"
+HTML_EMPTY_CONTAINER = re.compile(r"<(ul|ol|table|thead|tbody)\b[^>]*>\s*</\1\s*>", re.I)
+HTML_LIST_TAGS = {"ul", "ol"}
+HTML_DROPPABLE_TAGS = {"p", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6"}
+HTML_LOOKBACK = 256
+
+def compile_phrase_matcher(phrases):
+    """여러 문구를 하나의 정규식으로 컴파일 (접두사 트라이로 묶어 문구 수가 늘어도 한 번에 탐색)
+
+    글자 사이에 인라인 태그가 끼어 있어도(예: 요청하신 <strong>원고</strong>) 매칭되지만
+    블록 태그(</p><p> 등)를 넘어서는 매칭하지 않습니다.
+    """
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[""] = {}
+    
+    def emit(node):
+        branches = []
+        for char, child in sorted(node.items()):
+            if char:
+                rest = emit(child)
+                branches.append(re.escape(char) + (HTML_INLINE_GAP + rest if rest else ""))
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # 여기서 끝나는 문구가 있으면 나머지는 선택 (가장 긴 문구 우선)
+        return f"(?:{body})?" if "" in node else body
+    
+    return re.compile(emit(trie))
+
+def _last_block_tag(html_text, pos):
+    """pos 직전의 블록 태그 (없으면 None) - 가까운 구간부터 넓혀가며 탐색"""
+    window = HTML_LOOKBACK
+    while True:
+        start = max(0, pos - window)
+        last = None
+        for last in HTML_BLOCK_TAG.finditer(html_text, start, pos):
+            pass
+        if last is not None or start == 0:
+            return last
+        window *= 4
+
+def _block_end(html_text, name, pos):
+    """pos 에서 시작한 <name> 블록이 끝나는 위치 (닫는 태그가 없으면 암묵적 종료 지점)"""
+    nested_lists = 0
+    for tag in HTML_BLOCK_TAG.finditer(html_text, pos):
+        closing, tag_name = tag.group(1) == "/", tag.group(2).lower()
+        if name != "li":
+            # 문단/제목은 다음 블록 태그에서 끝남
+            return tag.end() if closing and tag_name == name else tag.start()
+        if tag_name in HTML_LIST_TAGS:
+            if not closing:
+                nested_lists += 1
+            elif nested_lists:
+                nested_lists -= 1
+            else:
+                return tag.start()  # 부모 목록이 닫힘
+        elif tag_name == "li" and not nested_lists:
+            return tag.end() if closing else tag.start()
+    return len(html_text)
+
+def _removal_range(html_text, start, end):
+    """문구 위치를 감싸는 제거 범위: <p>/<li>/표 행/제목 블록 전체, 블록 밖이면 그 텍스트 줄"""
+    last = _last_block_tag(html_text, start)
+    if last is not None and not last.group(1) and last.group(2).lower() in HTML_DROPPABLE_TAGS:
+        return last.start(), _block_end(html_text, last.group(2).lower(), last.end())
+    
+    line_start = max(last.end() if last is not None else 0, html_text.rfind("\n", 0, start) + 1)
+    next_tag = HTML_BLOCK_TAG.search(html_text, end)
+    line_ends = [html_text.find("\n", end), next_tag.start() if next_tag else -1]
+    line_end = min([pos for pos in line_ends if pos >= 0], default=len(html_text))
+    return line_start, line_end
+
+def strip_meta_blocks(html_text, matcher):
+    """메타 문구가 들어간 <p>/<li>/표 행/제목 블록과 태그 밖 텍스트 줄을 제거
+
+    문구 수와 무관하게 컴파일된 정규식으로 문서를 한 번만 훑고,
+    찾은 위치 주변의 블록 경계만 해석해 블록째 잘라냅니다.
+    항목이 모두 지워진 <ul>/<ol>/<table> 도 빼서 태그 구조가 깨지지 않습니다.
+    """
+    ranges = []
+    for match in matcher.finditer(html_text):
+        if ranges and match.start() < ranges[-1][1]:
+            continue  # 이미 지울 블록 안
+        ranges.append(_removal_range(html_text, match.start(), match.end()))
+    if not ranges:
+        return html_text
+    
+    out = []
+    cursor = 0
+    for start, end in ranges:
+        if start > cursor:
+            out.append(html_text[cursor:start])
+        cursor = max(cursor, end)
+    out.append(html_text[cursor:])
+    cleaned = "".join(out)
+    
+    # 비어버린 목록/표 제거 (중첩 목록, tbody 안의 표는 바깥까지 반복)
+    while True:
+        collapsed = HTML_EMPTY_CONTAINER.sub("", cleaned)
+        if collapsed == cleaned:
+            return cleaned
+        cleaned = collapsed
+
+# 🌊 스트리밍 생성 설정: 청크를 받는 즉시 필터링하고 불량 생성은 조기 중단 후 재시도
+STREAM_GENERATION = os.environ.get("STREAM_GENERATION", "0") == "1"
+STREAM_MAX_ATTEMPTS = 2
+STREAM_MAX_CHARS = int(os.environ.get("STREAM_MAX_CHARS", "20000"))
+STREAM_PREAMBLE_CHARS = 300
+STREAM_STRUCTURE_CHARS = 400
+# 서두에 나오면 생성 전체가 드래프트 말투로 흐른 것으로 보고 중단
+STREAM_ABORT_PHRASES = ["요청하신", "품질 검수", "최종 버전", "에디터로서", "개선했습니다"]
+STREAM_UNIT_END = re.compile(r"\n|</p>")
+
+# 본문 / 품질 개선 결과에서 문단째 지울 메타 언급
+META_PHRASES = [
+    "블로그 콘텐츠 품질 검수",
+    "요청하신 원고",
+    "개선한 최종 버전",
+    "검토하고",
+    "재구성했습니다"
+]
+META_KILL_LIST = META_PHRASES + [
+    "수정했습니다",
+    "다듬고",
+    "품질을 극대화",
+    "에디터로서",
+    "검수 전문가"
+]
+META_PHRASE_MATCHER = compile_phrase_matcher(META_PHRASES)
+META_KILL_MATCHER = compile_phrase_matcher(META_KILL_LIST)
+
+class GenerationAborted(Exception):
+    """스트리밍 도중 불량 생성이 감지되어 중단됨"""
+
+def filter_generation_stream(chunks, abort_phrases=(), max_chars=STREAM_MAX_CHARS):
+    """스트리밍 텍스트 청크를 줄/문단 단위로 실시간 검사
+
+    - ```html 코드펜스 제거
+    - 서두(STREAM_PREAMBLE_CHARS 이내)에 abort_phrases 가 나오거나,
+      길이가 max_chars 를 넘거나, HTML 태그 없이 STREAM_STRUCTURE_CHARS 를 넘기면
+      GenerationAborted 를 던져 즉시 중단
+    완성된 단위(문자열)를 하나씩 yield 합니다.
+    메타 문구 블록 제거는 태그 구조를 보는 strip_meta_blocks 가 완성본에서 맡습니다
+    (줄 단위로 버리면 여러 줄 <p> 의 닫는 태그나 한 줄 목록의 멀쩡한 항목까지 잘림).
+    """
+    buffer = ""
+    emitted = 0
+    has_tag = False
+    
+    def check(pending):
+        head_len = emitted + len(pending)
+        if emitted < STREAM_PREAMBLE_CHARS:
+            # 서두 구간(에 걸친 문구)까지만 검사 - 한 청크가 길어도 본문 중간의 문구로 중단하지 않음
+            head = pending[:STREAM_PREAMBLE_CHARS - emitted + max(map(len, abort_phrases), default=0)]
+            if any(phrase in head for phrase in abort_phrases):
+                raise GenerationAborted("서두에 메타 문구 감지")
+        if head_len > max_chars:
+            raise GenerationAborted(f"길이 초과 ({head_len:,}자)")
+        if not has_tag and head_len > STREAM_STRUCTURE_CHARS and "<" not in pending:
+            raise GenerationAborted("HTML 구조가 아님")
+    
+    def clean(unit):
+        return unit.replace('```html', '').replace('```', '')
+    
+    for chunk in chunks:
+        buffer += chunk
+        check(buffer)
+        while True:
+            match = STREAM_UNIT_END.search(buffer)
+            if not match:
+                break
+            unit, buffer = clean(buffer[:match.end()]), buffer[match.end():]
+            has_tag = has_tag or "<" in unit
+            emitted += len(unit)
+            yield unit
+    
+    tail = clean(buffer)
+    if tail:
+        yield tail
+
+def generate_content_streaming(prompt, stage=None, abort_phrases=STREAM_ABORT_PHRASES,
+                               max_chars=STREAM_MAX_CHARS, max_attempts=STREAM_MAX_ATTEMPTS):
+    """🌊 스트리밍 생성 + 실시간 검사 + 조기 중단
+
+    불량 생성(메타 서두, 길이/구조 위반)이 보이면 끝까지 기다리지 않고 끊은 뒤 다시 요청합니다.
+    재시도까지 모두 중단되면 일반 생성(generate_content_with_retry)으로 대체합니다.
+    """
+    with trace_span("gemini.stream", stage=stage or "기타") as span:
+        cached = lookup_cached_response(stage, prompt, [])
+        span["cached"] = cached is not None
+        if cached is not None:
+            return cached
+        
+        span["retries"] = -1
+        for attempt in range(max_attempts):
+            candidates = rank_models()
+            for model in candidates:
+                check_deadline()
+                started = time.time()
+                stream = None
+                usage = None
+                span["model"] = model
+                span["retries"] += 1
+                try:
+                    print(f"🌊 스트리밍 생성 중... (Model: {model}, 시도 {attempt+1}/{max_attempts})")
+                    throttle(f"gemini:{model}", estimate_tokens(prompt))
+                    with GEMINI_SLOTS, trace_span("gemini.request", model=model, stream=True) as request_span:
+                        config = gemini_deadline_options()
+                        stream = get_genai_client().models.generate_content_stream(
+                            model=model, contents=prompt,
+                            config=genai_types().GenerateContentConfig(**config) if config else None
+                        )
+                        
+                        def texts():
+                            nonlocal usage
+                            for response in stream:
+                                usage = getattr(response, "usage_metadata", None) or usage
+                                yield response.text or ""
+                        
+                        text = "".join(filter_generation_stream(texts(), abort_phrases, max_chars)).strip()
+                        request_span["chars"] = len(text)
+                    record_model_result(model, True, time.time() - started)
+                    span["prompt_tokens"] = getattr(usage, "prompt_token_count", None) or 0
+                    span["output_tokens"] = getattr(usage, "candidates_token_count", None) or 0
+                    record_token_usage(
+                        stage or "기타",
+                        prompt_tokens=span["prompt_tokens"],
+                        output_tokens=span["output_tokens"],
+                        seconds=time.time() - started
+                    )
+                    if stage in LLM_CACHE_TTL:
+                        llm_cache_put(stage, model, prompt, [], text)
+                    return text
+                except GenerationAborted as e:
+                    print(f"✂️ 생성 조기 중단 ({e}) - {time.time() - started:.1f}초 만에 재요청합니다.")
+                    span["aborted"] = span.get("aborted", 0) + 1
+                    if hasattr(stream, "close"):
+                        stream.close()
+                    break
+                except DeadlineExceeded:
+                    raise
+                except Exception as e:
+                    kind = classify_model_error(e)
+                    failures = record_model_result(model, False, time.time() - started, kind=kind)
+                    print(f"⚠️ {model} 스트리밍 에러 발생 ({kind}): {e}")
+                    defer_provider(f"gemini:{model}", gemini_retry_delay(e) or backoff_delay(failures, kind))
+            else:
+                raise Exception("❌ 모든 AI 모델이 응답하지 않습니다.")
+    
+    print("⚠️ 스트리밍 재시도 모두 중단됨 - 일반 생성으로 진행합니다.")
+    return generate_content_with_retry(prompt, use_search=False, stage=stage)
+
+# 🧮 스테이지별 입력 토큰 예산 (넘으면 리서치 압축 / 품질 검사 생략)
+STAGE_TOKEN_BUDGETS = {
+    "outline": 6000,
+    "write": 9000,
+    "quality": 9000,
+}
+RESEARCH_FACT_SHEET_TOKENS = 1500
+TOKEN_USAGE = {}
+_token_usage_lock = threading.Lock()
+_compacted_research = {}
+
+def record_token_usage(stage, prompt_tokens=0, output_tokens=0, seconds=0.0):
+    """스테이지별 토큰/지연 누적"""
+    with _token_usage_lock:
+        usage = TOKEN_USAGE.setdefault(stage, {"calls": 0, "prompt": 0, "output": 0, "seconds": 0.0})
+        usage["calls"] += 1
+        usage["prompt"] += prompt_tokens
+        usage["output"] += output_tokens
+        usage["seconds"] += seconds
+
+def print_token_usage():
+    """스테이지별 토큰 사용량 표"""
+    if not TOKEN_USAGE:
+        return
+    print("🧮 스테이지별 토큰 사용량")
+    print(f"   {'스테이지':<14}{'호출':>6}{'입력':>10}{'출력':>10}{'시간(초)':>10}")
+    for stage, usage in TOKEN_USAGE.items():
+        print(f"   {stage:<14}{usage['calls']:>6}{usage['prompt']:>10,}{usage['output']:>10,}{usage['seconds']:>10.1f}")
+
+def estimate_tokens(text):
+    """토큰 수 어림값 (한글은 대략 1~2자당 1토큰이라 넉넉하게 잡음)"""
+    return len(text) // 2 + 1
+
+def count_tokens(text):
+    """클라이언트 토큰 카운트 API 로 정확한 토큰 수 (실패 시 어림값)"""
+    try:
+        with trace_span("gemini.count_tokens", model=MODELS_TO_TRY[0]) as span:
+            config = genai_types().CountTokensConfig(**gemini_deadline_options())
+            span["tokens"] = get_genai_client().models.count_tokens(
+                model=MODELS_TO_TRY[0], contents=text, config=config
+            ).total_tokens
+        return span["tokens"]
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        print(f"⚠️ 토큰 카운트 실패, 어림값 사용: {e}")
+        return estimate_tokens(text)
+
+def compact_research(research_data, max_tokens=RESEARCH_FACT_SHEET_TOKENS):
+    """긴 리서치 자료를 수치·출처·질문 위주의 팩트 시트로 압축 (같은 자료는 한 번만)"""
+    key = hashlib.sha256(research_data.encode("utf-8")).hexdigest()
+    if key in _compacted_research:
+        return _compacted_research[key]
+    
+    print(f"🗜️ 리서치 자료 압축 중... (목표 {max_tokens:,} 토큰)")
+    max_chars = max_tokens * 2
+    prompt = f"""
+아래 리서치 자료를 블로그 작성용 팩트 시트로 압축하세요.
+
+**리서치 자료:**
+{research_data}
+
+[📋 팩트 시트 구성]
+1. 핵심 수치: 숫자/통계와 기준 시점, 출처를 한 줄씩
+2. 출처 목록: 기관/매체 이름
+3. 독자가 궁금해할 질문 3가지
+4. 실용 팁 2~3가지
+
+**출력 형식: 불릿 포인트만, 전체 {max_chars}자 이내, 설명 문장 없이**
+"""
+    try:
+        fact_sheet = generate_content_with_retry(prompt, use_search=False, stage="compact").strip()
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        print(f"⚠️ 리서치 압축 실패, 앞부분만 사용: {e}")
+        fact_sheet = research_data
+    fact_sheet = fact_sheet[:max_chars]
+    _compacted_research[key] = fact_sheet
+    return fact_sheet
+
+def build_prompt(stage, render, compactable=None, strict=False, **parts):
+    """토큰 예산을 지키는 프롬프트 조립
+
+    render(**parts) 로 프롬프트를 만들고 STAGE_TOKEN_BUDGETS 를 넘으면
+    compactable 로 지정한 리서치 파트를 팩트 시트로 압축해 다시 조립합니다.
+    어림값이 예산의 70% 미만이면 토큰 카운트 API 호출도 생략합니다.
+    strict=True 면 압축 후에도 예산을 넘을 때 예외를 냅니다.
+    """
+    budget = STAGE_TOKEN_BUDGETS.get(stage)
+    prompt = render(**parts)
+    if not budget:
+        return prompt
+    
+    def measure(text):
+        estimate = estimate_tokens(text)
+        return estimate if estimate < budget * 0.7 else count_tokens(text)
+    
+    tokens = measure(prompt)
+    if tokens > budget and compactable:
+        parts[compactable] = compact_research(parts[compactable])
+        prompt = render(**parts)
+        tokens = measure(prompt)
+    
+    print(f"🧮 [{stage}] 프롬프트 약 {tokens:,} 토큰 (예산 {budget:,})")
+    if tokens > budget:
+        if strict:
+            raise Exception(f"[{stage}] 토큰 예산 초과 ({tokens:,} > {budget:,})")
+        print(f"⚠️ [{stage}] 토큰 예산 초과 상태로 진행합니다.")
+    return prompt
+
+def print_llm_cache_stats():
+    """LLM 캐시 적중/미스 요약"""
+    total = LLM_CACHE_STATS["hit"] + LLM_CACHE_STATS["miss"]
+    if total:
+        print(f"💾 LLM 캐시: 적중 {LLM_CACHE_STATS['hit']} / 미스 {LLM_CACHE_STATS['miss']} "
+              f"(적중률 {LLM_CACHE_STATS['hit'] / total:.0%})")
+    if any(RESEARCH_STORE_STATS.values()):
+        print(f"📚 리서치 저장소: 재사용 {RESEARCH_STORE_STATS['reuse']} / 보강 {RESEARCH_STORE_STATS['extend']} "
+              f"/ 새 검색 {RESEARCH_STORE_STATS['search']}")
+
+# 🗂️ 발행 글 제목 인덱스 (WP 에서 증분 동기화 + 유사 제목 검색)
+TITLE_SIMILARITY_THRESHOLD = float(os.environ.get("TITLE_SIMILARITY_THRESHOLD", "0.6"))
+TITLE_NGRAM = 2
+MINHASH_PERMUTATIONS = 64
+MINHASH_BANDS = 16
+_MINHASH_PRIME = (1 << 61) - 1
+_minhash_rng = random.Random(20250214)
+MINHASH_COEFFS = [(_minhash_rng.randrange(1, _MINHASH_PRIME), _minhash_rng.randrange(0, _MINHASH_PRIME))
+                  for _ in range(MINHASH_PERMUTATIONS)]
+_title_index_lock = threading.Lock()
+
+def _title_index_db():
+    conn = open_state_db(site_state_file("titles.sqlite3"))
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS titles (
+            post_id INTEGER PRIMARY KEY,
+            title TEXT,
+            modified TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS title_lsh (
+            band INTEGER,
+            bucket TEXT,
+            post_id INTEGER
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS title_lsh_bucket ON title_lsh (band, bucket)")
+    conn.execute("CREATE TABLE IF NOT EXISTS title_meta (key TEXT PRIMARY KEY, value TEXT)")
+    return conn
+
+def title_shingles(title):
+    """한글 제목용 문자 n-gram 집합 (공백/기호 무시)"""
+    text = normalize_topic(html.unescape(title or ""))
+    if len(text) <= TITLE_NGRAM:
+        return {text} if text else set()
+    return {text[i:i + TITLE_NGRAM] for i in range(len(text) - TITLE_NGRAM + 1)}
+
+def title_similarity(a, b):
+    """두 제목의 n-gram 자카드 유사도 (0~1)"""
+    sa, sb = title_shingles(a), title_shingles(b)
+    if not sa or not sb:
+        return 0.0
+    return len(sa & sb) / len(sa | sb)
+
+def title_lsh_buckets(shingles):
+    """MinHash 서명을 밴드로 나눈 LSH 버킷 - 비슷한 제목은 같은 버킷을 공유할 확률이 높음"""
+    hashes = [int.from_bytes(hashlib.blake2b(sh.encode("utf-8"), digest_size=8).digest(), "big")
+              for sh in shingles]
+    signature = [min((a * h + b) % _MINHASH_PRIME for h in hashes) for a, b in MINHASH_COEFFS]
+    rows = MINHASH_PERMUTATIONS // MINHASH_BANDS
+    return [(band, hashlib.md5(str(signature[band * rows:(band + 1) * rows]).encode()).hexdigest())
+            for band in range(MINHASH_BANDS)]
+
+def _index_title(conn, post_id, title, modified):
+    conn.execute("INSERT OR REPLACE INTO titles VALUES (?, ?, ?)", (post_id, title, modified))
+    conn.execute("DELETE FROM title_lsh WHERE post_id = ?", (post_id,))
+    shingles = title_shingles(title)
+    if shingles:
+        conn.executemany(
+            "INSERT INTO title_lsh VALUES (?, ?, ?)",
+            [(band, bucket, post_id) for band, bucket in title_lsh_buckets(shingles)]
+        )
+
+def sync_title_index(per_page=100):
+    """WP REST API 에서 마지막 동기화 이후 수정된 글만 받아 인덱스 갱신
+
+    modified_after + 페이지네이션으로 새 글만 가져오고,
+    첫 페이지는 ETag(If-None-Match)로 변경이 없으면 304 로 바로 끝냅니다.
+    """
+    with _title_index_lock:
+        conn = _title_index_db()
         try:
-            print(f"📡 연결 시도 중... (Model: {model})")
+            meta = dict(conn.execute("SELECT key, value FROM title_meta").fetchall())
+            params = {"per_page": per_page, "orderby": "modified", "order": "asc", "_fields": "id,title,modified"}
+            if meta.get("last_modified"):
+                params["modified_after"] = meta["last_modified"]
             
-            # Google Search 도구 활성화
-            tools = []
-            if use_search:
-                tools = ['google_search_retrieval']
-                print("🔍 Google Search 활성화")
-            
-            config_params = {
-                "model": model,
-                "contents": prompt
-            }
+            added = 0
+            page = 1
+            total_pages = 1
+            last_modified = meta.get("last_modified")
+            while page <= total_pages:
+                headers = {}
+                if page == 1 and meta.get("etag") and meta.get("etag_params") == json.dumps(params):
+                    headers["If-None-Match"] = meta["etag"]
+                throttle(wp_provider())
+                with trace_span("wp.list_posts", page=page) as span:
+                    response = get_wp_session().get(wp_posts_url(), params={**params, "page": page}, headers=headers,
+                                                   timeout=call_timeout(30))
+                    span["status"] = response.status_code
+                    span["bytes"] = len(response.content)
+                note_wp_response(response)
+                
+                if response.status_code == 304:
+                    break
+                if response.status_code != 200:
+                    print(f"⚠️ 제목 인덱스 동기화 실패 (HTTP {response.status_code})")
+                    break
+                if page == 1 and response.headers.get("ETag"):
+                    conn.execute("INSERT OR REPLACE INTO title_meta VALUES ('etag', ?)", (response.headers["ETag"],))
+                    conn.execute("INSERT OR REPLACE INTO title_meta VALUES ('etag_params', ?)", (json.dumps(params),))
+                
+                for post in response.json():
+                    _index_title(conn, post["id"], html.unescape(post["title"]["rendered"]), post.get("modified"))
+                    last_modified = max(filter(None, [last_modified, post.get("modified")]), default=None)
+                    added += 1
+                
+                total_pages = int(response.headers.get("X-WP-TotalPages", "1") or 1)
+                page += 1
             
-            if tools:
-                config_params["config"] = genai.types.GenerateContentConfig(tools=tools)
+            if last_modified:
+                conn.execute("INSERT OR REPLACE INTO title_meta VALUES ('last_modified', ?)", (last_modified,))
+            conn.commit()
             
-            response = client.models.generate_content(**config_params)
-            return response.text
+            total = conn.execute("SELECT COUNT(*) FROM titles").fetchone()[0]
+            print(f"🗂️ 제목 인덱스 동기화: 신규/수정 {added}건 (전체 {total}건)")
+            return added
         except Exception as e:
-            print(f"⚠️ {model} 에러 발생: {e}")
-            print("⏳ 3초 후 다른 모델로 재시도합니다...")
-            time.sleep(3)
-            continue
-            
-    raise Exception("❌ 모든 AI 모델이 응답하지 않습니다.")
+            print(f"⚠️ 제목 인덱스 동기화 중 에러 (기존 인덱스로 진행): {e}")
+            return 0
+        finally:
+            conn.close()
+
+def recent_indexed_titles(limit=20):
+    """인덱스에서 최근 수정된 글 제목"""
+    conn = _title_index_db()
+    try:
+        rows = conn.execute("SELECT title FROM titles ORDER BY modified DESC LIMIT ?", (limit,)).fetchall()
+        return [row[0] for row in rows]
+    finally:
+        conn.close()
+
+def find_similar_title(candidate, threshold=None):
+    """인덱스에서 후보 주제와 가장 비슷한 기존 제목 → (제목, 유사도) 또는 None
+
+    LSH 버킷으로 후보를 좁힌 뒤 n-gram 자카드 유사도로 최종 판정합니다.
+    """
+    threshold = TITLE_SIMILARITY_THRESHOLD if threshold is None else threshold
+    shingles = title_shingles(candidate)
+    if not shingles:
+        return None
+    
+    conn = _title_index_db()
+    try:
+        post_ids = set()
+        for band, bucket in title_lsh_buckets(shingles):
+            rows = conn.execute("SELECT post_id FROM title_lsh WHERE band = ? AND bucket = ?", (band, bucket))
+            post_ids.update(row[0] for row in rows)
+        if not post_ids:
+            return None
+        marks = ",".join("?" * len(post_ids))
+        titles = [row[0] for row in conn.execute(f"SELECT title FROM titles WHERE post_id IN ({marks})", list(post_ids))]
+    finally:
+        conn.close()
+    
+    best = max(((title, title_similarity(candidate, title)) for title in titles), key=lambda item: item[1])
+    return best if best[1] >= threshold else None
 
-def get_recent_posts():
-    """기존 작성 글 조회"""
+def get_recent_posts(limit=20):
+    """기존 작성 글 조회 (로컬 제목 인덱스를 증분 동기화한 뒤 최근 글 반환)"""
     print("📚 기존에 작성한 글 목록을 조회합니다...")
     try:
-        response = requests.get(WP_URL, params={'per_page': 20}, verify=False)
-        if response.status_code == 200:
-            posts = response.json()
-            titles = [post['title']['rendered'] for post in posts]
-            print(f"✅ 최근 글 {len(titles)}개를 확인했습니다.")
-            return titles
-        else:
-            print("⚠️ 글 목록 조회 실패 (무시하고 진행)")
-            return []
+        sync_title_index()
+        titles = recent_indexed_titles(limit)
+        print(f"✅ 최근 글 {len(titles)}개를 확인했습니다.")
+        return titles
     except Exception as e:
         print(f"⚠️ 글 목록 조회 중 에러: {e}")
         return []
 
-def get_search_friendly_topic(existing_titles):
-    """🆕 개선: 더 구체적이고 검색 친화적인 주제 선정"""
+def get_search_friendly_topic(existing_titles, max_attempts=3):
+    """🆕 개선: 더 구체적이고 검색 친화적인 주제 선정
+
+    후보 주제가 제목 인덱스의 기존 글과 너무 비슷하면
+    리서치/작성 토큰을 쓰기 전에 거절하고 다시 선정합니다.
+    """
     print("🕵️‍♀️ 트렌디하고 검색 가능성 높은 주제 발굴 중...")
     
+    rejected = []
+    for attempt in range(max_attempts):
+        topic = _suggest_topic(list(existing_titles) + rejected)
+        similar = find_similar_title(topic)
+        if similar is None:
+            print(f"✨ 선정된 주제: {topic}")
+            return topic
+        print(f"♻️ [{attempt+1}/{max_attempts}] 기존 글과 유사한 주제 거절: {topic} ≈ {similar[0]} ({similar[1]:.2f})")
+        rejected.append(topic)
+    
+    raise Exception("❌ 기존 글과 겹치지 않는 주제를 찾지 못했습니다.")
+
+def _suggest_topic(existing_titles):
+    """LLM 주제 후보 1개 (실패 시 기본 주제)"""
     exclude_list = ", ".join(existing_titles) if existing_titles else "없음"
     
     try:
@@ -100,23 +1484,216 @@ def get_search_friendly_topic(existing_titles):
 
 **출력 형식: 주제만 한 줄로 (예시: "미국 빅테크 실적 발표 앞두고 주목할 포인트 3가지")**
 """
-        topic = generate_content_with_retry(prompt, use_search=False).strip()
+        topic = generate_content_with_retry(prompt, use_search=False, stage="topic").strip()
         topic = topic.replace('"', '').replace("'", '').replace('**', '').strip()
         
         # 여러 줄인 경우 첫 줄만
         if '\n' in topic:
             topic = topic.split('\n')[0].strip()
         
-        print(f"✨ 선정된 주제: {topic}")
         return topic
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         print(f"❌ 주제 선정 실패: {e}")
         return "2025년 개인투자자를 위한 ETF 포트폴리오 구성 전략"
 
+def normalize_topic(topic):
+    """중복 비교용 주제 정규화 (공백/기호 제거, 소문자)"""
+    return re.sub(r"[\W_]+", "", topic or "").lower()
+
+def select_unique_topic(existing_titles, claimed, lock, max_attempts=3):
+    """배치 전체에서 겹치지 않는 주제 선정
+
+    claimed: {정규화 주제: 주제} - 같은 배치의 다른 워커가 이미 선점한 주제
+    """
+    for attempt in range(max_attempts):
+        with lock:
+            exclude = list(existing_titles) + list(claimed.values())
+        topic = get_search_friendly_topic(exclude)
+        key = normalize_topic(topic)
+        with lock:
+            taken = list(existing_titles) + list(claimed.values())
+            duplicate = key in claimed or any(
+                title_similarity(topic, title) >= TITLE_SIMILARITY_THRESHOLD for title in taken
+            )
+            if key and not duplicate:
+                claimed[key] = topic
+                return topic
+        print(f"⚠️ [{attempt+1}/{max_attempts}] 중복 주제 감지, 다시 선정합니다: {topic}")
+    
+    raise Exception("❌ 중복되지 않는 주제를 찾지 못했습니다.")
+
+# 📚 리서치 저장소: 주제 클러스터별 유효기간 안에서 비슷한 주제의 리서치를 재사용/보강
+# 클러스터: (키워드, 유효기간(시간)) - 시세/뉴스성 주제일수록 짧게
+RESEARCH_CLUSTERS = {
+    "market": (("금리", "환율", "증시", "코스피", "코스닥", "나스닥", "주가", "유가", "금값", "비트코인",
+                "물가", "채권", "달러", "엔화", "실적"), 24),
+    "realestate": (("부동산", "아파트", "전세", "월세", "청약", "주택", "대출", "dsr"), 3 * 24),
+    "policy": (("세법", "세금", "정책", "제도", "개편", "연말정산", "isa", "연금", "비과세", "공제"), 7 * 24),
+    "investing": (("etf", "배당", "포트폴리오", "적립식", "펀드", "반도체", "2차전지", "ai", "바이오"), 3 * 24),
+}
+RESEARCH_DEFAULT_FRESHNESS_HOURS = 48
+RESEARCH_STORE_ENABLED = os.environ.get("RESEARCH_STORE", "1") != "0"
+# 같은 클러스터에서 이 값 이상 겹치는 주제는 새 검색 대신 기존 리서치를 보강해서 사용
+RESEARCH_REUSE_THRESHOLD = float(os.environ.get("RESEARCH_REUSE_THRESHOLD", "0.6"))
+# 주제 겹침 계산에서 빼는 일반어 - 어느 주제에나 붙는 말이라 내용이 달라도 겹침을 키움
+RESEARCH_GENERIC_WORDS = ("전망", "전략", "방법", "정리", "총정리", "가이드", "분석", "포인트", "이유",
+                          "영향", "비교", "투자", "시대", "체크", "팁", "주의점", "활용법", "핵심", "최신")
+# 주제 단어 끝의 조사 (예: "전망과", "금리의")
+RESEARCH_TOPIC_PARTICLES = "과와의을를이가은는도에로"
+RESEARCH_STORE_STATS = {"reuse": 0, "extend": 0, "search": 0}
+_research_store_lock = threading.Lock()  # 저장소 쓰기와 RESEARCH_STORE_STATS 집계
+
+def _research_db():
+    # 리서치는 사이트와 무관하므로 모든 사이트가 하나의 저장소를 공유
+    conn = open_state_db("research.sqlite3")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS research (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            topic TEXT,
+            topic_key TEXT,
+            cluster TEXT,
+            content TEXT,
+            base_id INTEGER,
+            created REAL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS research_cluster ON research (cluster, created)")
+    return conn
+
+def research_cluster(topic):
+    """주제의 키워드 클러스터 (키워드가 가장 많이 겹치는 클러스터, 없으면 "general")"""
+    text = normalize_topic(topic)
+    scores = {name: sum(keyword in text for keyword in keywords)
+              for name, (keywords, _) in RESEARCH_CLUSTERS.items()}
+    best = max(scores, key=scores.get)
+    return best if scores[best] else "general"
+
+def research_freshness(cluster):
+    """클러스터별 리서치 유효기간(초)"""
+    hours = RESEARCH_CLUSTERS[cluster][1] if cluster in RESEARCH_CLUSTERS else RESEARCH_DEFAULT_FRESHNESS_HOURS
+    return hours * 3600
+
+def topic_keywords(topic):
+    """주제의 내용어 (숫자/연월 토큰, 일반어, 한 글자 단어 제외)"""
+    keywords = []
+    for word in re.findall(r"\w+", html.unescape(topic or "").lower()):
+        if re.fullmatch(r"\d+(?:\.\d+)?[가-힣%]{0,2}", word):
+            continue  # "2026년", "10월", "1400원" 같은 숫자 토큰 ("2차전지" 는 유지)
+        if len(word) > 2 and word[-1] in RESEARCH_TOPIC_PARTICLES:
+            word = word[:-1]
+        if len(word) < 2 or word in RESEARCH_GENERIC_WORDS:
+            continue
+        keywords.append(word)
+    return keywords
+
+def topic_overlap(a, b):
+    """주제 겹침 정도 (내용어 2-gram 중 짧은 쪽 기준 공유 비율, 0~1)
+
+    날짜와 "전망", "전략" 같은 일반어는 빼고 내용어끼리만 비교합니다.
+    자카드 유사도는 한쪽 주제가 길면 낮게 나오므로
+    "3월 기준금리 인하 전망" 과 "기준금리 인하 후 대출 전략" 같은 파생 주제를 잡기 위해 짧은 쪽 기준으로 나눕니다.
+    """
+    def shingles(topic):
+        return {word[i:i + 2] for word in topic_keywords(topic) for i in range(len(word) - 1)}
+    sa, sb = shingles(a), shingles(b)
+    if not sa or not sb:
+        return 0.0
+    return len(sa & sb) / min(len(sa), len(sb))
+
+def find_related_research(topic):
+    """유효기간 안의 같은 클러스터 리서치 중 가장 비슷한 것 → {"id", "topic", "content", "created", "overlap"} 또는 None"""
+    cluster = research_cluster(topic)
+    conn = _research_db()
+    try:
+        rows = conn.execute(
+            "SELECT id, topic, topic_key, content, created FROM research WHERE cluster = ? AND created >= ?",
+            (cluster, time.time() - research_freshness(cluster))
+        ).fetchall()
+    finally:
+        conn.close()
+    
+    key = normalize_topic(topic)
+    best = None
+    for row_id, row_topic, row_key, content, created in rows:
+        overlap = 1.0 if row_key == key else topic_overlap(topic, row_topic)
+        if overlap >= RESEARCH_REUSE_THRESHOLD and (best is None or (overlap, created) > (best["overlap"], best["created"])):
+            best = {"id": row_id, "topic": row_topic, "content": content, "created": created, "overlap": overlap}
+    return best
+
+def remember_research(topic, content, base=None):
+    """리서치 저장 - 보강본은 원본의 수집 시각을 이어받아 원본과 함께 만료"""
+    with _research_store_lock:
+        conn = _research_db()
+        try:
+            conn.execute(
+                "INSERT INTO research (topic, topic_key, cluster, content, base_id, created) VALUES (?, ?, ?, ?, ?, ?)",
+                (topic, normalize_topic(topic), research_cluster(topic), content,
+                 base["id"] if base else None, base["created"] if base else time.time())
+            )
+            # 모든 클러스터 유효기간이 지난 항목 정리
+            longest = max([research_freshness(name) for name in RESEARCH_CLUSTERS]
+                          + [research_freshness("general")])
+            conn.execute("DELETE FROM research WHERE created < ?", (time.time() - longest,))
+            conn.commit()
+        finally:
+            conn.close()
+
+def extend_research(topic, base):
+    """기존 리서치 묶음에 새 주제 고유의 내용만 좁게 검색해서 보강"""
+    prompt = f"""
+당신은 경제 전문 리서처입니다.
+아래는 관련 주제 "{base['topic']}" 로 최근 조사한 자료입니다.
+
+[기존 조사 자료]
+{base['content']}
+
+**미션: 새 주제 "{topic}" 의 블로그 글 사전 조사 중 기존 자료에 없는 부분만 보충 조사**
+
+[🔍 보충할 내용]
+1. 새 주제에만 해당하는 최신 뉴스/데이터와 통계 수치 (출처 포함)
+2. 새 주제 관점의 전문가 의견이나 시장 전망
+3. 새 주제에 대해 일반인이 궁금해할 3가지 질문
+4. 새 주제에 맞는 실용적인 투자/재테크 팁
+
+기존 자료에 이미 있는 내용은 반복하지 마세요.
+
+**출력 형식: 보충 조사 결과만 요약 정리 (불릿 포인트 형식)**
+"""
+    extra = generate_content_with_retry(prompt, use_search=True, stage="research_extend")
+    return f"{base['content'].rstrip()}\n\n[보충 조사: {topic}]\n{extra.strip()}"
+
 def research_topic(topic):
-    """🆕 1단계: 주제에 대한 심층 리서치"""
+    """🆕 1단계: 주제에 대한 심층 리서치
+
+    리서치 저장소에 같은 주제의 신선한 리서치가 있으면 그대로 쓰고,
+    같은 클러스터의 비슷한 주제가 있으면 새 주제에 필요한 부분만 좁게 검색해서 보강합니다.
+    """
     print(f"🔍 [{topic}] 관련 최신 정보 수집 중...")
     
+    related = find_related_research(topic) if RESEARCH_STORE_ENABLED else None
+    if related and normalize_topic(related["topic"]) == normalize_topic(topic):
+        with _research_store_lock:
+            RESEARCH_STORE_STATS["reuse"] += 1
+        age = (time.time() - related["created"]) / 3600
+        print(f"📚 저장된 리서치 재사용 ({age:.1f}시간 전 수집)\n")
+        return related["content"]
+    if related:
+        try:
+            print(f"📚 비슷한 주제의 리서치 보강: {related['topic']} (겹침 {related['overlap']:.2f})")
+            research_result = extend_research(topic, related)
+            with _research_store_lock:
+                RESEARCH_STORE_STATS["extend"] += 1
+            remember_research(topic, research_result, base=related)
+            print("✅ 리서치 보강 완료!")
+            print(f"📊 수집된 정보 미리보기:\n{research_result[:300]}...\n")
+            return research_result
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            print(f"⚠️ 리서치 보강 실패, 새로 검색합니다: {e}")
+    
     try:
         prompt = f"""
 당신은 경제 전문 리서처입니다.
@@ -134,10 +1711,16 @@ def research_topic(topic):
 **웹 검색을 적극 활용하여 최신 정보를 찾아주세요.**
 **출력 형식: 조사 결과를 요약 정리 (불릿 포인트 형식)**
 """
-        research_result = generate_content_with_retry(prompt, use_search=True)
+        research_result = generate_content_with_retry(prompt, use_search=True, stage="research")
+        with _research_store_lock:
+            RESEARCH_STORE_STATS["search"] += 1
+        if RESEARCH_STORE_ENABLED:
+            remember_research(topic, research_result)
         print("✅ 리서치 완료!")
         print(f"📊 수집된 정보 미리보기:\n{research_result[:300]}...\n")
         return research_result
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         print(f"⚠️ 리서치 실패, 기본 정보로 진행: {e}")
         return f"{topic}에 대한 기본 정보를 바탕으로 작성합니다."
@@ -147,7 +1730,8 @@ def create_outline(topic, research_data):
     print("📝 글 구조 설계 중...")
     
     try:
-        prompt = f"""
+        def render(research_data):
+            return f"""
 당신은 베테랑 블로그 에디터입니다.
 
 **주제:** {topic}
@@ -184,44 +1768,62 @@ def create_outline(topic, research_data):
 
 (이하 생략)
 """
-        outline = generate_content_with_retry(prompt, use_search=False)
+        prompt = build_prompt("outline", render, compactable="research_data", research_data=research_data)
+        outline = generate_content_with_retry(prompt, use_search=False, stage="outline")
         print("✅ 아웃라인 생성 완료!\n")
         print(f"📐 구조 미리보기:\n{outline[:400]}...\n")
         return outline
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         print(f"⚠️ 아웃라인 생성 실패: {e}")
         return f"제목: {topic}\n\n기본 구조로 진행합니다."
 
-def write_full_content(topic, outline, research_data):
-    """🆕 3단계: 아웃라인을 바탕으로 본문 작성"""
-    print("✍️ 본문 작성 중... (플럭시 페르소나)")
-    
-    try:
-        prompt = f"""
-당신은 블로거 '플럭시(Fluxy)'입니다.
-오늘 날짜: {time.strftime('%Y년 %m월 %d일')}
-
-**주제:** {topic}
+# ✍️ 본문 작성 방식: "single"(글 전체를 한 번에) 또는 "sections"(도입부/섹션/마무리를 동시에 작성)
+WRITE_MODES = ("single", "sections")
+WRITE_MODE = os.environ.get("WRITE_MODE", "single")
+SECTION_WORKERS = int(os.environ.get("SECTION_WORKERS", "4"))
+# 섹션별 품질 검사 기준 (통과한 섹션은 LLM 재작성 없이 그대로 사용)
+QUALITY_STIFF_PHRASES = ["하고자 합니다", "살펴보겠습니다", "알아보겠습니다", "안녕하세요", "오늘은 "]
+QUALITY_MAX_PARAGRAPH_CHARS = int(os.environ.get("QUALITY_MAX_PARAGRAPH_CHARS", "400"))
+HTML_SECTION_START = re.compile(r"<h2[\s>]", re.I)
+HTML_PARAGRAPH = re.compile(r"<p[^>]*>(.*?)</p>", re.I | re.S)
 
-**글 구조:**
-{outline}
+WRITE_FORBIDDEN_RULES = """- "블로그 콘텐츠 품질 검수", "요청하신", "개선했습니다" 등 메타 언급
+- "안녕하세요 여러분", "오늘은 ~에 대해 알아보겠습니다" 같은 진부한 시작
+- 이모티콘 (📈💡 같은 것) - 텍스트로만 작성
+- 너무 딱딱하거나 학술적인 문체
+- 추상적 조언 ("열심히 해보세요" 같은 것)"""
 
-**참고 자료:**
-{research_data}
+WRITE_HTML_RULES = """- 대제목: <h2>섹션 제목</h2>
+- 중제목: <h3>하위 제목</h3>
+- 본문: <p>문단 내용</p>
+- 리스트: <ul><li>항목</li></ul>
+- 강조: <strong>강조 텍스트</strong>"""
 
----
+QUALITY_RULES = """[🔍 필수 검사 항목]
+1. **메타 언급 완전 제거:** "블로그 콘텐츠", "요청하신", "검토", "개선", "재구성" 같은 단어가 하나라도 있으면 해당 문장 전체 삭제
+2. **AI 티 제거:** "~하고자 합니다", "살펴보겠습니다" 같은 딱딱한 표현을 "~해요", "~볼까요?" 등으로 변경
+3. **구체성 확인:** 모든 주장에 숫자나 구체적 예시가 있는지 확인
+4. **문단 길이:** 6줄 이상 문단은 2개로 분리
+5. **자연스러운 흐름:** 섹션 간 연결이 부드러운지 확인
 
-**미션: 위 아웃라인과 자료를 바탕으로 블로그 글을 작성하세요**
-
-[📝 플럭시의 글쓰기 스타일 - 반드시 준수할 것]
+[✅ 개선 방향]
+- 진부한 인사말 제거 ("안녕하세요", "오늘은 ~에 대해")
+- 질문형 문장 → 바로 답 주는 구조로
+- 추상적 표현 → 구체적 예시로 교체
+- 너무 긴 문장 → 2개로 분리
 
-**구조:**
-- 도입부: 독자에게 질문 던지기 → 왜 지금 이 주제가 중요한지 → 본론 예고
-- 본문: ## 제목으로 3~4개 섹션 구분 (명확한 번호와 제목)
-- 각 섹션: 핵심 주제 설명 → 구체적 숫자/데이터 → 실전 예시
-- 마무리: 핵심 요약 + 독자 행동 유도 + 따뜻한 응원
+[❌ 절대 금지]
+- "개선했습니다", "수정했습니다" 같은 메타 설명 추가
+- 원문에 없던 새로운 섹션 추가
+- 스타일을 완전히 바꾸기 (기존 톤 유지)"""
 
-**말투 (매우 중요!):**
+def write_style_guide(persona):
+    """본문 말투/데이터/문단 규칙 (전체 작성과 섹션별 작성이 같은 톤을 쓰도록 공유)"""
+    # 사이트별 추가 지침은 예시 톤 뒤에 붙임 (없으면 기존 프롬프트와 동일)
+    extra_style = f"\n**사이트 추가 지침:**\n{persona['style']}\n" if persona["style"] else ""
+    return f"""**말투 (매우 중요!):**
 - 존댓말 ~합니다/~입니다 위주
 - 가끔 ~이에요/~거든요/~거죠 섞어서 자연스럽게
 - "아직도 ~하시나요?" "~해 보세요" 같은 독자 참여형 문장
@@ -240,49 +1842,74 @@ def write_full_content(topic, outline, research_data):
 
 **예시 (기존 글 톤):**
 "아직도 ISA 계좌를 '연 2,000만 원짜리'라고 생각하시나요? **2026년부터는 완전히 다른 판이 열립니다.** 그동안 한도가 작아 아쉬웠던 분들이라면 오늘 포스팅을 꼭 끝까지 읽어주세요."
+{extra_style}"""
+
+def generate_html(prompt, stage):
+    """HTML 본문 생성 (스트리밍 설정을 따르고 코드블록 표시는 제거)"""
+    if STREAM_GENERATION:
+        text = generate_content_streaming(prompt, stage=stage)
+    else:
+        text = generate_content_with_retry(prompt, use_search=False, stage=stage)
+    return text.replace('```html', '').replace('```', '').strip()
+
+def write_full_content(topic, outline, research_data):
+    """🆕 3단계: 아웃라인을 바탕으로 본문 작성 (현재 사이트의 페르소나)"""
+    persona = current_site()["persona"]
+    print(f"✍️ 본문 작성 중... ({persona['nickname']} 페르소나)")
+    
+    if WRITE_MODE == "sections":
+        content = write_content_by_sections(topic, outline, research_data)
+        if content:
+            return content
+    
+    try:
+        def render(research_data):
+            return f"""
+당신은 블로거 '{persona['name']}'입니다.
+오늘 날짜: {time.strftime('%Y년 %m월 %d일')}
+
+**주제:** {topic}
+
+**글 구조:**
+{outline}
+
+**참고 자료:**
+{research_data}
 
+---
+
+**미션: 위 아웃라인과 자료를 바탕으로 블로그 글을 작성하세요**
+
+[📝 {persona['nickname']}의 글쓰기 스타일 - 반드시 준수할 것]
+
+**구조:**
+- 도입부: 독자에게 질문 던지기 → 왜 지금 이 주제가 중요한지 → 본론 예고
+- 본문: ## 제목으로 3~4개 섹션 구분 (명확한 번호와 제목)
+- 각 섹션: 핵심 주제 설명 → 구체적 숫자/데이터 → 실전 예시
+- 마무리: 핵심 요약 + 독자 행동 유도 + 따뜻한 응원
+
+{write_style_guide(persona)}
 [✅ 필수 포함 요소]
 1. 도입부 첫 문장은 반드시 질문이나 공감형으로
 2. 최소 3개 이상의 구체적 숫자/통계 포함
 3. 섹션마다 1~2개 실전 예시 (가상 시나리오 OK)
 4. 마무리는 3줄 체크리스트나 행동 유도 문장
-5. 마지막은 "이 글이 도움이 되셨길 바랍니다. 다음에 또 유익한 정보로 찾아올게요!"
+5. 마지막은 "{persona['closing']}"
 
 [❌ 절대 금지]
-- "블로그 콘텐츠 품질 검수", "요청하신", "개선했습니다" 등 메타 언급
-- "안녕하세요 여러분", "오늘은 ~에 대해 알아보겠습니다" 같은 진부한 시작
-- 이모티콘 (📈💡 같은 것) - 텍스트로만 작성
-- 너무 딱딱하거나 학술적인 문체
-- 추상적 조언 ("열심히 해보세요" 같은 것)
+{WRITE_FORBIDDEN_RULES}
 
 **HTML 형식:**
-- 대제목: <h2>섹션 제목</h2>
-- 중제목: <h3>하위 제목</h3>
-- 본문: <p>문단 내용</p>
-- 리스트: <ul><li>항목</li></ul>
-- 강조: <strong>강조 텍스트</strong>
+{WRITE_HTML_RULES}
 
 **출력: 제목 없이 본문만 HTML 형식으로**
 (html 코드블록 마크다운 없이 순수 HTML만 출력)
 """
-        content = generate_content_with_retry(prompt, use_search=False)
+        prompt = build_prompt("write", render, compactable="research_data", research_data=research_data)
+        content = generate_html(prompt, "write")
         
-        # HTML 코드블록 제거
-        content = content.replace('```html', '').replace('```', '').strip()
-        
-        # 메타 언급 제거 (혹시 모를 실수 방지)
-        meta_phrases = [
-            "블로그 콘텐츠 품질 검수",
-            "요청하신 원고",
-            "개선한 최종 버전",
-            "검토하고",
-            "재구성했습니다"
-        ]
-        for phrase in meta_phrases:
-            if phrase in content:
-                # 해당 문단 전체 제거
-                lines = content.split('\n')
-                content = '\n'.join([line for line in lines if phrase not in line])
+        # 메타 언급 제거 (혹시 모를 실수 방지) - 해당 문단/항목 전체 제거
+        content = strip_meta_blocks(content, META_PHRASE_MATCHER).strip()
         
         print("✅ 본문 작성 완료!\n")
         return content
@@ -290,12 +1917,205 @@ def write_full_content(topic, outline, research_data):
         print(f"❌ 본문 작성 실패: {e}")
         raise
 
+def split_outline_parts(outline):
+    """아웃라인의 번호 항목("1. 도입부", "2. ...")을 [(제목, 항목 전체 텍스트)] 로 분리"""
+    parts = []
+    for line in outline.splitlines():
+        match = re.match(r"^[#*\s]{0,4}(\d+)[.)]\s+(.+?)[*\s]*$", line)
+        if match and not line.startswith(("   ", "\t")):
+            parts.append([match.group(2).strip(" *#"), line.strip()])
+        elif parts and line.strip():
+            parts[-1][1] += "\n" + line.rstrip()
+    return [tuple(part) for part in parts]
+
+def write_section(topic, outline, research_data, part, role):
+    """섹션 하나 작성 - role: "intro" / "body" / "closing" """
+    persona = current_site()["persona"]
+    heading, detail = part
+    if role == "intro":
+        task = """- 이번에 쓸 부분은 **도입부** 입니다. <h2> 제목 없이 <p> 문단 2~3개로만 작성
+- 첫 문장은 반드시 질문이나 공감형으로 → 왜 지금 이 주제가 중요한지 → 본론 예고"""
+    elif role == "closing":
+        task = f"""- 이번에 쓸 부분은 **마무리** 입니다. <h2>{heading}</h2> 로 시작
+- 핵심 요약 + 3줄 체크리스트나 행동 유도 문장 + 따뜻한 응원
+- 마지막 문장은 "{persona['closing']}\""""
+    else:
+        task = f"""- 이번에 쓸 부분은 본문 섹션 **{heading}** 입니다. <h2>{heading}</h2> 로 시작
+- 핵심 주제 설명 → 구체적 숫자/데이터(최소 1개) → 실전 예시 1~2개 (가상 시나리오 OK)
+- 도입 인사나 마무리 인사 없이 이 섹션 내용만 작성"""
+    
+    def render(research_data):
+        return f"""
+당신은 블로거 '{persona['name']}'입니다.
+오늘 날짜: {time.strftime('%Y년 %m월 %d일')}
+
+**주제:** {topic}
+
+**전체 글 구조 (다른 부분은 다른 작가가 동시에 작성합니다):**
+{outline}
+
+**이번에 작성할 항목:**
+{detail}
+
+**참고 자료:**
+{research_data}
+
+---
+
+**미션: 위 글의 한 부분만 작성하세요**
+
+[📍 작성 범위]
+{task}
+
+[📝 {persona['nickname']}의 글쓰기 스타일 - 반드시 준수할 것]
+
+{write_style_guide(persona)}
+
+[❌ 절대 금지]
+{WRITE_FORBIDDEN_RULES}
+- 다른 섹션 내용을 미리 쓰거나 반복하기
+
+**HTML 형식:**
+{WRITE_HTML_RULES}
+
+**출력: 이 부분만 HTML 형식으로**
+(html 코드블록 마크다운 없이 순수 HTML만 출력)
+"""
+    prompt = build_prompt("write", render, compactable="research_data", research_data=research_data)
+    html_part = generate_html(prompt, "write_section")
+    html_part = strip_meta_blocks(html_part, META_PHRASE_MATCHER).strip()
+    if role != "intro" and not HTML_SECTION_START.match(html_part):
+        html_part = f"<h2>{html.escape(heading)}</h2>\n{html_part}"
+    return html_part
+
+def map_sections(fn, items):
+    """섹션 작업을 동시에 실행 (현재 사이트/트레이스 컨텍스트 유지, 결과 순서 보존)"""
+    with ThreadPoolExecutor(max_workers=max(1, min(SECTION_WORKERS, len(items)))) as executor:
+        futures = [executor.submit(contextvars.copy_context().run, fn, index, item)
+                   for index, item in enumerate(items)]
+        return [future.result() for future in futures]
+
+def write_content_by_sections(topic, outline, research_data):
+    """✍️ 섹션별 동시 작성: 도입부/본문 섹션/마무리를 같은 스타일 지침으로 병렬 생성 후 이어붙임
+
+    아웃라인을 3개 이상 항목으로 나누지 못하거나 작성에 실패하면 None (전체 한 번에 작성으로 대체)
+    """
+    parts = split_outline_parts(outline)
+    if len(parts) < 3:
+        print("⚠️ 아웃라인을 섹션으로 나눌 수 없어 전체를 한 번에 작성합니다.")
+        return None
+    
+    persona = current_site()["persona"]
+    print(f"✍️ 섹션별 동시 작성 중... ({len(parts)}개 부분, {persona['nickname']} 페르소나)")
+    
+    # 섹션마다 긴 리서치 원문을 넣지 않고 팩트 시트 하나를 함께 씀 (입력 토큰이 섹션 수만큼 불어나지 않게)
+    if estimate_tokens(research_data) > RESEARCH_FACT_SHEET_TOKENS:
+        research_data = compact_research(research_data)
+    
+    def write(index, part):
+        role = "intro" if index == 0 else "closing" if index == len(parts) - 1 else "body"
+        with trace_span("write.section", index=index, role=role):
+            return write_section(topic, outline, research_data, part, role)
+    
+    try:
+        content = "\n\n".join(map_sections(write, parts))
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        print(f"⚠️ 섹션별 작성 실패, 전체를 한 번에 작성합니다: {e}")
+        return None
+    print("✅ 본문 작성 완료!\n")
+    return content
+
+def split_html_sections(content):
+    """본문 HTML 을 <h2> 기준으로 분리 (첫 조각은 도입부, 이어붙이면 원문과 동일)"""
+    starts = [0] + [match.start() for match in HTML_SECTION_START.finditer(content) if match.start() > 0]
+    return [content[a:b] for a, b in zip(starts, starts[1:] + [len(content)]) if content[a:b].strip()]
+
+def section_issues(section, is_intro=False, is_closing=False):
+    """LLM 없이 검사하는 섹션 품질 문제 목록 (빈 목록이면 통과)"""
+    issues = []
+    if META_KILL_MATCHER.search(section):
+        issues.append("메타 언급")
+    stiff = [phrase.strip() for phrase in QUALITY_STIFF_PHRASES if phrase in section]
+    if stiff:
+        issues.append(f"딱딱하거나 진부한 표현({', '.join(stiff)})")
+    if not (is_intro or is_closing) and not re.search(r"\d", re.sub(r"<[^>]+>", "", section)):
+        issues.append("구체적 숫자 없음")
+    if any(len(re.sub(r"<[^>]+>", "", text)) > QUALITY_MAX_PARAGRAPH_CHARS for text in HTML_PARAGRAPH.findall(section)):
+        issues.append("너무 긴 문단")
+    return issues
+
+def improve_section(topic, section, issues):
+    """문제가 있는 섹션 하나만 다시 다듬기 (실패 시 원문 유지)"""
+    def render(content):
+        return f"""
+당신은 블로그 에디터입니다.
+
+**주제:** {topic}
+
+**글의 한 섹션:**
+{content}
+
+**발견된 문제:** {', '.join(issues)}
+
+---
+
+**미션: 위 섹션의 문제점을 고치되, 절대 '드래프트' 느낌이 나지 않도록 하세요**
+
+{QUALITY_RULES}
+- 소제목(<h2>)은 그대로 유지
+
+**출력: 개선된 섹션만 (HTML 형식, 메타 설명 절대 금지)**
+"""
+    try:
+        prompt = build_prompt("quality", render, strict=True, content=section)
+        improved = strip_meta_blocks(generate_html(prompt, "quality_section"), META_KILL_MATCHER)
+        return improved.strip() or section
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        print(f"⚠️ 섹션 품질 개선 실패, 원본 사용: {e}")
+        return section
+
+def quality_check_sections(topic, content):
+    """🔍 섹션별 품질 검사: 규칙 검사에 걸린 섹션만 동시에 다시 다듬고 나머지는 그대로 사용"""
+    sections = split_html_sections(content)
+    if not sections:
+        return content
+    
+    checks = [section_issues(section, is_intro=not HTML_SECTION_START.match(section.lstrip()),
+                             is_closing=index == len(sections) - 1)
+              for index, section in enumerate(sections)]
+    failing = [index for index, issues in enumerate(checks) if issues]
+    print(f"🔍 섹션별 품질 검사: {len(sections)}개 중 {len(failing)}개 섹션 개선 필요")
+    for index in failing:
+        print(f"   - {index + 1}번 섹션: {', '.join(checks[index])}")
+    if not failing:
+        return strip_meta_blocks(content, META_KILL_MATCHER).strip()
+    
+    def improve(_, index):
+        with trace_span("quality.section", index=index):
+            return improve_section(topic, sections[index], checks[index])
+    
+    for index, improved in zip(failing, map_sections(improve, failing)):
+        sections[index] = improved
+    
+    print("✅ 품질 개선 완료!\n")
+    return "\n\n".join(section.strip() for section in sections)
+
 def quality_check_and_improve(topic, content):
-    """🆕 4단계: 품질 검증 및 개선"""
+    """🆕 4단계: 품질 검증 및 개선 (마감 시간이 부족하면 생략)"""
+    if deadline_low(DEADLINE_QUALITY_RESERVE):
+        note_degraded("품질 검사 생략")
+        return content
+    if WRITE_MODE == "sections":
+        return quality_check_sections(topic, content)
     print("🔍 AI 품질 검사 진행 중...")
     
     try:
-        prompt = f"""
+        def render(content):
+            return f"""
 당신은 블로그 에디터입니다.
 
 **주제:** {topic}
@@ -307,51 +2127,21 @@ def quality_check_and_improve(topic, content):
 
 **미션: 위 글에서 문제점을 찾아 개선하되, 절대 '드래프트' 느낌이 나지 않도록 하세요**
 
-[🔍 필수 검사 항목]
-1. **메타 언급 완전 제거:** "블로그 콘텐츠", "요청하신", "검토", "개선", "재구성" 같은 단어가 하나라도 있으면 해당 문장 전체 삭제
-2. **AI 티 제거:** "~하고자 합니다", "살펴보겠습니다" 같은 딱딱한 표현을 "~해요", "~볼까요?" 등으로 변경
-3. **구체성 확인:** 모든 주장에 숫자나 구체적 예시가 있는지 확인
-4. **문단 길이:** 6줄 이상 문단은 2개로 분리
-5. **자연스러운 흐름:** 섹션 간 연결이 부드러운지 확인
-
-[✅ 개선 방향]
-- 진부한 인사말 제거 ("안녕하세요", "오늘은 ~에 대해")
-- 질문형 문장 → 바로 답 주는 구조로
-- 추상적 표현 → 구체적 예시로 교체
-- 너무 긴 문장 → 2개로 분리
-
-[❌ 절대 금지]
-- "개선했습니다", "수정했습니다" 같은 메타 설명 추가
-- 원문에 없던 새로운 섹션 추가
-- 스타일을 완전히 바꾸기 (기존 톤 유지)
+{QUALITY_RULES}
 
 **출력: 개선된 본문만 (HTML 형식, 제목 제외, 메타 설명 절대 금지)**
 """
-        improved_content = generate_content_with_retry(prompt, use_search=False)
-        improved_content = improved_content.replace('```html', '').replace('```', '').strip()
+        # 글 전체를 다시 보내야 하므로 예산을 넘으면 품질 검사를 생략하고 원본 사용
+        prompt = build_prompt("quality", render, strict=True, content=content)
+        improved_content = generate_html(prompt, "quality")
         
-        # 2차 필터링: 혹시 모를 메타 언급 강제 제거
-        meta_kill_list = [
-            "블로그 콘텐츠 품질 검수",
-            "요청하신 원고",
-            "개선한 최종 버전",
-            "검토하고",
-            "재구성했습니다",
-            "수정했습니다",
-            "다듬고",
-            "품질을 극대화",
-            "에디터로서",
-            "검수 전문가"
-        ]
-        
-        for meta_phrase in meta_kill_list:
-            if meta_phrase in improved_content:
-                # 해당 문구가 포함된 문단 전체 제거
-                paras = improved_content.split('</p>')
-                improved_content = '</p>'.join([p for p in paras if meta_phrase not in p])
+        # 2차 필터링: 혹시 모를 메타 언급 강제 제거 (해당 문단/항목 전체)
+        improved_content = strip_meta_blocks(improved_content, META_KILL_MATCHER).strip()
         
         print("✅ 품질 개선 완료!\n")
         return improved_content
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         print(f"⚠️ 품질 검사 실패, 원본 사용: {e}")
         return content
@@ -365,6 +2155,115 @@ def extract_title_from_outline(outline):
                 return title
     return None
 
+# 🧬 통합 모드: 아웃라인 + 제목 + 썸네일 프롬프트 + 한글 오버레이를 한 번의 구조화 출력으로
+PIPELINE_MODES = ("multi", "fused")
+PIPELINE_MODE = os.environ.get("PIPELINE_MODE", "multi")
+POST_PLAN_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "title": {"type": "STRING", "description": "SEO 최적화된 한국어 제목"},
+        "intro": {"type": "STRING", "description": "도입부 핵심 메시지"},
+        "sections": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "heading": {"type": "STRING"},
+                    "key_message": {"type": "STRING"},
+                    "data_points": {"type": "STRING"},
+                },
+                "required": ["heading", "key_message"],
+            },
+        },
+        "tips": {"type": "STRING", "description": "실전 활용 팁"},
+        "closing": {"type": "STRING", "description": "마무리 핵심 요약 + 행동 제안"},
+        "thumbnail_prompt": {"type": "STRING", "description": "영문 썸네일 이미지 프롬프트 (100단어 이내)"},
+        "overlay_text": {"type": "STRING", "description": "썸네일에 넣을 한글 핵심 단어 3~5개"},
+    },
+    "required": ["title", "sections", "thumbnail_prompt", "overlay_text"],
+}
+
+def outline_from_plan(plan):
+    """구조화 출력을 기존 아웃라인 텍스트 형식으로 변환 (본문 작성 프롬프트 호환)"""
+    lines = [f"제목: {plan['title']}", "", "1. 도입부", f"   - 핵심 메시지: {plan.get('intro', '')}", ""]
+    for number, section in enumerate(plan.get("sections", []), start=2):
+        lines.append(f"{number}. {section['heading']}")
+        lines.append(f"   - 핵심 메시지: {section['key_message']}")
+        if section.get("data_points"):
+            lines.append(f"   - 포함할 데이터: {section['data_points']}")
+        lines.append("")
+    number = len(plan.get("sections", [])) + 2
+    lines.append(f"{number}. 실전 활용 팁")
+    lines.append(f"   - 핵심 메시지: {plan.get('tips', '')}")
+    lines.append("")
+    lines.append(f"{number + 1}. 마무리")
+    lines.append(f"   - 핵심 메시지: {plan.get('closing', '')}")
+    return "\n".join(lines)
+
+def create_post_plan(topic, research_data):
+    """🧬 통합 모드: 제목/섹션 아웃라인/썸네일 프롬프트/한글 오버레이를 JSON 한 번으로 생성
+
+    실패하면 None (호출 측에서 기존 다중 호출 방식으로 대체)
+    """
+    print("🧬 글 구조 + 제목 + 썸네일 컨셉 통합 설계 중...")
+    
+    try:
+        def render(research_data):
+            return f"""
+당신은 베테랑 블로그 에디터이자 경제 블로그 비주얼 디렉터입니다.
+
+**주제:** {topic}
+
+**리서치 자료:**
+{research_data}
+
+**미션: 위 자료를 바탕으로 블로그 글 설계도를 JSON 으로 작성하세요**
+
+[📋 글 구조]
+- title: SEO 최적화된 제목 (2040 세대가 검색할 키워드 포함)
+- intro: 도입부 핵심 메시지 (후킹 + 왜 중요한지)
+- sections: 본문 섹션 3~4개 (heading: 소제목, key_message: 핵심 메시지, data_points: 포함할 구체적 숫자/사례)
+- tips: 독자가 바로 적용할 실전 팁
+- closing: 핵심 요약 + 다음 행동 제안
+
+[🎨 썸네일]
+- thumbnail_prompt: 영문 이미지 프롬프트 (100단어 이내, 인포그래픽 스타일, 파란색/녹색 + 주황 포인트, "high quality, professional design, 4K")
+  실존 인물, 기업 로고, 저작권 캐릭터 금지
+- overlay_text: 썸네일에 넣을 한글 핵심 단어 3~5개
+"""
+        prompt = build_prompt("outline", render, compactable="research_data", research_data=research_data)
+        raw = generate_content_with_retry(prompt, use_search=False, stage="plan", response_schema=POST_PLAN_SCHEMA)
+        plan = json.loads(raw.replace('```json', '').replace('```', '').strip())
+        if not plan.get("title") or not plan.get("sections"):
+            raise ValueError("제목 또는 섹션이 비어 있습니다.")
+        
+        plan["outline"] = outline_from_plan(plan)
+        overlay = plan.get("overlay_text", "").strip()
+        plan["image_prompt"] = clean_image_prompt(f"Korean text '{overlay}', {plan['thumbnail_prompt']}")
+        
+        print("✅ 통합 설계 완료!")
+        print(f"📌 제목: {plan['title']}")
+        print(f"✨ 썸네일 프롬프트: {plan['image_prompt']}\n")
+        return plan
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        print(f"⚠️ 통합 설계 실패, 기존 방식으로 진행: {e}")
+        return None
+
+def clean_image_prompt(image_prompt):
+    """이미지 프롬프트 정리 (따옴표/줄바꿈 제거, 400자 제한)"""
+    image_prompt = image_prompt.strip()
+    
+    # 따옴표 및 불필요한 기호 제거
+    image_prompt = image_prompt.replace('"', '').replace("'", '').replace('`', '')
+    image_prompt = image_prompt.replace('\n', ' ').replace('  ', ' ')
+    
+    # 너무 길면 자르기
+    if len(image_prompt) > 400:
+        image_prompt = image_prompt[:400]
+    return image_prompt
+
 def get_dynamic_image_prompt(topic, content_summary):
     """🆕 개선: 글 내용을 반영한 이미지 프롬프트 생성"""
     print("🎨 주제에 딱 맞는 이미지 컨셉 구상 중...")
@@ -400,18 +2299,13 @@ def get_dynamic_image_prompt(topic, content_summary):
 
 **출력 형식: 영문 프롬프트만 (한글 텍스트 포함, 100단어 이내)**
 """
-        image_prompt = generate_content_with_retry(prompt, use_search=False).strip()
-        
-        # 따옴표 및 불필요한 기호 제거
-        image_prompt = image_prompt.replace('"', '').replace("'", '').replace('`', '')
-        image_prompt = image_prompt.replace('\n', ' ').replace('  ', ' ')
-        
-        # 너무 길면 자르기
-        if len(image_prompt) > 400:
-            image_prompt = image_prompt[:400]
+        image_prompt = generate_content_with_retry(prompt, use_search=False, stage="image_prompt")
+        image_prompt = clean_image_prompt(image_prompt)
         
         print(f"✨ 생성된 프롬프트: {image_prompt}\n")
         return image_prompt
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         print(f"⚠️ 이미지 프롬프트 생성 실패, 기본값 사용: {e}")
         # 기본값도 주제를 반영하도록
@@ -432,13 +2326,13 @@ def generate_image_url(prompt, service="replicate"):
     
     services = {
         # 안정적인 서비스 우선
-        "replicate": f"https://image.pollinations.ai/prompt/{encoded_prompt}?width=1200&height=630&nologo=true&private=true&seed={seed}",
-        "pollinations-simple": f"https://image.pollinations.ai/prompt/{encoded_prompt}?seed={seed}",
+        "replicate": f"{IMAGE_SERVICE_URL}/prompt/{encoded_prompt}?width=1200&height=630&nologo=true&private=true&seed={seed}",
+        "pollinations-simple": f"{IMAGE_SERVICE_URL}/prompt/{encoded_prompt}?seed={seed}",
         "dalle-mini": f"https://pollinations.ai/p/{encoded_prompt}",
         
         # 백업 옵션들
-        "flux-basic": f"https://image.pollinations.ai/prompt/{encoded_prompt}?width=1200&height=630&nologo=true&model=flux&seed={seed}",
-        "default": f"https://image.pollinations.ai/prompt/{encoded_prompt}?width=1200&height=630&enhance=true&seed={seed}",
+        "flux-basic": f"{IMAGE_SERVICE_URL}/prompt/{encoded_prompt}?width=1200&height=630&nologo=true&model=flux&seed={seed}",
+        "default": f"{IMAGE_SERVICE_URL}/prompt/{encoded_prompt}?width=1200&height=630&enhance=true&seed={seed}",
     }
     
     return services.get(service, services["replicate"])
@@ -462,230 +2356,1635 @@ def create_fallback_image_html(topic):
     {keywords}
   </text>
   <text x="50%" y="55%" dominant-baseline="middle" text-anchor="middle" fill="rgba(255,255,255,0.8)" font-size="24" font-family="Arial, sans-serif">
-    PLUXEON 경제 블로그
+    {html.escape(current_site()["persona"]["brand"])}
   </text>
 </svg>'''
     
     return svg_content
 
-def upload_image_to_wp(image_prompt, title, max_retries=2):
-    """🆕 개선: 이미지 업로드 (다중 서비스 + SVG 폴백)"""
-    print(f"🖼️ 이미지 생성 및 업로드 시작...")
-    print(f"📌 프롬프트: {image_prompt[:100]}...\n")
+# 🏁 이미지 헤지 요청 설정: 앞 서비스가 이 시간(초) 안에 응답하지 않으면 다음 서비스를 동시에 시작
+# 0 이면 기존처럼 서비스를 하나씩 순서대로 시도
+IMAGE_HEDGE_DELAY = float(os.environ.get("IMAGE_HEDGE_DELAY", "15"))
+IMAGE_MIN_BYTES = 5000
+IMAGE_TIMEOUT = float(os.environ.get("IMAGE_TIMEOUT", "45"))
+# 🌊 스트리밍 업로드: 앞부분만 검증하고 나머지는 받는 대로 WordPress 로 흘려보냄 (0 이면 전체 버퍼링)
+IMAGE_STREAMING = os.environ.get("IMAGE_STREAMING", "1") != "0"
+IMAGE_CHUNK_SIZE = 64 * 1024
+# 🗜️ 로컬 썸네일 변환 (Pillow 필요): 1200×630 으로 자르고 용량 예산 안에서 WebP/JPEG 인코딩
+THUMBNAIL_TRANSCODE = os.environ.get("THUMBNAIL_TRANSCODE", "1") != "0"
+THUMBNAIL_SIZE = (1200, 630)
+THUMBNAIL_FORMAT = os.environ.get("THUMBNAIL_FORMAT", "webp").lower()
+THUMBNAIL_MAX_BYTES = int(os.environ.get("THUMBNAIL_MAX_KB", "150")) * 1024
+THUMBNAIL_QUALITIES = (85, 78, 70, 62, 55, 45)
+THUMBNAIL_FORMATS = {
+    "webp": ("WEBP", "image/webp", "webp", {"method": 4}),
+    "jpeg": ("JPEG", "image/jpeg", "jpg", {"optimize": True, "progressive": True}),
+}
+
+_pillow = None
+
+def load_pillow():
+    """(Image, ImageOps) 모듈 - Pillow 가 없으면 None (선택 의존성, 처음 필요할 때만 import)"""
+    global _pillow
+    if _pillow is None:
+        try:
+            from PIL import Image, ImageOps
+            _pillow = (Image, ImageOps)
+        except ImportError:
+            _pillow = ()
+    return _pillow or None
+
+def sniff_image_type(head):
+    """파일 시그니처로 실제 이미지 형식 판별 → (MIME, 확장자) 또는 None"""
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png", "png"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg", "jpg"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp", "webp"
+    return None
+
+class ImageSlot:
+    """잡아 둔 IMAGE_SLOTS 슬롯 1개 - 여러 곳(요청 스레드/헤지 취소)에서 반납해도 한 번만 반납"""
     
-    # 시도할 서비스 목록
-    services = ["replicate", "pollinations-simple", "flux-basic", "default"]
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._held = True
+    
+    def release(self):
+        with self._lock:
+            if not self._held:
+                return
+            self._held = False
+        IMAGE_SLOTS.release()
+
+class HedgeCancel(threading.Event):
+    """헤지 취소 신호 - set() 되면 진 요청들이 잡고 있던 슬롯을 (응답을 기다리는 중이어도) 바로 반납"""
+    
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._slots = set()
+    
+    def hold(self, slot):
+        """취소 시 반납할 슬롯으로 등록 → 이미 취소됐으면 바로 반납하고 True"""
+        with self._lock:
+            if not self.is_set():
+                self._slots.add(slot)
+                return False
+        slot.release()
+        return True
+    
+    def keep(self, slot):
+        """이긴 요청의 슬롯은 반납 대상에서 제외 (다운로드를 닫을 때 반납)"""
+        with self._lock:
+            self._slots.discard(slot)
+    
+    def set(self):
+        with self._lock:
+            super().set()
+            slots, self._slots = self._slots, set()
+        for slot in slots:
+            slot.release()
+
+def acquire_image_slot(cancel_event=None):
+    """IMAGE_SLOTS 슬롯 확보 → ImageSlot (기다리는 중에 cancel_event 로 취소되면 None)"""
+    while not IMAGE_SLOTS.acquire(timeout=0.2):
+        if cancel_event is not None and cancel_event.is_set():
+            return None
+    slot = ImageSlot()
+    if isinstance(cancel_event, HedgeCancel) and cancel_event.hold(slot):
+        return None
+    return slot
+
+class ImageDownload:
+    """검증을 통과한 이미지 응답 (앞부분만 읽은 상태)
+
+    파일처럼 read() 할 수 있어 requests 업로드 본문으로 그대로 넘기면
+    나머지 바이트가 청크 단위로 WordPress 에 전달됩니다.
+    닫힐 때 IMAGE_SLOTS 슬롯을 반납합니다.
+    """
+    
+    def __init__(self, service, response, head, chunks, content_type, extension, length, slot):
+        self.service = service
+        self.slot = slot
+        self.content_type = content_type
+        self.extension = extension
+        self.length = length
+        self._response = response
+        self._chunks = chunks
+        self._buffer = bytearray(head)
+        self._closed = False
+        self.received = len(head)
+        self._sha256 = hashlib.sha256(head)
+    
+    def __len__(self):
+        return self.length
+    
+    @property
+    def content_hash(self):
+        """본문 전체의 SHA-256 (끝까지 받은 뒤에만 값이 있음)"""
+        return self._sha256.hexdigest() if self._chunks is None else None
+    
+    @property
+    def complete(self):
+        """본문을 모두 받아 메모리에 있는 상태인지"""
+        return self._chunks is None
+    
+    def read(self, size=-1):
+        while self._chunks is not None and (size < 0 or len(self._buffer) < size):
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self._chunks = None
+                self.close()
+                break
+            self.received += len(chunk)
+            self._sha256.update(chunk)
+            self._buffer += chunk
+        
+        if size < 0:
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+    
+    def buffer_all(self, cancel_event=None):
+        """나머지를 모두 메모리로 읽음 (취소되면 False)"""
+        while self._chunks is not None:
+            if cancel_event is not None and cancel_event.is_set():
+                self.close()
+                return False
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self._chunks = None
+                break
+            self.received += len(chunk)
+            self._sha256.update(chunk)
+            self._buffer += chunk
+        self.length = len(self._buffer)
+        self.close()
+        return True
+    
+    def upload_body(self):
+        """길이를 알면 파일 객체(Content-Length), 모르면 청크 제너레이터(chunked)"""
+        if self.length is not None:
+            return self
+        return iter(lambda: self.read(IMAGE_CHUNK_SIZE), b"")
     
-    for service in services:
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._chunks = None
+            self._response.close()
+            self.slot.release()
+
+def open_image_download(service, image_url, cancel_event=None):
+    """이미지 응답을 열고 본문 전체를 받기 전에 검증
+
+    - Content-Type 이 텍스트/JSON 이면 (에러 페이지) 바로 거절
+    - Content-Length 가 최소 크기보다 작으면 본문을 읽지 않고 거절
+    - 첫 바이트의 PNG/JPEG/WebP 시그니처 확인
+    반환: ImageDownload 또는 (거절 사유 문자열, 서비스 보류 초 - 과부하 응답일 때만),
+          cancel_event 로 취소되면 None
+    """
+    slot = acquire_image_slot(cancel_event)
+    if slot is None:
+        return None
+    try:
+        # User-Agent 추가로 차단 우회 (세션 기본 헤더)
+        with trace_span("image.request", service=service) as span:
+            response = get_image_session().get(image_url, timeout=call_timeout(IMAGE_TIMEOUT), stream=True)
+            span["status"] = response.status_code
+    except Exception:
+        slot.release()
+        raise
+    
+    def reject(reason, retry_after):
+        response.close()
+        slot.release()
+        return reason, retry_after
+    
+    try:
+        if cancel_event is not None and cancel_event.is_set():
+            response.close()
+            slot.release()
+            return None
+
+        # 530/429/503 은 서비스 과부하 - Retry-After(없으면 5초) 동안 보류 후 재시도 가치 있음
+        if response.status_code in (429, 503, 530):
+            retry_after = retry_after_seconds(response.headers.get("Retry-After"), 5)
+            return reject(f"서비스 과부하 (HTTP {response.status_code}) - {retry_after:.0f}초 후 재시도...", retry_after)
+        elif response.status_code != 200:
+            return reject(f"이미지 다운로드 실패 (HTTP {response.status_code})", 0)
+        
+        header_type = response.headers.get("Content-Type", "")
+        if header_type.startswith("text/") or "json" in header_type:
+            return reject(f"이미지가 아닌 응답 ({header_type})", 0)
+        
+        length = response.headers.get("Content-Length")
+        length = int(length) if length and length.isdigit() and not response.headers.get("Content-Encoding") else None
+        if length is not None and length < IMAGE_MIN_BYTES:
+            return reject(f"이미지 크기가 너무 작음 ({length} bytes)", 0)
+        
+        # 시그니처 확인용 앞부분 (길이를 모르면 최소 크기만큼 미리 받아 확인)
+        need = 12 if length is not None else IMAGE_MIN_BYTES
+        chunks = response.iter_content(chunk_size=IMAGE_CHUNK_SIZE)
+        head = b""
+        for chunk in chunks:
+            if cancel_event is not None and cancel_event.is_set():
+                response.close()
+                slot.release()
+                return None
+            head += chunk
+            if len(head) >= need:
+                break
+        if len(head) < need:
+            return reject(f"이미지 크기가 너무 작음 ({len(head)} bytes)", 0)
+        
+        detected = sniff_image_type(head)
+        if detected is None:
+            return reject(f"이미지 시그니처 불일치 (앞 바이트: {head[:8]!r})", 0)
+    except Exception:
+        response.close()
+        slot.release()
+        raise
+    
+    return ImageDownload(service, response, head, chunks, detected[0], detected[1], length, slot)
+
+def fetch_image_from_service(image_prompt, service, max_retries=2, cancel_event=None):
+    """한 서비스에서 이미지 응답 확보 (재시도 포함)
+
+    성공 시 검증된 ImageDownload (IMAGE_STREAMING 이 꺼져 있으면 전체를 받아둔 상태),
+    실패하거나 cancel_event 로 취소되면 None
+    """
+    with trace_span("image.fetch", service=service) as span:
         print(f"🎨 {service} 서비스로 이미지 생성 시도...")
         
         for attempt in range(max_retries):
+            span["retries"] = attempt
+            if cancel_event is not None and cancel_event.is_set():
+                return None
             try:
                 # 이미지 URL 생성
                 image_url = generate_image_url(image_prompt, service)
-                print(f"📡 [{attempt+1}/{max_retries}] 이미지 생성 중...")
-                
-                # User-Agent 추가로 차단 우회
-                headers = {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-                }
-                
-                img_response = requests.get(image_url, headers=headers, timeout=45)
-                
-                # 530 에러는 서비스 과부하 - 재시도 가치 있음
-                if img_response.status_code == 530:
-                    print(f"⚠️ 서비스 과부하 (HTTP 530) - 5초 후 재시도...")
-                    time.sleep(5)
-                    continue
-                elif img_response.status_code != 200:
-                    print(f"⚠️ 이미지 다운로드 실패 (HTTP {img_response.status_code})")
-                    time.sleep(3)
-                    continue
-                
-                image_data = img_response.content
+                print(f"📡 [{service} {attempt+1}/{max_retries}] 이미지 생성 중...")
+                if throttle("image", cancel_event=cancel_event):
+                    return None
                 
-                # 이미지 크기 확인 (최소 5KB)
-                if len(image_data) < 5000:
-                    print(f"⚠️ 이미지 크기가 너무 작음 ({len(image_data)} bytes)")
-                    time.sleep(3)
+                download = open_image_download(service, image_url, cancel_event)
+                if download is None:
+                    return None
+                if isinstance(download, tuple):
+                    reason, retry_after = download
+                    print(f"⚠️ [{service}] {reason}")
+                    defer_provider("image", retry_after)
                     continue
                 
-                print(f"✅ 이미지 다운로드 성공! ({len(image_data):,} bytes)")
+                if not IMAGE_STREAMING:
+                    if not download.buffer_all(cancel_event):
+                        print(f"🛑 [{service}] 다른 서비스가 먼저 성공 - 요청 취소")
+                        return None
+                    if len(download) < IMAGE_MIN_BYTES:
+                        print(f"⚠️ [{service}] 이미지 크기가 너무 작음 ({len(download)} bytes)")
+                        continue
                 
-                # WordPress 업로드
-                filename = f"fluxy_{int(time.time())}.png"
-                credentials = f"{WP_USER}:{WP_APP_PASS}"
-                token = base64.b64encode(credentials.encode()).decode()
-                
-                wp_headers = {
-                    "Authorization": f"Basic {token}",
-                    "Content-Disposition": f"attachment; filename={filename}",
-                    "Content-Type": "image/png"
-                }
-                
-                media_url = WP_URL.replace("/posts", "/media")
-                print(f"📤 WordPress 업로드 시작...")
-                
-                wp_response = requests.post(
-                    media_url, 
-                    headers=wp_headers, 
-                    data=image_data, 
-                    verify=False, 
-                    timeout=45
-                )
+                if cancel_event is not None and cancel_event.is_set():
+                    download.close()
+                    return None
                 
-                print(f"📊 WordPress 응답 코드: {wp_response.status_code}")
-                
-                if wp_response.status_code == 201:
-                    media_id = wp_response.json()['id']
-                    media_link = wp_response.json().get('source_url', '링크 없음')
-                    print(f"🎉 업로드 성공!")
-                    print(f"🆔 Media ID: {media_id}")
-                    print(f"🔗 이미지 URL: {media_link}\n")
-                    return media_id
-                else:
-                    print(f"⚠️ WordPress 업로드 실패!")
-                    print(f"📄 응답 내용: {wp_response.text[:300]}")
-                    
-                    if wp_response.status_code == 401:
-                        print("❌ 인증 실패! WP_USER와 WP_APP_PASS를 확인하세요.")
-                    elif wp_response.status_code == 403:
-                        print("❌ 권한 부족! 앱 비밀번호에 미디어 업로드 권한이 있는지 확인하세요.")
-                    
-                    time.sleep(3)
+                size = f"{len(download):,} bytes" if download.length is not None else "크기 미상, 스트리밍"
+                print(f"✅ [{service}] 이미지 확인 완료! ({download.content_type}, {size})")
+                span["result"] = "ok"
+                return download
                     
             except requests.Timeout:
-                print(f"⏱️ 타임아웃 발생 (45초 초과)")
-                time.sleep(3)
+                print(f"⏱️ [{service}] 타임아웃 발생 ({IMAGE_TIMEOUT:.0f}초 초과)")
             except requests.RequestException as e:
-                print(f"❌ 네트워크 에러: {e}")
-                time.sleep(3)
+                print(f"❌ [{service}] 네트워크 에러: {e}")
+            except DeadlineExceeded:
+                raise
             except Exception as e:
-                print(f"❌ 예상치 못한 에러: {e}")
-                time.sleep(3)
+                print(f"❌ [{service}] 예상치 못한 에러: {e}")
         
         print(f"⚠️ {service} 서비스 모든 시도 실패\n")
+        span["result"] = "failed"
+        return None
+
+def _close_download(future):
+    """헤지에서 진 요청이 뒤늦게 끝나도 연결/슬롯을 정리"""
+    if not future.cancelled() and future.exception() is None and future.result() is not None:
+        future.result().close()
+
+def fetch_image_hedged(image_prompt, services, hedge_delay, max_retries=2):
+    """🏁 헤지 다운로드: 첫 서비스를 시작하고, hedge_delay 안에 결과가 없거나
+    실패하면 다음 서비스를 추가로 시작합니다. 먼저 유효한 이미지를 준 쪽이 이기고
+    나머지 요청은 취소됩니다.
+
+    반환: 이긴 서비스의 ImageDownload 또는 None
+    """
+    cancel_event = HedgeCancel()
+    executor = ThreadPoolExecutor(max_workers=len(services))
+    remaining = list(services)
+    running = {}
+    winner = None
     
-    # 모든 시도 실패 시 SVG 폴백
-    print("🎨 모든 이미지 서비스 실패 - SVG 대체 이미지 생성 시도...")
     try:
-        svg_content = create_fallback_image_html(title)
-        svg_bytes = svg_content.encode('utf-8')
+        while winner is None and (remaining or running):
+            if remaining:
+                service = remaining.pop(0)
+                if running:
+                    print(f"🏁 응답 지연 - {service} 서비스 헤지 요청 추가")
+                running[executor.submit(contextvars.copy_context().run, fetch_image_from_service,
+                                        image_prompt, service, max_retries, cancel_event)] = service
+            
+            done, _ = wait(running, timeout=hedge_delay if remaining else None, return_when=FIRST_COMPLETED)
+            for future in done:
+                running.pop(future)
+                if winner is None:
+                    winner = future.result()
+                    if winner is not None:
+                        cancel_event.keep(winner.slot)
+                else:
+                    _close_download(future)
+    finally:
+        # 진 요청 취소 (잡고 있던 슬롯 즉시 반납, 대기 중인 재시도/다운로드 중단, 늦게 끝난 응답은 닫기)
+        cancel_event.set()
+        for future in running:
+            future.add_done_callback(_close_download)
+        executor.shutdown(wait=False, cancel_futures=True)
+    
+    if winner:
+        print(f"🏆 {winner.service} 서비스 이미지 채택")
+    return winner
+
+# 🧾 업로드한 미디어 색인 (내용 해시 → media id) - 같은 바이트는 다시 올리지 않고 재사용
+def _media_index_db():
+    conn = open_state_db("media.sqlite3")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS media (
+            site TEXT,
+            sha256 TEXT,
+            media_id INTEGER,
+            source_url TEXT,
+            size INTEGER,
+            created REAL,
+            PRIMARY KEY (site, sha256)
+        )
+    """)
+    return conn
+
+def remember_media(media_url, digest, media_id, source_url=None, size=None):
+    """업로드 성공한 미디어를 색인에 기록"""
+    if not digest:
+        return
+    conn = _media_index_db()
+    try:
+        conn.execute(
+            "INSERT OR REPLACE INTO media VALUES (?, ?, ?, ?, ?, ?)",
+            (media_url, digest, media_id, source_url, size, time.time())
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+def verify_media(media_url, media_id, size=None):
+    """WordPress 에 첨부파일이 아직 있는지 확인 → True(있음) / False(삭제됨·크기 불일치) / None(확인 불가)"""
+    try:
+        throttle(wp_provider())
+        with trace_span("wp.verify_media", media_id=media_id) as span:
+            response = get_wp_session().get(
+                f"{media_url}/{media_id}", params={"_fields": "id,source_url,media_details"}, timeout=call_timeout(15)
+            )
+            span["status"] = response.status_code
+        note_wp_response(response)
+    except requests.RequestException as e:
+        print(f"⚠️ 미디어 확인 실패 (ID {media_id}): {e}")
+        return None
+    
+    if response.status_code in (404, 410):
+        return False
+    if response.status_code != 200:
+        return None
+    filesize = (response.json().get("media_details") or {}).get("filesize")
+    return not (size and filesize and int(filesize) != size)
+
+def find_reusable_media(media_url, digest, size=None):
+    """같은 내용으로 이미 올린 첨부파일 media id (WordPress 에서 확인된 것만, 없으면 None)"""
+    conn = _media_index_db()
+    try:
+        row = conn.execute(
+            "SELECT media_id FROM media WHERE site = ? AND sha256 = ?", (media_url, digest)
+        ).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    
+    exists = verify_media(media_url, row[0], size)
+    if exists is False:
+        print(f"🧾 색인의 미디어(ID {row[0]})가 WordPress 에서 사라짐 - 다시 업로드합니다.")
+        conn = _media_index_db()
+        try:
+            conn.execute("DELETE FROM media WHERE site = ? AND sha256 = ?", (media_url, digest))
+            conn.commit()
+        finally:
+            conn.close()
+        return None
+    return row[0] if exists else None
+
+def find_uploaded_media(media_url, filename, size=None):
+    """응답을 못 받은 업로드가 실제로는 끝났는지 파일명으로 검색 → media id 또는 None"""
+    stem = filename.rsplit(".", 1)[0]
+    try:
+        throttle(wp_provider())
+        with trace_span("wp.search_media", filename=filename) as span:
+            response = get_wp_session().get(
+                media_url, params={"search": stem, "_fields": "id,source_url,media_details", "per_page": 5},
+                timeout=call_timeout(15)
+            )
+            span["status"] = response.status_code
+        note_wp_response(response)
+        if response.status_code != 200:
+            return None
+        for item in response.json():
+            filesize = (item.get("media_details") or {}).get("filesize")
+            if stem in (item.get("source_url") or "") and not (size and filesize and int(filesize) != size):
+                return item["id"], item.get("source_url")
+    except (requests.RequestException, ValueError) as e:
+        print(f"⚠️ 미디어 검색 실패: {e}")
+    return None
+
+def media_filename(prefix, body, extension):
+    """내용 해시 기반 파일명 (같은 내용은 같은 이름 - 재시도 후 검색에 사용), 스트리밍 본문은 시각 기반"""
+    if isinstance(body, (bytes, bytearray)):
+        return f"{prefix}_{hashlib.sha256(body).hexdigest()[:16]}.{extension}"
+    return f"{prefix}_{int(time.time())}.{extension}"
+
+def upload_media(body, filename, content_type, max_retries=2):
+    """WordPress 미디어 업로드 - 성공 시 media id, 실패 시 None
+
+    body 는 bytes 또는 파일 객체/제너레이터 (스트리밍 본문은 재전송이 불가능해 1회만 시도)
+    bytes 본문은 내용 해시로 색인을 먼저 확인해 같은 첨부파일이 있으면 업로드 없이 재사용하고,
+    응답 없이 끊긴 업로드를 재시도하기 전에는 파일명 검색으로 이미 올라갔는지 확인합니다.
+    """
+    media_url = wp_media_url()
+    wp_headers = {
+        "Content-Disposition": f"attachment; filename={filename}",
+        "Content-Type": content_type
+    }
+    digest = None
+    if isinstance(body, (bytes, bytearray)):
+        digest = hashlib.sha256(body).hexdigest()
+        media_id = find_reusable_media(media_url, digest, len(body))
+        if media_id:
+            print(f"🧾 같은 이미지가 이미 있음 - 업로드 생략 (Media ID: {media_id})\n")
+            return media_id
+    else:
+        max_retries = 1
+    
+    interrupted = False
+    for attempt in range(max_retries):
+        if interrupted:
+            found = find_uploaded_media(media_url, filename, len(body))
+            if found:
+                print(f"🧾 앞선 업로드가 완료되어 있었음 - 재업로드 생략 (Media ID: {found[0]})\n")
+                remember_media(media_url, digest, found[0], found[1], len(body))
+                return found[0]
+        interrupted = False
+        try:
+            print(f"📤 WordPress 업로드 시작...")
+            throttle(wp_provider())
+            with wp_slots(), trace_span("wp.upload_media", content_type=content_type, retries=attempt) as span:
+                wp_response = get_wp_session().post(
+                    media_url, 
+                    headers=wp_headers, 
+                    data=body, 
+                    timeout=call_timeout(45)
+                )
+                span["status"] = wp_response.status_code
+                span["bytes"] = len(body) if isinstance(body, (bytes, bytearray)) else None
+            note_wp_response(wp_response)
+            
+            print(f"📊 WordPress 응답 코드: {wp_response.status_code}")
+            
+            if wp_response.status_code == 201:
+                media_id = wp_response.json()['id']
+                media_link = wp_response.json().get('source_url', '링크 없음')
+                remember_media(media_url, digest, media_id, media_link, len(body) if digest else None)
+                print(f"🎉 업로드 성공!")
+                print(f"🆔 Media ID: {media_id}")
+                print(f"🔗 이미지 URL: {media_link}\n")
+                return media_id
+            
+            print(f"⚠️ WordPress 업로드 실패!")
+            print(f"📄 응답 내용: {wp_response.text[:300]}")
+            
+            if wp_response.status_code == 401:
+                print("❌ 인증 실패! WP_USER와 WP_APP_PASS를 확인하세요.")
+                return None
+            elif wp_response.status_code == 403:
+                print("❌ 권한 부족! 앱 비밀번호에 미디어 업로드 권한이 있는지 확인하세요.")
+                return None
+        except requests.RequestException as e:
+            print(f"❌ 업로드 네트워크 에러: {e}")
+            interrupted = True
+    
+    return None
+
+def _encode_thumbnail(image, fmt, max_bytes):
+    """품질을 낮춰가며 max_bytes 이하가 되는 첫 인코딩 (끝까지 넘으면 최저 품질 결과)"""
+    pil_format, _, _, options = THUMBNAIL_FORMATS[fmt]
+    for quality in THUMBNAIL_QUALITIES:
+        buffer = io.BytesIO()
+        image.save(buffer, format=pil_format, quality=quality, **options)
+        if buffer.tell() <= max_bytes:
+            break
+    return buffer.getvalue(), quality
+
+def transcode_thumbnail(data, max_bytes=None, fmt=None):
+    """썸네일을 1200×630 으로 가운데 맞춰 자르고 WebP(또는 JPEG)로 다시 인코딩
+
+    반환: (bytes, MIME, 확장자) - Pillow 가 없거나 변환이 이득이 없으면 None (원본 업로드)
+    """
+    if load_pillow() is None:
+        return None
+    Image, ImageOps = load_pillow()
+    max_bytes = max_bytes or THUMBNAIL_MAX_BYTES
+    fmt = fmt or THUMBNAIL_FORMAT
+    if fmt not in THUMBNAIL_FORMATS:
+        raise ValueError(f"알 수 없는 썸네일 형식: {fmt} (가능: {', '.join(THUMBNAIL_FORMATS)})")
+    
+    with trace_span("image.transcode", format=fmt, bytes_in=len(data)) as span:
+        try:
+            with Image.open(io.BytesIO(data)) as source:
+                original_size = source.size
+                source = ImageOps.exif_transpose(source)
+                resample = getattr(Image, "Resampling", Image).LANCZOS
+                image = ImageOps.fit(source.convert("RGB"), THUMBNAIL_SIZE, method=resample)
+        except Exception as e:
+            print(f"⚠️ 썸네일 디코딩 실패, 원본 업로드: {e}")
+            return None
         
-        credentials = f"{WP_USER}:{WP_APP_PASS}"
-        token = base64.b64encode(credentials.encode()).decode()
+        try:
+            encoded, quality = _encode_thumbnail(image, fmt, max_bytes)
+        except (OSError, KeyError) as e:
+            if fmt == "jpeg":
+                raise
+            # WebP 인코더 없이 빌드된 Pillow - JPEG 로 대체
+            print(f"⚠️ {fmt} 인코딩 불가, JPEG 로 대체: {e}")
+            fmt = "jpeg"
+            encoded, quality = _encode_thumbnail(image, fmt, max_bytes)
         
-        wp_headers = {
-            "Authorization": f"Basic {token}",
-            "Content-Disposition": f"attachment; filename=fluxy_{int(time.time())}.svg",
-            "Content-Type": "image/svg+xml"
-        }
+        if original_size == THUMBNAIL_SIZE and len(encoded) >= len(data) and len(data) <= max_bytes:
+            print("🗜️ 원본이 이미 규격/용량 이내 - 변환 생략")
+            return None
         
-        media_url = WP_URL.replace("/posts", "/media")
-        wp_response = requests.post(
-            media_url,
-            headers=wp_headers,
-            data=svg_bytes,
-            verify=False,
-            timeout=30
-        )
+        span["bytes"] = len(encoded)
+        span["quality"] = quality
+        if len(encoded) > max_bytes:
+            print(f"⚠️ 최저 품질로도 용량 예산({max_bytes:,} bytes)을 넘어 그대로 사용합니다.")
+        _, content_type, extension, _ = THUMBNAIL_FORMATS[fmt]
+        print(f"🗜️ 썸네일 변환: {original_size[0]}×{original_size[1]} {len(data):,} bytes → "
+              f"{THUMBNAIL_SIZE[0]}×{THUMBNAIL_SIZE[1]} {fmt} {len(encoded):,} bytes (품질 {quality})")
+        return encoded, content_type, extension
+
+def upload_downloaded_image(download, max_retries=2):
+    """검증된 이미지를 업로드 (변환 가능하면 1200×630 WebP/JPEG, 아니면 실제 형식 그대로)"""
+    with trace_span("image.upload", service=download.service, streaming=not download.complete) as span:
+        try:
+            if THUMBNAIL_TRANSCODE and load_pillow() is not None and download.buffer_all():
+                data = download.read()
+                content_type, extension = download.content_type, download.extension
+                transcoded = transcode_thumbnail(data)
+                if transcoded:
+                    data, content_type, extension = transcoded
+                return upload_media(data, media_filename("fluxy", data, extension), content_type, max_retries)
+            if download.complete:
+                # 이미 전부 받아둔 경우 bytes 로 업로드 (재시도 가능)
+                data = download.read()
+                return upload_media(data, media_filename("fluxy", data, download.extension),
+                                    download.content_type, max_retries)
+            
+            body = download.upload_body()
+            media_id = upload_media(body, media_filename("fluxy", body, download.extension),
+                                    download.content_type, max_retries)
+            # 스트리밍 업로드는 다 보낸 뒤에야 해시를 알 수 있어 업로드 후 색인에 기록
+            if media_id:
+                remember_media(wp_media_url(), download.content_hash, media_id, size=download.received)
+            return media_id
+        finally:
+            download.close()
+            span["bytes"] = download.received
+
+def fetch_image_downloads(image_prompt, max_retries=2, hedge_delay=None):
+    """이미지 서비스들을 차례로(또는 헤지로) 시도해 검증된 다운로드를 하나씩 내줌
+
+    hedge_delay: 헤지 요청 지연(초), None 이면 IMAGE_HEDGE_DELAY, 0 이면 순차 시도
+    마감 시간이 DEADLINE_IMAGE_RESERVE 보다 적게 남으면 (남은) 서비스를 건너뛰어 SVG 로 넘어갑니다.
+    """
+    # 시도할 서비스 목록
+    services = ["replicate", "pollinations-simple", "flux-basic", "default"]
+    hedge_delay = IMAGE_HEDGE_DELAY if hedge_delay is None else hedge_delay
+    
+    if deadline_low(DEADLINE_IMAGE_RESERVE):
+        note_degraded("이미지 서비스 생략 → SVG 썸네일")
+        return
+    if hedge_delay > 0:
+        winner = fetch_image_hedged(image_prompt, services, hedge_delay, max_retries)
+        downloads = [winner] if winner else []
+    else:
+        downloads = (fetch_image_from_service(image_prompt, service, max_retries) for service in services)
+    
+    for download in downloads:
+        if download is not None:
+            yield download
+        elif deadline_low(DEADLINE_IMAGE_RESERVE):
+            note_degraded("남은 이미지 서비스 생략 → SVG 썸네일")
+            return
+
+def upload_fallback_svg(title):
+    """SVG 대체 이미지 업로드 (현재 사이트 브랜드) → Media ID 또는 None"""
+    print("🎨 모든 이미지 서비스 실패 - SVG 대체 이미지 생성 시도...")
+    try:
+        svg_content = create_fallback_image_html(title)
+        svg_bytes = svg_content.encode('utf-8')
         
-        if wp_response.status_code == 201:
-            media_id = wp_response.json()['id']
-            print(f"✅ SVG 이미지 업로드 성공! Media ID: {media_id}\n")
+        # 같은 제목의 SVG 는 내용이 같으므로 이미 올린 첨부파일을 재사용
+        media_id = upload_media(svg_bytes, media_filename("fluxy", svg_bytes, "svg"), "image/svg+xml", max_retries=1)
+        if media_id:
+            print(f"✅ SVG 이미지 준비 완료! Media ID: {media_id}\n")
             return media_id
-        else:
-            print(f"⚠️ SVG 업로드도 실패: {wp_response.status_code}")
+        print("⚠️ SVG 업로드도 실패")
     except Exception as e:
         print(f"❌ SVG 폴백 실패: {e}")
     
     print("💡 이미지 없이 글만 발행합니다.\n")
     return None
 
-def auto_posting():
-    """메인 자동 포스팅 프로세스"""
-    print("=" * 70)
-    print("🚀 플럭시 블로그 봇 V5.0 - 프리미엄 에디션")
-    print("   [리서치 → 아웃라인 → 본문 → 품질검증 → 발행]")
-    print("=" * 70)
-    print()
+def upload_image_to_wp(image_prompt, title, max_retries=2, hedge_delay=None):
+    """🆕 개선: 이미지 업로드 (다중 서비스 + SVG 폴백)
+
+    hedge_delay: 헤지 요청 지연(초), None 이면 IMAGE_HEDGE_DELAY, 0 이면 순차 시도
+    """
+    print(f"🖼️ 이미지 생성 및 업로드 시작...")
+    print(f"📌 프롬프트: {image_prompt[:100]}...\n")
     
+    for download in fetch_image_downloads(image_prompt, max_retries, hedge_delay):
+        media_id = upload_downloaded_image(download, max_retries)
+        if media_id:
+            return media_id
+    
+    # 모든 시도 실패 시 SVG 폴백
+    return upload_fallback_svg(title)
+
+def prepare_thumbnail(image_prompt, max_retries=2, hedge_delay=None):
+    """🖼️ 멀티사이트 발행용: 썸네일을 한 번만 받아 변환해 둠
+
+    반환: {"data": base64, "content_type", "extension"} (체크포인트에 JSON 으로 저장 가능) 또는 None
+    """
+    print(f"🖼️ 공용 썸네일 준비 시작...")
+    print(f"📌 프롬프트: {image_prompt[:100]}...\n")
+    
+    for download in fetch_image_downloads(image_prompt, max_retries, hedge_delay):
+        try:
+            if not download.buffer_all():
+                continue
+            data = download.read()
+        finally:
+            download.close()
+        content_type, extension = download.content_type, download.extension
+        if THUMBNAIL_TRANSCODE:
+            transcoded = transcode_thumbnail(data)
+            if transcoded:
+                data, content_type, extension = transcoded
+        print(f"✅ 공용 썸네일 준비 완료 ({len(data) // 1024}KB, {content_type})\n")
+        return {"data": base64.b64encode(data).decode("ascii"),
+                "content_type": content_type, "extension": extension}
+    return None
+
+def upload_prepared_thumbnail(prepared, title, max_retries=2):
+    """prepare_thumbnail 결과를 현재 사이트에 업로드 (없거나 실패하면 사이트 브랜드 SVG)"""
+    if prepared:
+        data = base64.b64decode(prepared["data"])
+        media_id = upload_media(data, media_filename("fluxy", data, prepared["extension"]),
+                                prepared["content_type"], max_retries)
+        if media_id:
+            return media_id
+    return upload_fallback_svg(title)
+
+# 🧷 실행 체크포인트 저장소 (스테이지 결과를 남겨 중단된 실행을 재개)
+def _run_state_db():
+    conn = open_state_db("runs.sqlite3")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS runs (
+            run_id TEXT PRIMARY KEY,
+            status TEXT,
+            created REAL,
+            updated REAL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS run_stages (
+            run_id TEXT,
+            stage TEXT,
+            value TEXT,
+            saved REAL,
+            PRIMARY KEY (run_id, stage)
+        )
+    """)
+    return conn
+
+def new_run_id():
+    """실행 ID 생성 (예: 20260214-090000-a1b2)"""
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{os.urandom(2).hex()}"
+
+def mark_run_status(run_id, status):
+    """실행 상태 기록 (running / done / failed)"""
+    conn = _run_state_db()
+    try:
+        now = time.time()
+        conn.execute(
+            "INSERT INTO runs VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(run_id) DO UPDATE SET status = excluded.status, updated = excluded.updated",
+            (run_id, status, now, now)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+def save_stage_output(run_id, stage, value):
+    """스테이지 결과 체크포인트 저장"""
+    conn = _run_state_db()
     try:
+        conn.execute(
+            "INSERT OR REPLACE INTO run_stages VALUES (?, ?, ?, ?)",
+            (run_id, stage, json.dumps(value, ensure_ascii=False), time.time())
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+def load_run_state(run_id):
+    """저장된 스테이지 결과 dict (없는 실행이면 예외)"""
+    conn = _run_state_db()
+    try:
+        if conn.execute("SELECT 1 FROM runs WHERE run_id = ?", (run_id,)).fetchone() is None:
+            raise Exception(f"❌ 실행 기록을 찾을 수 없습니다: {run_id}")
+        rows = conn.execute("SELECT stage, value FROM run_stages WHERE run_id = ?", (run_id,)).fetchall()
+        return {stage: json.loads(value) for stage, value in rows}
+    finally:
+        conn.close()
+
+def run_stage_graph(stages, results=None, max_workers=None, on_stage_done=None):
+    """🧩 의존성이 선언된 스테이지들을 스레드 풀에서 동시 실행
+
+    stages: {이름: (의존 스테이지 목록, 함수)}
+    함수는 지금까지의 결과 dict를 받아 해당 스테이지 결과를 반환합니다.
+    의존 스테이지가 모두 끝난 스테이지부터 바로 시작하므로
+    서로 독립인 브랜치(예: 본문 작성 vs 썸네일)는 겹쳐서 실행됩니다.
+    results 에 이미 들어있는 스테이지는 건너뜁니다 (재개 모드).
+    on_stage_done(이름, 결과): 스테이지 완료 직후 호출 (체크포인트 저장용)
+    """
+    results = dict(results or {})
+    
+    # 선언 검증: 알 수 없는 의존성 / 순환 의존성
+    for name, (deps, _) in stages.items():
+        for dep in deps:
+            if dep not in stages and dep not in results:
+                raise ValueError(f"스테이지 '{name}'의 의존성 '{dep}'이(가) 정의되지 않았습니다.")
+    
+    pending = {name: spec for name, spec in stages.items() if name not in results}
+    running = {}
+    
+    def run_one(name, fn):
+        with trace_span(f"stage.{name}"):
+            return fn(results)
+    
+    with ThreadPoolExecutor(max_workers=max_workers or STAGE_WORKERS) as executor:
+        while pending or running:
+            ready = [name for name, (deps, _) in pending.items() if all(dep in results for dep in deps)]
+            for name in ready:
+                _, fn = pending.pop(name)
+                print(f"▶️ 스테이지 시작: {name}")
+                running[executor.submit(contextvars.copy_context().run, run_one, name, fn)] = name
+            
+            if not running:
+                raise ValueError(f"순환 의존성으로 실행할 수 없는 스테이지: {', '.join(pending)}")
+            
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception:
+                    for other in running:
+                        other.cancel()
+                    print(f"❌ 스테이지 실패: {name}")
+                    raise
+                print(f"⏹️ 스테이지 완료: {name}")
+                if on_stage_done:
+                    on_stage_done(name, results[name])
+    
+    return results
+
+POST_STATUS_LABELS = {"publish": "포스팅 성공!", "draft": "초안 저장 완료!", "future": "예약 발행 등록 완료!"}
+
+# 🧺 WordPress 배치 요청 (/batch/v1): 태그 여러 개 조회/생성을 한 번의 왕복으로
+# (첨부파일 경로는 WordPress 가 배치를 허용하지 않음 - rest_batch_not_allowed)
+WP_BATCH_ENABLED = os.environ.get("WP_BATCH", "1") != "0"
+WP_BATCH_MAX_REQUESTS = 25  # WordPress 기본 한도
+WP_BATCH_ATTEMPTS = int(os.environ.get("WP_BATCH_ATTEMPTS", "2"))  # 429/5xx 응답 시 배치 재시도 횟수 포함
+WP_MAX_TAGS = int(os.environ.get("WP_MAX_TAGS", "5"))
+# 미지원으로 기록된 사이트도 이 시간이 지나면 배치를 다시 시도 (WordPress 업그레이드/플러그인 변경 반영)
+WP_BATCH_RECHECK_HOURS = float(os.environ.get("WP_BATCH_RECHECK_HOURS", "24"))
+_wp_batch_support = None  # REST 루트 → {"supported", "checked"} (STATE_DIR/wp_batch.json, 실행 간 유지)
+_wp_batch_lock = threading.Lock()
+_wp_term_ids = {}  # (사이트, 분류, 이름) → term id
+
+def wp_rest_root():
+    """REST 루트 (…/wp-json) - posts 엔드포인트에서 유도"""
+    return re.sub(r"/wp/v2/posts/?$", "", wp_posts_url())
+
+def wp_route(url):
+    """엔드포인트 URL → 배치 요청용 경로 (/wp/v2/...)"""
+    path = urllib.parse.urlparse(url).path
+    return path.split("/wp-json", 1)[1] if "/wp-json" in path else path
+
+def _wp_batch_path():
+    return os.path.join(STATE_DIR, "wp_batch.json")
+
+def wp_batch_supported():
+    """현재 사이트의 배치 API 지원 여부 (True / False / None=아직 모름)
+
+    매 cron 실행이 미지원 사이트에 실패할 배치 요청을 한 번씩 보내지 않도록 결과를 디스크에 둡니다.
+    """
+    global _wp_batch_support
+    with _wp_batch_lock:
+        if _wp_batch_support is None:
+            try:
+                with open(_wp_batch_path(), encoding="utf-8") as f:
+                    _wp_batch_support = json.load(f)
+            except (OSError, ValueError):
+                _wp_batch_support = {}
+        entry = _wp_batch_support.get(wp_rest_root())
+    if entry is None or (not entry["supported"] and time.time() - entry["checked"] > WP_BATCH_RECHECK_HOURS * 3600):
+        return None
+    return entry["supported"]
+
+def remember_wp_batch_support(supported):
+    """배치 API 지원 여부 기록 (바뀌었을 때만 파일 갱신)"""
+    root = wp_rest_root()
+    with _wp_batch_lock:
+        entry = _wp_batch_support.setdefault(root, {"supported": None, "checked": 0})
+        if supported and entry["supported"]:
+            return
+        entry.update(supported=supported, checked=time.time())
+        try:
+            os.makedirs(STATE_DIR, exist_ok=True)
+            tmp_path = _wp_batch_path() + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(_wp_batch_support, f)
+            os.replace(tmp_path, _wp_batch_path())
+        except OSError as e:
+            print(f"⚠️ 배치 지원 여부 저장 실패: {e}")
+
+def wp_batch(writes):
+    """여러 POST 쓰기를 /batch/v1 한 번으로 전송 → [{"status", "body"}] (사이트가 배치를 지원하지 않으면 None)
+
+    writes: [(엔드포인트 URL, JSON 본문)] - 최대 WP_BATCH_MAX_REQUESTS 개
+    None 은 "지원하지 않음" 일 때만 돌려줍니다. 429/5xx 는 배치를 다시 보내고, 그래도 실패하면
+    requests.HTTPError - 일부 항목이 이미 처리됐을 수 있어 개별 요청으로 다시 보내면 중복이 생길 수 있음
+    """
+    if not (WP_BATCH_ENABLED and writes) or wp_batch_supported() is False:
+        return None
+    if len(writes) > WP_BATCH_MAX_REQUESTS:
+        raise ValueError(f"배치 요청은 최대 {WP_BATCH_MAX_REQUESTS}개까지 가능합니다 ({len(writes)}개)")
+    
+    payload = {"validation": "normal",
+               "requests": [{"method": "POST", "path": wp_route(url), "body": body} for url, body in writes]}
+    for attempt in range(1, WP_BATCH_ATTEMPTS + 1):
+        # note_wp_response 가 Retry-After 를 기록하므로 재시도 전 throttle 이 그만큼 기다림
+        throttle(wp_provider(), grace=DEADLINE_PUBLISH_GRACE)
+        with wp_slots(), trace_span("wp.batch", requests=len(writes), attempt=attempt) as span:
+            response = get_wp_session().post(f"{wp_rest_root()}/batch/v1", json=payload,
+                                             timeout=call_timeout(60, grace=DEADLINE_PUBLISH_GRACE))
+            span["status"] = response.status_code
+            span["bytes"] = len(response.request.body or b"")
+        note_wp_response(response)
+        retryable = response.status_code == 429 or (response.status_code >= 500 and response.status_code != 501)
+        if not retryable or attempt == WP_BATCH_ATTEMPTS:
+            break
+        print(f"🔄 배치 요청 재시도 ({response.status_code}, {attempt}/{WP_BATCH_ATTEMPTS})")
+    
+    try:
+        data = response.json()
+    except ValueError:
+        data = None
+    if response.status_code in (404, 405, 501) or (response.ok and not isinstance(data, dict)) \
+            or (response.ok and "responses" not in data):
+        # WordPress 5.6 미만이거나 보안 플러그인이 막은 경우
+        print("ℹ️ 이 사이트는 배치 API 를 지원하지 않아 개별 요청으로 보냅니다.")
+        remember_wp_batch_support(False)
+        return None
+    if not response.ok:
+        print(f"⚠️ 배치 요청 실패 ({response.status_code}): {response.text[:300]}")
+        response.raise_for_status()
+    
+    remember_wp_batch_support(True)
+    return [{"status": item.get("status"), "body": item.get("body")} for item in data["responses"]]
+
+def wp_write(url, body):
+    """POST 쓰기 1건 → {"status", "body"}"""
+    throttle(wp_provider(), grace=DEADLINE_PUBLISH_GRACE)
+    with wp_slots(), trace_span("wp.write", route=wp_route(url)) as span:
+        response = get_wp_session().post(url, json=body, timeout=call_timeout(30, grace=DEADLINE_PUBLISH_GRACE))
+        span["status"] = response.status_code
+    note_wp_response(response)
+    try:
+        data = response.json()
+    except ValueError:
+        data = {"message": response.text[:300]}
+    return {"status": response.status_code, "body": data}
+
+def wp_write_many(writes):
+    """여러 POST 쓰기: 배치 한 번 (미지원 사이트는 순서대로 개별 요청) → [{"status", "body"}]
+
+    배치로 보낼 수 없는 경로(rest_batch_not_allowed - 예: 첨부파일)로 거절된 항목은 개별 요청으로 다시 보냅니다.
+    """
+    results = wp_batch(writes) if len(writes) > 1 else None
+    if results is None:
+        return [wp_write(url, body) for url, body in writes]
+    return [wp_write(url, body) if isinstance(result["body"], dict)
+            and result["body"].get("code") == "rest_batch_not_allowed" else result
+            for (url, body), result in zip(writes, results)]
+
+def post_tags(topic, title):
+    """주제/제목에 들어간 리서치 클러스터 키워드 → 태그 이름 (최대 WP_MAX_TAGS 개)"""
+    text = normalize_topic(f"{topic or ''} {title or ''}")
+    tags = []
+    for keywords, _ in RESEARCH_CLUSTERS.values():
+        for keyword in keywords:
+            name = keyword.upper() if keyword.isascii() else keyword
+            if keyword in text and name not in tags:
+                tags.append(name)
+    return tags[:WP_MAX_TAGS]
+
+def ensure_terms(names, taxonomy="tags"):
+    """태그 이름 → term id 목록 (캐시에 없는 이름만 한 번의 배치로 조회/생성)
+
+    이미 있는 태그는 생성 요청이 term_exists(400) 와 함께 기존 id 를 돌려주므로
+    조회와 생성을 같은 요청으로 처리합니다. 실패한 태그는 빼고 진행합니다.
+    """
+    site = current_site()["name"]
+    missing = [name for name in names if (site, taxonomy, name) not in _wp_term_ids]
+    if missing:
+        url = f"{wp_rest_root()}/wp/v2/{taxonomy}"
+        try:
+            results = wp_write_many([(url, {"name": name}) for name in missing])
+        except requests.RequestException as e:
+            print(f"⚠️ 태그 준비 실패 - 태그 없이 진행: {e}")
+            results = []
+        for name, result in zip(missing, results):
+            body = result["body"] if isinstance(result["body"], dict) else {}
+            term_id = body.get("id") if result["status"] == 201 else (body.get("data") or {}).get("term_id")
+            if term_id:
+                _wp_term_ids[(site, taxonomy, name)] = term_id
+            else:
+                print(f"⚠️ 태그 준비 실패: {name} ({result['status']})")
+    return [_wp_term_ids[(site, taxonomy, name)] for name in names if (site, taxonomy, name) in _wp_term_ids]
+
+def media_metadata(title, image_prompt):
+    """대표 이미지 alt/캡션: alt 는 이미지 프롬프트 설명(오버레이 문구 + 장면), 캡션은 글 제목"""
+    if not image_prompt:
+        return None
+    overlay = re.match(r"\s*Korean text\s*([^,]*),\s*", image_prompt)
+    scene = image_prompt[overlay.end():] if overlay else image_prompt
+    scene = re.sub(r",?\s*(high quality|professional design|4K)\b", "", scene, flags=re.I).strip(" ,")
+    words = overlay.group(1).strip(" '\"") if overlay else ""
+    alt_text = f"{words} - {scene}" if words else scene
+    return {"alt_text": alt_text[:200], "caption": title}
+
+def post_extras(r):
+    """스테이지 결과 → publish_post 의 태그/대표 이미지 메타 인자"""
+    return {"tags": post_tags(r.get("topic"), r["title"]),
+            "media_meta": media_metadata(r["title"], r.get("image_prompt"))}
+
+def publish_post(title, content, featured_media_id=None, status="publish", date_gmt=None, tags=None, media_meta=None):
+    """워드프레스 글 발행 (성공 시 응답 JSON, 실패 시 None)
+
+    status: "publish"(즉시 발행) / "draft"(초안) / "future"(date_gmt 시각에 예약 발행)
+    date_gmt: 예약 시각 epoch 초 (status="future" 일 때 필수)
+    tags: 태그 이름 목록 (없는 태그는 생성)
+    media_meta: 대표 이미지에 저장할 {"alt_text", "caption"} - 글이 만들어진 뒤 미디어에 따로 저장
+    """
+    print("📤 워드프레스 발행 중...")
+    post_data = {
+        "title": title,
+        "content": content,
+        "status": status,
+        "categories": current_site()["categories"]
+    }
+    
+    if featured_media_id:
+        post_data["featured_media"] = featured_media_id
+    if date_gmt:
+        post_data["date_gmt"] = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(date_gmt))
+    if tags:
+        term_ids = ensure_terms(tags)
+        if term_ids:
+            post_data["tags"] = term_ids
+    
+    throttle(wp_provider(), grace=DEADLINE_PUBLISH_GRACE)
+    with wp_slots(), trace_span("wp.publish", status=status) as span:
+        response = get_wp_session().post(wp_posts_url(), json=post_data,
+                                         timeout=call_timeout(60, grace=DEADLINE_PUBLISH_GRACE))
+        span["status"] = response.status_code
+        span["bytes"] = len(response.request.body or b"")
+    note_wp_response(response)
+    try:
+        body = response.json()
+    except ValueError:
+        body = response.text
+    post = {"status": response.status_code, "body": body}
+    
+    if post["status"] == 201 and featured_media_id and media_meta:
+        # 첨부파일 컨트롤러는 배치 요청을 허용하지 않으므로(rest_batch_not_allowed) 글 생성 후 따로 저장
+        try:
+            meta = wp_write(f"{wp_media_url()}/{featured_media_id}", media_meta)
+            if meta["status"] != 200:
+                print(f"⚠️ 대표 이미지 alt/캡션 저장 실패: {meta['status']}")
+        except requests.RequestException as e:
+            print(f"⚠️ 대표 이미지 alt/캡션 저장 실패: {e}")
+    
+    if post["status"] == 201:
+        post_id = post["body"]['id']
+        post_url = post["body"].get('link', 'URL 없음')
+        print()
+        print("=" * 70)
+        print(f"🎉 {POST_STATUS_LABELS.get(status, '저장 완료!')}")
+        print(f"📝 제목: {title}")
+        print(f"🆔 ID: {post_id}")
+        print(f"🔗 URL: {post_url}")
+        print("=" * 70)
+        return post["body"]
+    else:
+        print(f"❌ 발행 실패: {post['status']}")
+        print(f"상세: {post['body']}")
+        return None
+
+def update_post_status(post_id, status="publish"):
+    """이미 만들어 둔 글(초안)의 상태만 변경 - 본문을 다시 보내지 않아 빠름 (성공 시 응답 JSON)"""
+    throttle(wp_provider(), grace=DEADLINE_PUBLISH_GRACE)
+    with wp_slots(), trace_span("wp.update_status", post_id=post_id, status=status) as span:
+        response = get_wp_session().post(f"{wp_posts_url()}/{post_id}", json={"status": status},
+                                         timeout=call_timeout(30, grace=DEADLINE_PUBLISH_GRACE))
+        span["status"] = response.status_code
+    note_wp_response(response)
+    
+    if response.status_code == 200:
+        print(f"🎉 글 상태 변경: ID {post_id} → {status} ({response.json().get('link', 'URL 없음')})")
+        return response.json()
+    print(f"❌ 글 상태 변경 실패 (ID {post_id}): {response.status_code} {response.text[:300]}")
+    return None
+
+def build_posting_stages(topic_picker=None, mode=None, publisher=None):
+    """auto_posting 스테이지 그래프 정의
+
+    썸네일은 주제와 제목(아웃라인)만 있으면 되므로
+    이미지 프롬프트/업로드 브랜치가 본문 작성·품질 검증과 동시에 진행됩니다.
+    topic_picker: 주제 선정 함수 교체용 (배치 모드의 중복 방지 선정)
+    mode: "multi"(아웃라인/제목/이미지 프롬프트 각각 호출) 또는
+          "fused"(구조화 출력 한 번으로 통합, 실패 시 multi 방식으로 대체)
+    publisher: 마지막 발행 스테이지 교체용 - 결과 dict 를 받아 반환값을 "publish" 결과로 기록
+               (대기열 적재 모드는 즉시 발행 대신 enqueue_post 사용)
+    """
+    topic_picker = topic_picker or get_search_friendly_topic
+    mode = mode or PIPELINE_MODE
+    
+    def pick_title(r):
+        title = extract_title_from_outline(r["outline"]) or r["topic"]
+        print(f"📌 최종 제목: {title}\n")
+        return title
+    
+    def stages_image_prompt(r):
+        return get_dynamic_image_prompt(r["topic"], f"{r['title']}\n{r['outline'][:500]}")
+    
+    def publish(r):
+        # 발행 실패는 완료로 기록하지 않아야 재개 시 다시 시도됨
+        result = publish_post(r["title"], r["final_content"], r["featured_media"], status=publish_status(),
+                              **post_extras(r))
+        if result is None:
+            raise Exception("❌ 워드프레스 발행 실패")
+        return result
+    
+    stages = {
         # STEP 1: 주제 선정
-        recent_titles = get_recent_posts()
-        topic = get_search_friendly_topic(recent_titles)
-        print(f"🎯 최종 주제: {topic}\n")
-        time.sleep(2)
-        
+        "recent_titles": ((), lambda r: get_recent_posts()),
+        "topic": (("recent_titles",), lambda r: topic_picker(r["recent_titles"])),
         # STEP 2: 리서치
-        research_data = research_topic(topic)
-        time.sleep(2)
-        
-        # STEP 3: 아웃라인 생성
-        outline = create_outline(topic, research_data)
-        time.sleep(2)
-        
-        # STEP 4: 본문 작성
-        content = write_full_content(topic, outline, research_data)
-        time.sleep(2)
-        
-        # STEP 5: 품질 검증 및 개선
-        final_content = quality_check_and_improve(topic, content)
-        
-        # 제목 추출
-        title = extract_title_from_outline(outline)
-        if not title:
-            title = topic
-        
-        print(f"📌 최종 제목: {title}\n")
-        
-        # STEP 6: 이미지 생성 및 업로드
-        content_summary = final_content[:500] if len(final_content) > 500 else final_content
-        image_prompt = get_dynamic_image_prompt(topic, content_summary)
-        
-        # 개선된 업로드 함수 호출 (URL이 아닌 프롬프트 전달)
-        featured_media_id = upload_image_to_wp(image_prompt, title)
-        time.sleep(1)
-        
+        "research": (("topic",), lambda r: research_topic(r["topic"])),
+        # STEP 3: 아웃라인 생성 + 제목 추출
+        "outline": (("topic", "research"), lambda r: create_outline(r["topic"], r["research"])),
+        "title": (("topic", "outline"), pick_title),
+        # STEP 4~5: 본문 작성 → 품질 검증 및 개선
+        "content": (("topic", "outline", "research"),
+                    lambda r: write_full_content(r["topic"], r["outline"], r["research"])),
+        "final_content": (("topic", "content"), lambda r: quality_check_and_improve(r["topic"], r["content"])),
+        # STEP 6: 이미지 생성 및 업로드 (본문 브랜치와 병렬)
+        "image_prompt": (("topic", "title", "outline"), stages_image_prompt),
+        "featured_media": (("image_prompt", "title"), lambda r: upload_image_to_wp(r["image_prompt"], r["title"])),
         # STEP 7: 워드프레스 발행
-        print("📤 워드프레스 발행 중...")
-        credentials = f"{WP_USER}:{WP_APP_PASS}"
-        token = base64.b64encode(credentials.encode()).decode()
-        headers = {
-            "Authorization": f"Basic {token}",
-            "Content-Type": "application/json"
-        }
-        
-        post_data = {
-            "title": title,
-            "content": final_content,
-            "status": "publish",
-            "categories": [1]
-        }
+        "publish": (("title", "final_content", "featured_media"), publisher or publish),
+    }
+    
+    if mode == "fused":
+        # STEP 3 통합: 구조화 출력 한 번으로 아웃라인/제목/이미지 프롬프트를 함께 생성
+        def plan_or(r, key, fallback):
+            return r["plan"][key] if r["plan"] else fallback(r)
         
-        if featured_media_id:
-            post_data["featured_media"] = featured_media_id
+        stages.update({
+            "plan": (("topic", "research"), lambda r: create_post_plan(r["topic"], r["research"])),
+            "outline": (("topic", "research", "plan"),
+                        lambda r: plan_or(r, "outline", lambda r: create_outline(r["topic"], r["research"]))),
+            "title": (("topic", "outline", "plan"), lambda r: plan_or(r, "title", pick_title)),
+            "image_prompt": (("topic", "title", "outline", "plan"),
+                             lambda r: plan_or(r, "image_prompt", stages_image_prompt)),
+        })
+    
+    return stages
+
+def collect_recent_titles(sites):
+    """여러 사이트의 최근 글 제목을 합침 (공용 주제가 어느 사이트와도 겹치지 않게)"""
+    titles = []
+    for site in sites:
+        with use_site(site):
+            titles.extend(title for title in get_recent_posts() if title not in titles)
+    return titles
+
+SITE_STAGES = ("content", "final_content", "featured_media", "publish")
+
+def build_fanout_stages(sites, topic_picker=None, mode=None, publisher=None):
+    """🌐 멀티사이트 스테이지 그래프: 리서치는 한 번, 본문/썸네일 업로드/발행은 사이트별
+
+    주제·리서치·아웃라인·제목·썸네일 이미지는 모든 사이트가 공유하고
+    본문(페르소나 반영)·품질 검증·미디어 업로드·발행은 "<사이트>:<스테이지>" 로 사이트마다 실행됩니다.
+    한 사이트가 실패해도 {"site_failed": 사유} 로 기록하고 나머지 사이트는 계속 진행하며,
+    모든 사이트가 실패했을 때만 "publish" 스테이지가 예외를 냅니다.
+    """
+    stages = {name: spec for name, spec in build_posting_stages(topic_picker, mode).items()
+              if name not in SITE_STAGES}
+    stages["recent_titles"] = ((), lambda r: collect_recent_titles(sites))
+    # 썸네일은 한 번만 받아 변환해 두고 사이트별로 업로드
+    stages["thumbnail"] = (("image_prompt",), lambda r: prepare_thumbnail(r["image_prompt"]))
+    
+    def site_stage(site, deps, fn):
+        name = site["name"]
+        own_deps = [f"{name}:{dep}" for dep in deps if dep in SITE_STAGES]
+        shared_deps = [dep for dep in deps if dep not in SITE_STAGES]
         
-        response = requests.post(WP_URL, headers=headers, json=post_data, verify=False)
+        def run(r):
+            view = {key: r[key] for key in shared_deps + ["run_id"] if key in r}
+            for dep in own_deps:
+                value = r[dep]
+                if isinstance(value, dict) and value.get("site_failed"):
+                    return value
+                view[dep.split(":", 1)[1]] = value
+            with use_site(site):
+                try:
+                    return fn(view)
+                except Exception as e:
+                    print(f"❌ [{name}] 사이트 작업 실패 (다른 사이트는 계속 진행): {e}")
+                    return {"site_failed": str(e)}
         
-        if response.status_code == 201:
-            post_id = response.json()['id']
-            post_url = response.json().get('link', 'URL 없음')
-            print()
-            print("=" * 70)
-            print("🎉 포스팅 성공!")
-            print(f"📝 제목: {title}")
-            print(f"🆔 ID: {post_id}")
-            print(f"🔗 URL: {post_url}")
-            print("=" * 70)
-        else:
-            print(f"❌ 발행 실패: {response.status_code}")
-            print(f"상세: {response.text}")
+        return tuple(shared_deps + own_deps), run
+    
+    def publish(r):
+        result = publish_post(r["title"], r["final_content"], r["featured_media"], status=publish_status(),
+                              **post_extras(r))
+        if result is None:
+            raise Exception("❌ 워드프레스 발행 실패")
+        return result
+    
+    for site in sites:
+        name = site["name"]
+        stages.update({
+            f"{name}:content": site_stage(site, ("topic", "outline", "research"),
+                                          lambda r: write_full_content(r["topic"], r["outline"], r["research"])),
+            f"{name}:final_content": site_stage(site, ("topic", "content"),
+                                                lambda r: quality_check_and_improve(r["topic"], r["content"])),
+            f"{name}:featured_media": site_stage(site, ("thumbnail", "title"),
+                                                 lambda r: upload_prepared_thumbnail(r["thumbnail"], r["title"])),
+            f"{name}:publish": site_stage(site, ("topic", "title", "image_prompt", "final_content", "featured_media"),
+                                          publisher or publish),
+        })
+    
+    def publish_all(r):
+        outcomes = {site["name"]: r[f"{site['name']}:publish"] for site in sites}
+        done = {name: value for name, value in outcomes.items() if not value.get("site_failed")}
+        print(f"🌐 멀티사이트 결과: {len(done)}/{len(sites)}개 사이트 완료")
+        for name, value in outcomes.items():
+            print(f"  - {name}: {'✅' if name in done else '❌ ' + value['site_failed']}")
+        if not done:
+            raise Exception("❌ 모든 사이트 발행 실패")
+        return done
+    
+    stages["publish"] = (tuple(f"{site['name']}:publish" for site in sites), publish_all)
+    return stages
+
+def auto_posting(topic=None, recent_titles=None, topic_picker=None, resume_run_id=None, mode=None, publisher=None,
+                 sites=None, deadline=None, trace_summary=True):
+    """메인 자동 포스팅 프로세스
+
+    topic / recent_titles 를 넘기면 해당 스테이지를 건너뜁니다 (배치 모드).
+    resume_run_id: 중단된 실행 ID - 저장된 스테이지는 건너뛰고 첫 미완료 스테이지부터 재개
+    mode: 파이프라인 모드 ("multi" / "fused"), 기본값은 PIPELINE_MODE
+    publisher: 발행 스테이지 교체 함수 (build_posting_stages 참고)
+    sites: 2개 이상이면 리서치를 공유하고 사이트별로 본문/발행 (build_fanout_stages 참고),
+           1개면 그 사이트에서 단일 파이프라인으로 실행
+    deadline: 이 실행의 제한 시간(초) - 바깥(CLI --deadline)에 더 이른 마감이 있으면 그것을 따름
+    trace_summary: False 면 구간별 소요 시간 표를 출력하지 않음 (배치는 끝에 한 번만 출력)
+    """
+    if sites and len(sites) == 1:
+        with use_site(sites[0]):
+            return auto_posting(topic=topic, recent_titles=recent_titles, topic_picker=topic_picker,
+                                resume_run_id=resume_run_id, mode=mode, publisher=publisher, deadline=deadline,
+                                trace_summary=trace_summary)
+    mode = mode or PIPELINE_MODE
+    if mode not in PIPELINE_MODES:
+        raise ValueError(f"알 수 없는 파이프라인 모드: {mode} (가능: {', '.join(PIPELINE_MODES)})")
+    print("=" * 70)
+    print("🚀 플럭시 블로그 봇 V5.0 - 프리미엄 에디션")
+    print("   [리서치 → 아웃라인 → 본문 → 품질검증 → 발행]")
+    print("   [아웃라인 이후 썸네일 생성은 본문 작성과 동시 진행]")
+    print(f"   [파이프라인 모드: {mode}, 본문 작성: {WRITE_MODE}]")
+    if sites and len(sites) > 1:
+        print(f"   [멀티사이트: {', '.join(site['name'] for site in sites)}]")
+    print("=" * 70)
+    print()
+    
+    # 시간 부족으로 생략/대체한 단계 (스테이지 스레드와 공유, 있으면 초안으로 저장)
+    degraded = []
+    degraded_token = _run_degraded.set(degraded)
+    try:
+        started = time.time()
+        with use_deadline(deadline), trace_span("auto_posting", mode=mode) as span:
+            trace_id = current_trace_id()
+            preset = {}
+            if recent_titles is not None or topic:
+                preset["recent_titles"] = list(recent_titles or [])
+            if topic:
+                preset["topic"] = topic
+            
+            run_id = resume_run_id or new_run_id()
+            span["run_id"] = run_id
+            if resume_run_id:
+                preset.update({stage: value for stage, value in load_run_state(run_id).items()
+                               if not (isinstance(value, dict) and value.get("site_failed"))})
+                # 앞선 실행에서 생략한 단계가 있으면 재개해도 초안으로 저장
+                degraded.extend(preset.pop("degraded", []))
+                print(f"🧷 실행 재개: {run_id} (완료된 스테이지: {', '.join(preset) or '없음'})")
+            else:
+                print(f"🧷 실행 ID: {run_id} (중단 시 --resume {run_id} 로 재개)")
+            mark_run_status(run_id, "running")
+            for stage, value in preset.items():
+                save_stage_output(run_id, stage, value)
+            # 스테이지가 아닌 실행 정보 - publisher(대기열 적재 등)가 결과에서 바로 읽도록 미리 넣어 둠
+            preset["run_id"] = run_id
+            if remaining_time() is not None:
+                print(f"⏳ 마감까지 {remaining_time():.0f}초")
             
+            def on_stage_done(stage, value):
+                if isinstance(value, dict) and value.get("site_failed"):
+                    return  # 실패한 사이트 작업은 저장하지 않아 재개 시 다시 시도
+                save_stage_output(run_id, stage, value)
+                if degraded:
+                    save_stage_output(run_id, "degraded", list(degraded))
+            
+            if sites and len(sites) > 1:
+                stages = build_fanout_stages(sites, topic_picker, mode, publisher)
+            else:
+                stages = build_posting_stages(topic_picker, mode, publisher)
+            try:
+                results = run_stage_graph(stages, results=preset, on_stage_done=on_stage_done)
+            except DeadlineExceeded:
+                mark_run_status(run_id, "failed")
+                print(f"⏳ 마감 시간 초과 - 완료된 스테이지는 저장되었습니다 (--resume {run_id} 로 이어서 실행)")
+                raise
+            except Exception:
+                mark_run_status(run_id, "failed")
+                raise
+            mark_run_status(run_id, "done")
+        print(f"⏱️ 전체 소요 시간: {time.time() - started:.1f}초 (모드: {mode})")
+        if degraded:
+            print(f"⏳ 시간 부족으로 조정한 단계: {', '.join(degraded)}")
+        print_llm_cache_stats()
+        print_token_usage()
+        if trace_summary:
+            print_trace_summary(trace_id)
+        return results
+    except DeadlineExceeded as e:
+        print(f"\n{e}")
     except Exception as e:
         print(f"\n❌❌❌ 치명적 오류 발생: {e}")
         import traceback
         traceback.print_exc()
+    finally:
+        _run_degraded.reset(degraded_token)
+
+def batch_posting(count=None, topics=None, workers=None, publisher=None, sites=None):
+    """📦 배치 모드: 여러 글을 워커 풀에서 동시에 생성/발행
+
+    count: 자동 주제 선정으로 만들 글 수
+    topics: 직접 지정한 주제 목록 (중복은 한 번만 사용)
+    Gemini / 이미지 다운로드 / WP 쓰기는 각각의 동시성 제한(*_SLOTS)을 따릅니다.
+    publisher: 발행 스테이지 교체 함수 (대기열 적재용)
+    sites: 2개 이상이면 글마다 모든 사이트로 팬아웃 (auto_posting 참고)
+    """
+    print("=" * 70)
+    print("📦 배치 모드 시작")
+    print("=" * 70)
+    
+    # 기존 글 목록과 클라이언트는 배치 전체에서 한 번만 준비
+    recent_titles = collect_recent_titles(sites) if sites else get_recent_posts()
+    claimed = {}
+    lock = threading.Lock()
+    
+    jobs = []
+    if topics:
+        for topic in topics:
+            key = normalize_topic(topic)
+            if key in claimed:
+                print(f"⚠️ 중복 주제 제외: {topic}")
+                continue
+            claimed[key] = topic
+            jobs.append(topic)
+    else:
+        jobs = [None] * (count or 1)
+    
+    def topic_picker(existing_titles):
+        return select_unique_topic(existing_titles, claimed, lock)
+    
+    def run_job(index, topic):
+        print(f"\n📦 [{index+1}/{len(jobs)}] 파이프라인 시작 ({topic or '자동 주제'})")
+        return auto_posting(topic=topic, recent_titles=recent_titles, topic_picker=topic_picker, publisher=publisher,
+                            sites=sites, trace_summary=False)
+    
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=workers or BATCH_WORKERS) as executor:
+        # 워커 스레드에도 현재 사이트(use_site)가 전달되도록 컨텍스트 복사
+        futures = [executor.submit(contextvars.copy_context().run, run_job, i, topic) for i, topic in enumerate(jobs)]
+        outcomes = [future.result() for future in futures]
+    
+    published = [r for r in outcomes if r and r.get("publish")]
+    print()
+    print("=" * 70)
+    print(f"📦 배치 완료: {len(published)}/{len(jobs)}건 {'적재' if publisher else '발행'} ({time.time() - started:.1f}초)")
+    for r in published:
+        print(f"  - {r['title']}")
+    print("=" * 70)
+    print_trace_summary()
+    return outcomes
+
+# 📥 발행 대기열: 글/썸네일을 미리 만들어 두고 발행은 따로 (발행 시점이 모델 지연과 무관)
+QUEUE_TARGETS = ("local", "draft", "future")
+QUEUE_INTERVAL_HOURS = float(os.environ.get("QUEUE_INTERVAL_HOURS", "6"))
+QUEUE_MAX_ATTEMPTS = 3
+# 발행 프로세스가 선점한 채 이 시간(초)이 지나면 죽은 것으로 보고 다른 프로세스가 다시 선점
+QUEUE_CLAIM_TIMEOUT = float(os.environ.get("QUEUE_CLAIM_TIMEOUT", "600"))
+# 이전 버전 대기열 DB 에 없는 컬럼 (열 때 추가)
+QUEUE_ADDED_COLUMNS = (("degraded", "INTEGER DEFAULT 0"), ("claimed", "REAL"), ("media_meta", "TEXT"))
+_queue_lock = threading.Lock()
+
+def _queue_db():
+    conn = open_state_db(site_state_file("queue.sqlite3"))
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS drafts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id TEXT,
+            topic TEXT,
+            title TEXT,
+            content TEXT,
+            featured_media INTEGER,
+            target TEXT,
+            status TEXT,
+            wp_post_id INTEGER,
+            scheduled REAL,
+            attempts INTEGER DEFAULT 0,
+            error TEXT,
+            created REAL,
+            published REAL,
+            degraded INTEGER DEFAULT 0,
+            claimed REAL,
+            media_meta TEXT
+        )
+    """)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(drafts)")}
+    for column, kind in QUEUE_ADDED_COLUMNS:
+        if column not in columns:
+            conn.execute(f"ALTER TABLE drafts ADD COLUMN {column} {kind}")
+    conn.execute("CREATE INDEX IF NOT EXISTS drafts_status ON drafts (status, id)")
+    return conn
+
+def _next_schedule_slot(conn, start=None, interval_hours=None):
+    """예약 발행 시각: start(기본값 지금+간격) 이후, 이미 잡힌 마지막 예약 + 간격
+
+    "pending" 은 enqueue_post 가 WordPress 에 올리는 중인 글 - 자리를 이미 잡았으므로 함께 셈
+    """
+    interval = (interval_hours or QUEUE_INTERVAL_HOURS) * 3600
+    slot = start or time.time() + interval
+    last = conn.execute(
+        "SELECT MAX(scheduled) FROM drafts WHERE status IN ('scheduled', 'pending') AND scheduled IS NOT NULL"
+    ).fetchone()[0]
+    if last and last + interval > slot:
+        slot = last + interval
+    return slot
+
+def enqueue_post(r, target="local", start=None, interval_hours=None):
+    """완성된 글을 대기열에 적재 (auto_posting 의 publisher 로 사용)
+
+    target: "local"(대기열에만 저장, 발행 시 새 글 생성) /
+            "draft"(WP 초안으로 미리 올려두고 발행 시 상태만 변경) /
+            "future"(WP 예약 발행으로 등록 - 정해진 시각에 WordPress 가 발행)
+    마감 시간에 쫓겨 단계를 생략한 글은 대상과 무관하게 WP 초안으로만 올리고
+    "review" 상태로 두어 publish_queued 가 자동 발행하지 않습니다.
+    반환: {"queue_id", "status", "wp_post_id", "scheduled"}
+    """
+    if target not in QUEUE_TARGETS:
+        raise ValueError(f"알 수 없는 대기열 대상: {target} (가능: {', '.join(QUEUE_TARGETS)})")
+    
+    degraded = publish_status() == "draft"
+    if degraded:
+        target = "draft"
+    extras = post_extras(r)
+    
+    # 잠금 안에서는 예약 시각을 정하고 자리만 잡아 둠 (WordPress 요청은 잠금 밖에서 - 다른 글의 적재를 막지 않도록)
+    wp_post_id, scheduled, status = None, None, "review" if degraded else "ready"
+    with _queue_lock:
+        conn = _queue_db()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            if target == "future":
+                scheduled = _next_schedule_slot(conn, start, interval_hours)
+                status = "scheduled"
+            cursor = conn.execute(
+                "INSERT INTO drafts (run_id, topic, title, content, featured_media, target, status, "
+                "wp_post_id, scheduled, created, degraded, media_meta) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (r.get("run_id"), r.get("topic"), r["title"], r["final_content"], r["featured_media"],
+                 target, status if target == "local" else "pending", None, scheduled, time.time(), int(degraded),
+                 json.dumps(extras["media_meta"], ensure_ascii=False) if extras["media_meta"] else None)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+    queue_id = cursor.lastrowid
+    
+    if target != "local":
+        try:
+            result = publish_post(r["title"], r["final_content"], r["featured_media"],
+                                  status="future" if target == "future" else "draft", date_gmt=scheduled,
+                                  **extras)
+            if result is None:
+                raise Exception("❌ 워드프레스 초안/예약 글 생성 실패")
+        except BaseException:
+            # 잡아 둔 자리(예약 시각 포함)를 돌려놓음
+            conn = _queue_db()
+            try:
+                conn.execute("DELETE FROM drafts WHERE id = ?", (queue_id,))
+                conn.commit()
+            finally:
+                conn.close()
+            raise
+        wp_post_id = result["id"]
+        conn = _queue_db()
+        try:
+            conn.execute("UPDATE drafts SET status = ?, wp_post_id = ? WHERE id = ?", (status, wp_post_id, queue_id))
+            conn.commit()
+        finally:
+            conn.close()
+    
+    when = f", 예약 {time.strftime('%Y-%m-%d %H:%M', time.localtime(scheduled))}" if scheduled else ""
+    when += ", 검토 필요 - 자동 발행 안 함" if degraded else ""
+    print(f"📥 대기열 적재: #{queue_id} {r['title']} ({target}{when})")
+    return {"queue_id": queue_id, "status": status, "wp_post_id": wp_post_id, "scheduled": scheduled}
+
+def _claim_queued(limit):
+    """발행할 글을 오래된 순으로 선점 (여러 발행 프로세스가 같은 글을 잡지 않도록 즉시 상태 변경)
+
+    선점 후 QUEUE_CLAIM_TIMEOUT 이 지나도 끝나지 않은 글(발행 중 프로세스가 죽음)도 다시 선점합니다.
+    """
+    now = time.time()
+    conn = _queue_db()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        rows = conn.execute(
+            "SELECT id, topic, title, content, featured_media, media_meta, wp_post_id, attempts FROM drafts "
+            "WHERE status = 'ready' OR (status = 'publishing' AND COALESCE(claimed, 0) < ?) "
+            "ORDER BY id LIMIT ?", (now - QUEUE_CLAIM_TIMEOUT, limit)
+        ).fetchall()
+        conn.executemany("UPDATE drafts SET status = 'publishing', claimed = ? WHERE id = ?",
+                         [(now, row[0]) for row in rows])
+        conn.commit()
+        return rows
+    finally:
+        conn.close()
+
+def _finish_queued(queue_id, status, wp_post_id=None, error=None, attempts=0):
+    conn = _queue_db()
+    try:
+        conn.execute(
+            "UPDATE drafts SET status = ?, wp_post_id = COALESCE(?, wp_post_id), error = ?, attempts = ?, "
+            "published = CASE WHEN ? = 'published' THEN ? ELSE published END WHERE id = ?",
+            (status, wp_post_id, error, attempts, status, time.time(), queue_id)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+def publish_queued(limit=1):
+    """📤 대기열에서 limit 개 발행 (LLM/이미지 작업 없이 WP 호출만 하므로 몇 초면 끝남)
+
+    WP 초안이 있으면 상태만 publish 로 바꾸고, 없으면 저장된 본문으로 새 글을 발행합니다.
+    실패한 글은 QUEUE_MAX_ATTEMPTS 번까지 다음 발행 때 다시 시도합니다.
+    "review" 상태(마감에 쫓겨 만든 글)는 WP 초안에서 사람이 검토 후 발행하므로 건드리지 않습니다.
+    """
+    rows = _claim_queued(limit)
+    if not rows:
+        print("📭 발행할 글이 대기열에 없습니다.")
+        return []
+    
+    published = []
+    pending = list(rows)
+    try:
+        while pending:
+            queue_id, topic, title, content, featured_media, media_meta, wp_post_id, attempts = pending[0]
+            print(f"📤 대기열 #{queue_id} 발행: {title}")
+            try:
+                if wp_post_id:
+                    result = update_post_status(wp_post_id, "publish")
+                else:
+                    result = publish_post(title, content, featured_media, tags=post_tags(topic, title),
+                                          media_meta=json.loads(media_meta) if media_meta else None)
+            except requests.RequestException as e:
+                print(f"❌ 대기열 #{queue_id} 발행 중 네트워크 에러: {e}")
+                result = None
+            
+            if result:
+                _finish_queued(queue_id, "published", wp_post_id=result["id"], attempts=attempts + 1)
+                published.append(result)
+            else:
+                status = "ready" if attempts + 1 < QUEUE_MAX_ATTEMPTS else "failed"
+                _finish_queued(queue_id, status, error="발행 실패", attempts=attempts + 1)
+            pending.pop(0)
+    finally:
+        # 예기치 못한 에러로 멈추면 선점만 하고 못 끝낸 글을 돌려놓음 (발행 중이던 글은 시도 1회로 셈)
+        for index, (queue_id, *_, attempts) in enumerate(pending):
+            tried = attempts + (index == 0)
+            _finish_queued(queue_id, "ready" if tried < QUEUE_MAX_ATTEMPTS else "failed", error="발행 중단",
+                           attempts=tried)
+    print(f"📤 대기열 발행 완료: {len(published)}/{len(rows)}건")
+    return published
+
+def queue_status():
+    """대기열 현황 출력 (예약 시각이 지난 예약 글은 WordPress 가 발행한 것으로 정리)"""
+    conn = _queue_db()
+    try:
+        conn.execute(
+            "UPDATE drafts SET status = 'published', published = scheduled "
+            "WHERE status = 'scheduled' AND scheduled <= ?", (time.time(),)
+        )
+        conn.commit()
+        counts = dict(conn.execute("SELECT status, COUNT(*) FROM drafts GROUP BY status").fetchall())
+        upcoming = conn.execute(
+            "SELECT id, title, target, status, scheduled FROM drafts "
+            "WHERE status IN ('pending', 'ready', 'scheduled', 'publishing', 'review', 'failed') ORDER BY id LIMIT 10"
+        ).fetchall()
+    finally:
+        conn.close()
+    
+    print("📥 발행 대기열: " + (", ".join(f"{status} {count}" for status, count in sorted(counts.items())) or "비어 있음"))
+    for queue_id, title, target, status, scheduled in upcoming:
+        when = time.strftime(" %Y-%m-%d %H:%M", time.localtime(scheduled)) if scheduled else ""
+        print(f"  #{queue_id} [{status}/{target}{when}] {title}")
+    return counts
+
+def produce_drafts(count=None, topics=None, target="local", start=None, interval_hours=None, workers=None,
+                   sites=None):
+    """📥 생산자: 글을 미리 만들어 대기열에 적재 (배치 모드와 같은 동시 파이프라인 사용)
+
+    sites 를 주면 사이트마다 자기 대기열(queue-<사이트>.sqlite3)에 적재됩니다.
+    """
+    def publisher(r):
+        return enqueue_post(r, target=target, start=start, interval_hours=interval_hours)
+    return batch_posting(count=count, topics=topics, workers=workers, publisher=publisher, sites=sites)
+
+def parse_local_time(value):
+    """"2026-10-20 09:00" 형식(로컬 시각) → epoch 초"""
+    for fmt in ("%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M"):
+        try:
+            return time.mktime(time.strptime(value, fmt))
+        except ValueError:
+            continue
+    raise ValueError(f"시각 형식 오류: {value} (예: 2026-10-20 09:00)")
 
 def test_image_generation(topic="2026년 ISA 한도 상향 투자 전략"):
     """🧪 이미지 생성 테스트 전용 함수"""
@@ -697,22 +3996,156 @@ def test_image_generation(topic="2026년 ISA 한도 상향 투자 전략"):
     # 샘플 콘텐츠
     sample_content = f"{topic}에 대한 블로그 글입니다. 비과세 혜택과 배당 투자 전략을 다룹니다."
     
-    # 이미지 프롬프트 생성
-    image_prompt = get_dynamic_image_prompt(topic, sample_content)
-    
-    # 이미지 업로드 테스트
-    media_id = upload_image_to_wp(image_prompt, topic)
+    with trace_span("test_image", topic=topic):
+        # 이미지 프롬프트 생성
+        image_prompt = get_dynamic_image_prompt(topic, sample_content)
+        
+        # 이미지 업로드 테스트
+        media_id = upload_image_to_wp(image_prompt, topic)
     
     if media_id:
         print(f"\n✅ 테스트 성공! Media ID: {media_id}")
         print("WordPress 미디어 라이브러리에서 확인하세요.")
     else:
         print("\n❌ 테스트 실패. 위 로그를 확인하세요.")
+    print_llm_cache_stats()
 
-if __name__ == "__main__":
-    # 테스트 모드 실행: python script.py test
+def sync_index_command():
+    """제목 인덱스만 동기화 (Gemini 불필요)"""
+    added = sync_title_index()
+    titles = recent_indexed_titles(5)
+    if titles:
+        print("🗂️ 최근 글:")
+        for title in titles:
+            print(f"  - {title}")
+    return added
+
+def build_cli_parser():
+    """서브커맨드 CLI: post / test-image / batch / produce / publish-queue / queue / sync-index / sites / benchmark"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(prog="main.py", description="플럭시 블로그 자동 포스팅")
+    commands = parser.add_subparsers(dest="command", metavar="명령")
+    mode_option = argparse.ArgumentParser(add_help=False)
+    mode_option.add_argument("--mode", choices=PIPELINE_MODES, help="파이프라인 모드 (기본값: PIPELINE_MODE 환경변수)")
+    mode_option.add_argument("--write", choices=WRITE_MODES,
+                             help="본문 작성 방식 - sections: 섹션별 동시 작성/검사 (기본값: WRITE_MODE 환경변수)")
+    site_option = argparse.ArgumentParser(add_help=False)
+    site_option.add_argument("--site", metavar="NAME", help="대상 사이트 (sites.json 의 name, 기본값: 첫 사이트)")
+    deadline_option = argparse.ArgumentParser(add_help=False)
+    deadline_option.add_argument("--deadline", type=parse_duration, default=os.environ.get("AUTOWP_DEADLINE") or None,
+                                 metavar="8m", help="전체 실행 제한 시간 (예: 8m, 90s, 1h / 기본값: AUTOWP_DEADLINE)")
+    fanout_option = argparse.ArgumentParser(add_help=False)
+    fanout_option.add_argument("--sites", metavar="A,B|all",
+                               help="리서치를 공유해 여러 사이트에 발행 (쉼표 구분 또는 all)")
+    
+    post = commands.add_parser("post", parents=[mode_option, site_option, fanout_option, deadline_option],
+                               help="글 1개 생성 후 발행 (기본 명령)")
+    post.add_argument("--topic", help="주제 직접 지정 (생략 시 자동 선정)")
+    post.add_argument("--resume", metavar="RUN_ID", help="중단된 실행 재개")
+    
+    test_image = commands.add_parser("test-image", parents=[site_option, deadline_option],
+                                     help="이미지 생성/업로드만 테스트")
+    test_image.add_argument("--topic", default="2026년 ISA 한도 상향 투자 전략")
+    
+    batch = commands.add_parser("batch", parents=[mode_option, site_option, fanout_option, deadline_option],
+                                help="여러 글을 동시에 생성/발행")
+    batch.add_argument("targets", nargs="*", metavar="N|주제", help="글 수 또는 주제 목록")
+    batch.add_argument("--workers", type=int, help="동시 파이프라인 수 (기본값: BATCH_WORKERS)")
+    
+    produce = commands.add_parser("produce", parents=[mode_option, site_option, fanout_option, deadline_option],
+                                  help="글을 미리 만들어 발행 대기열에 적재")
+    produce.add_argument("targets", nargs="*", metavar="N|주제", help="글 수 또는 주제 목록 (기본 1개)")
+    produce.add_argument("--as", dest="target", choices=QUEUE_TARGETS, default="local",
+                         help="local: 대기열만 / draft: WP 초안 / future: WP 예약 발행")
+    produce.add_argument("--start", type=parse_local_time, help='첫 예약 시각 (future, 예: "2026-10-20 09:00")')
+    produce.add_argument("--interval", type=float, metavar="HOURS", help="예약 간격(시간, 기본값: QUEUE_INTERVAL_HOURS)")
+    produce.add_argument("--workers", type=int, help="동시 파이프라인 수 (기본값: BATCH_WORKERS)")
+    
+    publish_queue = commands.add_parser("publish-queue", parents=[site_option, deadline_option],
+                                        help="대기열에서 글 발행 (LLM 호출 없음)")
+    publish_queue.add_argument("--limit", type=int, default=1, help="이번에 발행할 글 수 (기본 1)")
+    
+    commands.add_parser("queue", parents=[site_option], help="발행 대기열 현황")
+    commands.add_parser("sync-index", parents=[site_option, deadline_option], help="WordPress 제목 인덱스만 동기화")
+    commands.add_parser("sites", help="등록된 사이트 목록")
+    
+    bench = commands.add_parser("benchmark", help="benchmark.py 벤치마크 실행")
+    bench.add_argument("names", nargs="*", help="실행할 벤치마크 (생략 시 전체)")
+    return parser
+
+def run_cli(argv=None):
+    """명령행 진입점 - 기존 형식(test, --resume ID, --mode X, batch ...)도 그대로 받음"""
     import sys
-    if len(sys.argv) > 1 and sys.argv[1] == "test":
-        test_image_generation()
-    else:
-        auto_posting()
+    global PIPELINE_MODE, WRITE_MODE
+    args = list(sys.argv[1:] if argv is None else argv)
+    
+    # 예전 형식 호환: 인자 없음 / 옵션으로 시작 → post, test → test-image
+    if not args or (args[0].startswith("-") and args[0] not in ("-h", "--help")):
+        args.insert(0, "post")
+    elif args[0] == "test":
+        args[0] = "test-image"
+    
+    options = build_cli_parser().parse_args(args)
+    if getattr(options, "mode", None):
+        PIPELINE_MODE = options.mode
+    if getattr(options, "write", None):
+        WRITE_MODE = options.write
+    
+    site = get_site(options.site) if getattr(options, "site", None) else None
+    with use_site(site or current_site()), use_deadline(getattr(options, "deadline", None)):
+        return run_command(options)
+
+def parse_sites_option(value):
+    """--sites 값 → 사이트 목록 ("all" 이면 sites.json 전체)"""
+    if not value:
+        return None
+    if value == "all":
+        return load_sites()
+    return [get_site(name.strip()) for name in value.split(",") if name.strip()]
+
+def list_sites():
+    """등록된 사이트 목록 출력 (비밀번호는 설정 여부만)"""
+    for site in load_sites():
+        password = "설정됨" if site["wp_app_pass"] else "없음"
+        print(f"🌐 {site['name']}: {site['wp_url']} (사용자: {site['wp_user']}, 앱 비밀번호: {password}, "
+              f"카테고리: {site['categories']}, 페르소나: {site['persona']['nickname']})")
+    return load_sites()
+
+def run_command(options):
+    """파싱된 CLI 옵션 실행 (현재 사이트는 run_cli 에서 지정)"""
+    sites = parse_sites_option(getattr(options, "sites", None))
+    
+    if options.command == "post":
+        return auto_posting(topic=options.topic, resume_run_id=options.resume, sites=sites)
+    if options.command == "test-image":
+        return test_image_generation(options.topic)
+    if options.command == "batch":
+        # python main.py batch 10  /  python main.py batch "주제1" "주제2"
+        if len(options.targets) == 1 and options.targets[0].isdigit():
+            return batch_posting(count=int(options.targets[0]), workers=options.workers, sites=sites)
+        if options.targets:
+            return batch_posting(topics=options.targets, workers=options.workers, sites=sites)
+        return batch_posting(count=BATCH_WORKERS, workers=options.workers, sites=sites)
+    if options.command == "produce":
+        count, topics = 1, None
+        if len(options.targets) == 1 and options.targets[0].isdigit():
+            count = int(options.targets[0])
+        elif options.targets:
+            topics = options.targets
+        return produce_drafts(count=count, topics=topics, target=options.target, start=options.start,
+                              interval_hours=options.interval, workers=options.workers, sites=sites)
+    if options.command == "publish-queue":
+        return publish_queued(options.limit)
+    if options.command == "queue":
+        return queue_status()
+    if options.command == "sync-index":
+        return sync_index_command()
+    if options.command == "sites":
+        return list_sites()
+    if options.command == "benchmark":
+        import benchmark
+        return benchmark.run(options.names)
+
+if __name__ == "__main__":
+    run_cli()